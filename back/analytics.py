@@ -0,0 +1,132 @@
+"""出勤分析: 输入按列组织的 NumPy 数组, 整体向量化计算每名球员的出勤、请假、报名与连续出勤
+
+不依赖 Flask / 数据库, 由 system.load_attendance 负责读出各列。
+"""
+import numpy as np
+
+# 输出的每行字段 (也是 CSV 的列顺序)
+PLAYER_FIELDS = [
+    'user_id', 'username', 'real_name',
+    'trainings_expected', 'trainings_attended', 'attendance_rate',
+    'training_leaves', 'match_leaves', 'leave_hours',
+    'matches_eligible', 'matches_signed_up', 'signup_rate',
+    'current_streak', 'longest_streak',
+]
+
+
+def positions(ids, values):
+    """values 在 ids (互不重复, 无需有序) 中的下标, 不存在的为 -1"""
+    if len(ids) == 0:
+        return np.full(len(values), -1, dtype=np.int64)
+    order = np.argsort(ids)
+    pos = np.searchsorted(ids[order], values)
+    pos[pos >= len(ids)] = 0
+    return np.where(ids[order][pos] == values, order[pos], -1)
+
+
+def first_on_roster(joined, times):
+    """各球员加入后的第一个位置: times 升序, 不早于加入时间的都计入应到"""
+    return np.searchsorted(times, joined.astype(times.dtype))
+
+
+def roster_counts(joined, times):
+    """各球员应到的次数"""
+    return len(times) - first_on_roster(joined, times)
+
+
+def on_roster(joined, times):
+    """(P x N) 布尔矩阵: 每行从加入后的第一个位置起到末尾全为 True, 用整数比较生成, 不逐个比较时间"""
+    return np.arange(len(times))[None, :] >= first_on_roster(joined, times)[:, None]
+
+
+def runs(matrix):
+    """布尔矩阵每行连续 True 的 (最长长度, 末尾长度)
+
+    累计和减去最近一个 False 处的累计和即为到当前位置为止的连续长度。
+    """
+    if matrix.shape[1] == 0:
+        zeros = np.zeros(matrix.shape[0], dtype=np.int64)
+        return zeros, zeros
+    total = np.cumsum(matrix, axis=1, dtype=np.int32)
+    at_break = np.maximum.accumulate(np.where(matrix, 0, total), axis=1)
+    length = total - at_break
+    return length.max(axis=1), length[:, -1]
+
+
+def rate(part, whole):
+    """百分比 (保留 1 位小数), 分母为 0 的位置为 NaN"""
+    part = np.asarray(part, dtype=np.float64)
+    whole = np.asarray(whole, dtype=np.float64)
+    out = np.full(part.shape, np.nan)
+    np.divide(part * 100, whole, out=out, where=whole > 0)
+    return np.round(out, 1)
+
+
+def mark(shape, row_ids, col_ids, rows, cols):
+    """(行 id, 列 id) 对在 (len(row_ids) x len(col_ids)) 布尔矩阵中置 True, 不在范围内的对丢弃"""
+    matrix = np.zeros(shape, dtype=bool)
+    r = positions(row_ids, rows)
+    c = positions(col_ids, cols)
+    hit = (r >= 0) & (c >= 0)
+    matrix[r[hit], c[hit]] = True
+    return matrix
+
+
+def attendance_report(player_ids, joined, training_ids, training_times, match_ids, match_times,
+                      training_leave_users, training_leave_ids, match_leave_users, match_leave_ids,
+                      hour_users, hour_totals, signup_users, signup_matches):
+    """计算每名球员与全队的出勤统计
+
+    joined 为各球员加入球队的时间 (之前的训练 / 比赛不计入应到); training_* / match_* 按时间升序;
+    *_leave_users / *_leave_ids 为请假覆盖的 (球员, 训练 / 比赛) 对, hour_users / hour_totals 为各球员的请假总时长。
+    返回 (各字段数组组成的 dict, 全队汇总 dict)。
+    """
+    n_players = len(player_ids)
+    # 应到: 球员加入之后的训练 / 比赛 (P x T, P x M)
+    expected = on_roster(joined, training_times)
+    eligible = on_roster(joined, match_times)
+
+    # 请假不属于球员 (如教练) 或不在统计范围内的训练 / 比赛时丢弃
+    absent = mark(expected.shape, player_ids, training_ids, training_leave_users, training_leave_ids) & expected
+    match_absent = mark(eligible.shape, player_ids, match_ids, match_leave_users, match_leave_ids) & eligible
+    rows = positions(player_ids, hour_users)
+    known = rows >= 0
+    hours = np.zeros(n_players, dtype=np.float64)
+    hours[rows[known]] = hour_totals[known]
+    signed = mark(eligible.shape, player_ids, match_ids, signup_users, signup_matches) & eligible
+
+    attended = expected & ~absent
+    longest, current = runs(attended)
+    columns = {
+        'trainings_expected': expected.sum(axis=1),
+        'trainings_attended': attended.sum(axis=1),
+        'training_leaves': absent.sum(axis=1),
+        'match_leaves': match_absent.sum(axis=1),
+        'leave_hours': np.round(hours, 1),
+        'matches_eligible': eligible.sum(axis=1),
+        'matches_signed_up': signed.sum(axis=1),
+        'current_streak': current,
+        'longest_streak': longest,
+    }
+    columns['attendance_rate'] = rate(columns['trainings_attended'], columns['trainings_expected'])
+    columns['signup_rate'] = rate(columns['matches_signed_up'], columns['matches_eligible'])
+
+    team_attendance = float(rate(attended.sum(), expected.sum()))
+    team_signup = float(rate(signed.sum(), eligible.sum()))
+    team = {
+        'players': n_players,
+        'trainings': len(training_ids),
+        'matches': len(match_ids),
+        'attendance_rate': None if np.isnan(team_attendance) else team_attendance,
+        'signup_rate': None if np.isnan(team_signup) else team_signup,
+        'training_leaves': int(absent.sum()),
+        'leave_hours': round(float(hours.sum()), 1),
+    }
+    return columns, team
+
+
+def report_rows(columns, players):
+    """把各列数组转成逐行的 dict; players 为 (user_id, username, real_name) 列表, NaN 转为 None"""
+    lists = {name: [None if v != v else v for v in values.tolist()] for name, values in columns.items()}
+    return [dict(zip(PLAYER_FIELDS, (user_id, username, real_name, *(lists[f][i] for f in PLAYER_FIELDS[3:]))))
+            for i, (user_id, username, real_name) in enumerate(players)]
@@ -0,0 +1,430 @@
+"""后端接口压测: 对 system.py 中每个接口跑并发脚本化负载, 输出 p50/p95/p99、吞吐和 SQL 条数 (JSON)
+
+默认在进程内用 Flask test client 驱动 (SQLite 或本地 Postgres, OBS 为本地替身):
+
+    python bench_api.py --db sqlite:////tmp/bench.db --concurrency 8 --requests 200 --output run.json
+
+也可以压一个已启动的服务 (服务端需 OBS_BACKEND=fake 且已用 bench_seed.py 造数):
+
+    python bench_api.py --url http://localhost:5000 --concurrency 32
+
+与之前的结果对比 p95 变化:
+
+    python bench_api.py --db ... --compare run.json
+"""
+import os
+import io
+import re
+import sys
+import json
+import time
+import uuid
+import random
+import datetime
+import argparse
+import threading
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from bench_seed import load_app, seed
+
+SEED_USERS = 2000
+SEED_TRAININGS = 600
+SEED_MATCHES = 300
+SEED_PHOTOS = 500
+PASSWORD = 'password'
+SERVER_TIMING_QUERIES = re.compile(r'desc="(\d+) queries"')
+
+
+class InProcessClient:
+    def __init__(self, app):
+        self.app = app
+
+    def request(self, method, path, json_body=None, data=None, headers=None, content_type=None, first_chunk=False):
+        # 每次请求新建 test client, 避免多线程共享 cookie 状态
+        resp = self.app.test_client().open(path, method=method, json=json_body, data=data,
+                                           headers=headers or {}, content_type=content_type,
+                                           buffered=not first_chunk)
+        if first_chunk:
+            # 流式响应 (SSE) 只读到第一块就断开
+            body = next(iter(resp.response), b'')
+            resp.close()
+            return resp.status_code, resp.headers, body if isinstance(body, bytes) else body.encode()
+        return resp.status_code, resp.headers, resp.get_data()
+
+
+class HttpClient:
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip('/')
+
+    def request(self, method, path, json_body=None, data=None, headers=None, content_type=None, first_chunk=False):
+        headers = dict(headers or {})
+        if json_body is not None:
+            data = json.dumps(json_body).encode()
+            content_type = 'application/json'
+        if isinstance(data, dict):
+            data, content_type = _encode_multipart(data)
+        if content_type:
+            headers['Content-Type'] = content_type
+        req = urllib.request.Request(self.base_url + path, data=data, headers=headers, method=method)
+        try:
+            with urllib.request.urlopen(req, timeout=60) as resp:
+                return resp.status, resp.headers, resp.read1() if first_chunk else resp.read()
+        except urllib.error.HTTPError as e:
+            return e.code, e.headers, e.read()
+
+
+def _encode_multipart(fields):
+    boundary = uuid.uuid4().hex
+    body = io.BytesIO()
+    for name, value in fields.items():
+        body.write(f'--{boundary}\r\n'.encode())
+        if isinstance(value, tuple):
+            stream, filename = value
+            body.write(f'Content-Disposition: form-data; name="{name}"; filename="{filename}"\r\n'
+                       f'Content-Type: application/octet-stream\r\n\r\n'.encode())
+            body.write(stream.read())
+        else:
+            body.write(f'Content-Disposition: form-data; name="{name}"\r\n\r\n{value}'.encode())
+        body.write(b'\r\n')
+    body.write(f'--{boundary}--\r\n'.encode())
+    return body.getvalue(), f'multipart/form-data; boundary={boundary}'
+
+
+class Context:
+    """压测共享状态: 各角色的 token、随机数和一次性资源 (待删除的 id) 的分配"""
+
+    def __init__(self, client, run_id, rng_seed):
+        self.client = client
+        self.run_id = run_id
+        self.rng = random.Random(rng_seed)
+        self.tokens = {}
+        self.refresh_tokens = {}
+        self._lock = threading.Lock()
+        self._counters = {}
+        # 本轮新建的训练 / 比赛 / 场地预约从按 run_id 散列出的远期日期排起, 与往轮和造数数据都不重叠
+        self.slot_base = datetime.datetime(2100, 1, 1) + datetime.timedelta(days=int(run_id, 16) % 2000000)
+
+    def login(self, role, username):
+        status, _, body = self.client.request('POST', '/api/login',
+                                              json_body={'username': username, 'password': PASSWORD})
+        if status != 200:
+            raise RuntimeError(f'login as {username} failed: {status} {body[:200]}')
+        tokens = json.loads(body)
+        self.tokens[role] = {'Authorization': 'Bearer ' + tokens['token']}
+        self.refresh_tokens[role] = tokens['refresh_token']
+
+    def auth(self, role):
+        return self.tokens[role]
+
+    def next(self, name):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + 1
+            return self._counters[name]
+
+    def slot(self, calendar, hours=2):
+        """日程 calendar ('team' 或 'court') 中下一个未占用的时间段 (开始, 结束)
+
+        每段间隔 3 小时 (长于比赛时长), 同一日程内的新建请求不会因时间重叠返回 409。
+        """
+        start = self.slot_base + datetime.timedelta(hours=3 * self.next('slot:' + calendar))
+        return start.strftime('%Y-%m-%d %H:%M'), (start + datetime.timedelta(hours=hours)).strftime('%Y-%m-%d %H:%M')
+
+    def randint(self, a, b):
+        with self._lock:
+            return self.rng.randint(a, b)
+
+    def call(self, method, path, **kwargs):
+        status, _, body = self.client.request(method, path, **kwargs)
+        if status >= 300:
+            raise RuntimeError(f'{method} {path} -> {status} {body[:200]}')
+        return json.loads(body) if body else None
+
+
+def _upload_presigned(ctx, role):
+    signed = ctx.call('POST', '/api/uploads/presign', headers=ctx.auth(role),
+                      json_body={'filename': 'bench.jpg', 'content_type': 'image/jpeg', 'size': 2048})
+    url = signed['upload_url']
+    if url.startswith('file://'):
+        # 服务端使用本地 OBS 替身时, 签名 URL 指向本机文件
+        path = url[len('file://'):].split('?')[0]
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(os.urandom(2048))
+    else:
+        req = urllib.request.Request(url, data=os.urandom(2048), headers=signed['headers'], method='PUT')
+        urllib.request.urlopen(req, timeout=60).close()
+    return signed['key']
+
+
+def _init_upload(ctx, role, part=False):
+    init = ctx.call('POST', '/api/uploads', headers=ctx.auth(role), json_body={'filename': 'bench.bin'})
+    if part:
+        ctx.call('PUT', f"/api/uploads/{init['upload_id']}/parts/1?key={init['key']}",
+                 headers=ctx.auth(role), data=os.urandom(64 * 1024), content_type='application/octet-stream')
+    return init
+
+
+def build_scenarios():
+    """每个场景: (名称, 准备函数 (不计时, 返回请求参数), 允许的状态码, 单轮最多请求数)"""
+    def simple(method, path, role='captain', **kwargs):
+        return lambda ctx, i: dict(method=method, path=path, headers=ctx.auth(role), **kwargs)
+
+    def training(ctx):
+        start, end = ctx.slot('team')
+        return {'start_time': start, 'end_time': end, 'plan_content': '[]'}
+
+    def match(ctx):
+        return {'match_time': ctx.slot('team')[0], 'opponent': 'bench', 'location': 'gym'}
+
+    def venue(ctx):
+        start, end = ctx.slot('court')
+        return {'start_time': start, 'end_time': end}
+
+    scenarios = [
+        ('GET /api/ping', simple('GET', '/api/ping'), {200}, None),
+        ('POST /api/login', lambda ctx, i: dict(
+            method='POST', path='/api/login',
+            json_body={'username': f'user{ctx.randint(4, SEED_USERS)}', 'password': PASSWORD}), {200}, None),
+        ('POST /api/register', lambda ctx, i: dict(
+            method='POST', path='/api/register',
+            json_body={'username': f'bench_{ctx.run_id}_{ctx.next("register")}', 'password': PASSWORD,
+                       'real_name': '压测', 'student_id': 'B0001'}), {201}, None),
+        ('GET /api/users', simple('GET', '/api/users'), {200}, None),
+        ('PUT /api/users/profile', lambda ctx, i: dict(
+            method='PUT', path='/api/users/profile', headers=ctx.auth('player'),
+            json_body={'bio': f'bench {i}'}), {200}, None),
+        ('GET /api/dashboard/stats', simple('GET', '/api/dashboard/stats'), {200}, None),
+        ('GET /api/trainings', simple('GET', '/api/trainings'), {200}, None),
+        ('GET /api/trainings?limit=20', simple('GET', '/api/trainings?limit=20'), {200}, None),
+        ('POST /api/trainings', lambda ctx, i: dict(
+            method='POST', path='/api/trainings', headers=ctx.auth('captain'),
+            json_body=training(ctx)), {200}, None),
+        ('POST /api/trainings/bulk', lambda ctx, i: dict(
+            method='POST', path='/api/trainings/bulk', headers=ctx.auth('captain'),
+            json_body=[training(ctx) for _ in range(20)]), {200}, None),
+        ('DELETE /api/trainings/<id>', lambda ctx, i: dict(
+            method='DELETE', path=f'/api/trainings/{SEED_TRAININGS + 1 - ctx.next("delete_training")}',
+            headers=ctx.auth('captain')), {200}, 50),
+        ('POST /api/leaves', lambda ctx, i: dict(
+            method='POST', path='/api/leaves', headers=ctx.auth('player'),
+            json_body={'training_id': ctx.randint(1, SEED_TRAININGS // 2), 'duration_hours': 2,
+                       'reason': 'bench'}), {200}, None),
+        ('GET /api/leaves (captain)', simple('GET', '/api/leaves'), {200}, None),
+        ('GET /api/leaves (player)', simple('GET', '/api/leaves', role='player'), {200}, None),
+        ('GET /api/leaves?limit=50', simple('GET', '/api/leaves?limit=50'), {200}, None),
+        ('GET /api/matches', simple('GET', '/api/matches'), {200}, None),
+        ('POST /api/matches', lambda ctx, i: dict(
+            method='POST', path='/api/matches', headers=ctx.auth('captain'),
+            json_body=match(ctx)), {200}, None),
+        ('POST /api/matches/bulk', lambda ctx, i: dict(
+            method='POST', path='/api/matches/bulk', headers=ctx.auth('captain'),
+            json_body=[match(ctx) for _ in range(20)]), {200}, None),
+        ('PUT /api/matches/<id>', lambda ctx, i: dict(
+            method='PUT', path=f'/api/matches/{ctx.randint(1, SEED_MATCHES // 2)}', headers=ctx.auth('captain'),
+            json_body={'our_score': ctx.randint(40, 100), 'opponent_score': ctx.randint(40, 100),
+                       'is_finished': True}), {200}, None),
+        ('PUT /api/matches/bulk', lambda ctx, i: dict(
+            method='PUT', path='/api/matches/bulk', headers=ctx.auth('captain'),
+            json_body=[{'id': ctx.randint(1, SEED_MATCHES // 2), 'our_score': ctx.randint(40, 100),
+                        'opponent_score': ctx.randint(40, 100), 'is_finished': True} for _ in range(20)]), {200}, None),
+        ('DELETE /api/matches/<id>', lambda ctx, i: dict(
+            method='DELETE', path=f'/api/matches/{SEED_MATCHES + 1 - ctx.next("delete_match")}',
+            headers=ctx.auth('captain')), {200}, 50),
+        # 重复报名返回 400 也属于正常业务结果
+        ('POST /api/matches/<id>/signup', lambda ctx, i: dict(
+            method='POST', path=f'/api/matches/{ctx.randint(1, SEED_MATCHES // 2)}/signup',
+            headers=ctx.auth('player')), {200, 400}, None),
+        ('GET /api/venues', simple('GET', '/api/venues'), {200}, None),
+        ('POST /api/venues', lambda ctx, i: dict(
+            method='POST', path='/api/venues', headers=ctx.auth('captain'),
+            json_body=venue(ctx)), {200}, None),
+        ('POST /api/venues/bulk', lambda ctx, i: dict(
+            method='POST', path='/api/venues/bulk', headers=ctx.auth('captain'),
+            json_body=[venue(ctx) for _ in range(20)]), {200}, None),
+        ('GET /api/schedule', simple('GET', '/api/schedule'), {200}, None),
+        ('GET /api/schedule?from=&to= (30 days)',
+         simple('GET', '/api/schedule?from=2023-03-01&to=2023-03-31'), {200}, None),
+        ('GET /api/analytics/attendance', simple('GET', '/api/analytics/attendance'), {200}, None),
+        ('GET /api/analytics/attendance (player)', simple('GET', '/api/analytics/attendance', role='player'),
+         {200}, None),
+        ('GET /api/analytics/attendance?format=csv',
+         simple('GET', '/api/analytics/attendance?from=2023-01-01&to=2023-07-01&format=csv'), {200}, None),
+        ('GET /api/photos', simple('GET', '/api/photos'), {200}, None),
+        ('POST /api/photos', lambda ctx, i: dict(
+            method='POST', path='/api/photos', headers=ctx.auth('player'),
+            json_body={'url': f'https://example.invalid/bench{i}.jpg', 'description': 'bench'}), {200}, None),
+        ('DELETE /api/photos/<id>', lambda ctx, i: dict(
+            method='DELETE', path=f'/api/photos/{SEED_PHOTOS + 1 - ctx.next("delete_photo")}',
+            headers=ctx.auth('captain')), {200}, 50),
+        ('GET /api/personal_trainings (captain)', simple('GET', '/api/personal_trainings'), {200}, None),
+        ('GET /api/personal_trainings (player)', simple('GET', '/api/personal_trainings', role='player'),
+         {200}, None),
+        ('POST /api/personal_trainings', lambda ctx, i: dict(
+            method='POST', path='/api/personal_trainings', headers=ctx.auth('player'),
+            json_body={'item_name': '投篮 200 个'}), {200}, None),
+        ('POST /api/upload', lambda ctx, i: dict(
+            method='POST', path='/api/upload', headers=ctx.auth('player'),
+            data={'file': (io.BytesIO(os.urandom(256 * 1024)), 'bench.jpg')},
+            content_type='multipart/form-data'), {200}, None),
+        ('POST /api/uploads', lambda ctx, i: dict(
+            method='POST', path='/api/uploads', headers=ctx.auth('player'),
+            json_body={'filename': 'bench.bin'}), {201}, None),
+        ('PUT /api/uploads/<id>/parts/<n>', lambda ctx, i: (lambda init: dict(
+            method='PUT', path=f"/api/uploads/{init['upload_id']}/parts/1?key={init['key']}",
+            headers=ctx.auth('player'), data=os.urandom(64 * 1024),
+            content_type='application/octet-stream'))(_init_upload(ctx, 'player')), {200}, None),
+        ('GET /api/uploads/<id>', lambda ctx, i: (lambda init: dict(
+            method='GET', path=f"/api/uploads/{init['upload_id']}?key={init['key']}",
+            headers=ctx.auth('player')))(_init_upload(ctx, 'player', part=True)), {200}, None),
+        ('POST /api/uploads/<id>/complete', lambda ctx, i: (lambda init: dict(
+            method='POST', path=f"/api/uploads/{init['upload_id']}/complete?key={init['key']}",
+            headers=ctx.auth('player')))(_init_upload(ctx, 'player', part=True)), {200}, None),
+        ('DELETE /api/uploads/<id>', lambda ctx, i: (lambda init: dict(
+            method='DELETE', path=f"/api/uploads/{init['upload_id']}?key={init['key']}",
+            headers=ctx.auth('player')))(_init_upload(ctx, 'player')), {200}, None),
+        ('POST /api/uploads/presign', lambda ctx, i: dict(
+            method='POST', path='/api/uploads/presign', headers=ctx.auth('player'),
+            json_body={'filename': 'bench.jpg', 'content_type': 'image/jpeg', 'size': 2048}), {201}, None),
+        ('POST /api/uploads/confirm', lambda ctx, i: dict(
+            method='POST', path='/api/uploads/confirm', headers=ctx.auth('player'),
+            json_body={'key': _upload_presigned(ctx, 'player')}), {200}, None),
+        # 只能签发本人上传或可见记录引用的对象
+        ('GET /api/uploads/signed_url', lambda ctx, i: dict(
+            method='GET', path=f"/api/uploads/signed_url?key={_upload_presigned(ctx, 'player')}",
+            headers=ctx.auth('player')), {200}, None),
+        ('POST /api/token/refresh', lambda ctx, i: dict(
+            method='POST', path='/api/token/refresh',
+            json_body={'refresh_token': ctx.refresh_tokens['player']}), {200}, None),
+        # 计到收到首个事件 (hello) 为止: 鉴权加订阅的开销
+        ('GET /api/events', simple('GET', '/api/events', role='player', first_chunk=True), {200}, None),
+        ('GET /api/metrics', simple('GET', '/api/metrics'), {200}, None),
+        ('GET /api/admin/db_pool', simple('GET', '/api/admin/db_pool'), {200}, None),
+        ('GET /api/admin/jobs', simple('GET', '/api/admin/jobs'), {200}, None),
+        ('GET /api/admin/cache_stats', simple('GET', '/api/admin/cache_stats'), {200}, None),
+    ]
+    return scenarios
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return None
+    k = min(len(sorted_values) - 1, max(0, int(round(p / 100.0 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[k]
+
+
+def run_scenario(ctx, prepare, ok_statuses, requests, concurrency):
+    latencies, queries, errors = [], [], []
+    lock = threading.Lock()
+
+    def one(i):
+        try:
+            spec = prepare(ctx, i)
+        except Exception as e:
+            with lock:
+                errors.append(f'prepare: {e}')
+            return
+        method, path = spec.pop('method'), spec.pop('path')
+        start = time.perf_counter()
+        status, headers, body = ctx.client.request(method, path, **spec)
+        elapsed = time.perf_counter() - start
+        match = SERVER_TIMING_QUERIES.search(headers.get('Server-Timing', '') or '')
+        with lock:
+            latencies.append(elapsed)
+            if match:
+                queries.append(int(match.group(1)))
+            if status not in ok_statuses:
+                errors.append(f'{status}: {body[:120]!r}')
+
+    wall_start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, range(requests)))
+    wall = time.perf_counter() - wall_start
+
+    latencies.sort()
+    ms = lambda v: round(v * 1000, 2) if v is not None else None
+    return {
+        'requests': len(latencies),
+        'errors': len(errors),
+        'error_samples': errors[:3],
+        'throughput_rps': round(len(latencies) / wall, 1) if wall else None,
+        'latency_ms': {
+            'p50': ms(percentile(latencies, 50)),
+            'p95': ms(percentile(latencies, 95)),
+            'p99': ms(percentile(latencies, 99)),
+            'mean': ms(sum(latencies) / len(latencies)) if latencies else None,
+            'max': ms(latencies[-1]) if latencies else None
+        },
+        'queries_per_request': round(sum(queries) / len(queries), 2) if queries else None
+    }
+
+
+def compare(current, baseline_path):
+    with open(baseline_path) as f:
+        baseline = json.load(f)['results']
+    print(f"{'scenario':45} {'p95 before':>12} {'p95 after':>12} {'change':>8}", file=sys.stderr)
+    for name, result in current.items():
+        before = baseline.get(name, {}).get('latency_ms', {}).get('p95')
+        after = result['latency_ms']['p95']
+        change = f'{(after - before) / before * 100:+.0f}%' if before and after is not None else '-'
+        print(f'{name:45} {before if before is not None else "-":>12} {after:>12} {change:>8}', file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--db', default='sqlite:////tmp/bench.db', help='进程内模式使用的数据库 (会自动造数)')
+    parser.add_argument('--url', help='压测已启动的服务, 而不是进程内的 app')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--requests', type=int, default=100, help='每个场景的请求数')
+    parser.add_argument('--only', help='只运行名称包含该字符串的场景')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help='结果 JSON 写入文件 (默认输出到 stdout)')
+    parser.add_argument('--compare', help='与之前的结果 JSON 对比 p95')
+    args = parser.parse_args()
+
+    if args.url:
+        client = HttpClient(args.url)
+        target = args.url
+    else:
+        system = load_app(args.db)
+        seed(system, users=SEED_USERS, trainings=SEED_TRAININGS, matches=SEED_MATCHES, photos=SEED_PHOTOS)
+        client = InProcessClient(system.app)
+        target = args.db
+
+    ctx = Context(client, run_id=uuid.uuid4().hex[:8], rng_seed=args.seed)
+    ctx.login('captain', 'user1')
+    ctx.login('player', 'user4')
+
+    results = {}
+    for name, prepare, ok_statuses, max_requests in build_scenarios():
+        if args.only and args.only not in name:
+            continue
+        requests = min(args.requests, max_requests) if max_requests else args.requests
+        results[name] = run_scenario(ctx, prepare, ok_statuses, requests, args.concurrency)
+        print(f"{name:45} p95={results[name]['latency_ms']['p95']}ms "
+              f"rps={results[name]['throughput_rps']} errors={results[name]['errors']}", file=sys.stderr)
+
+    report = {
+        'meta': {
+            'target': target,
+            'mode': 'http' if args.url else 'in-process',
+            'concurrency': args.concurrency,
+            'requests_per_scenario': args.requests,
+            'seed': args.seed,
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S')
+        },
+        'results': results
+    }
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output)
+    else:
+        print(output)
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == '__main__':
+    main()
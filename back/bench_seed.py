@@ -0,0 +1,127 @@
+"""基准测试公用: 切换数据库并生成可复现的数据集
+
+    python bench_seed.py --db sqlite:////tmp/bench.db --leaves 50000 --personal-trainings 50000
+"""
+import random
+import argparse
+import datetime
+
+
+def load_app(db_uri):
+    """在导入 system 之前切换数据库并改用本地 OBS 替身, 返回 system 模块"""
+    import config
+    config.Config.SQLALCHEMY_DATABASE_URI = db_uri
+    if db_uri.startswith('sqlite'):
+        # SQLite 不支持连接池参数; 并发写时等待锁而不是立即报错
+        config.Config.SQLALCHEMY_ENGINE_OPTIONS = {'connect_args': {'timeout': 30}}
+    config.Config.OBS_BACKEND = 'fake'
+    config.Config.JOBS_WORKERS = 0
+    # 压测从同一 IP 反复登录, 关闭登录限流
+    config.Config.LOGIN_THROTTLE_WINDOW = 0
+    # 压测覆盖 /api/events, 进程内模式下打开变更推送
+    config.Config.EVENTS_ENABLED = True
+    import system
+    return system
+
+
+def seed(system, users=2000, trainings=600, matches=300, signups_per_match=12, leaves=50000,
+         personal_trainings=50000, photos=500, venues=600, random_seed=42):
+    """批量写入数据 (executemany), 已有数据时跳过; 所有用户密码为 'password'"""
+    from werkzeug.security import generate_password_hash
+    db = system.db
+    with system.app.app_context():
+        db.create_all()
+        if system.User.query.first() is not None:
+            return False
+        # 以下按插入顺序假定空表的自增 id 从 1 开始
+
+        rng = random.Random(random_seed)
+        start = datetime.datetime(2022, 9, 1, 18, 0)
+        # 哈希只算一次, 避免 scrypt 拖慢造数
+        password_hash = generate_password_hash('password', method='pbkdf2:sha256:1000')
+
+        roles = ['captain', 'coach', 'manager'] + ['player'] * (users - 3)
+        db.session.execute(db.insert(system.User), [{
+            'username': f'user{i + 1}',
+            'password_hash': password_hash,
+            'role': roles[i],
+            'real_name': f'球员{i + 1}',
+            'student_id': f'S{100000 + i}',
+            # 四分之一的球员在赛季中途入队, 出勤分析按入队时间计算应到
+            'created_at': start + datetime.timedelta(days=i % (trainings * 2)) if i % 4 == 3
+                          else start - datetime.timedelta(days=1)
+        } for i in range(users)])
+
+        db.session.execute(db.insert(system.Training), [{
+            'start_time': start + datetime.timedelta(days=i * 2),
+            'end_time': start + datetime.timedelta(days=i * 2, hours=2),
+            'plan_content': '[]'
+        } for i in range(trainings)])
+
+        db.session.execute(db.insert(system.Match), [{
+            'match_time': start + datetime.timedelta(days=i * 4, hours=1),
+            'opponent': f'对手{i % 40}',
+            'location': '体育馆',
+            'our_score': rng.randint(40, 100),
+            'opponent_score': rng.randint(40, 100),
+            'is_finished': i < matches * 3 // 4
+        } for i in range(matches)])
+
+        signup_rows = []
+        for match_id in range(1, matches + 1):
+            for user_id in rng.sample(range(4, users + 1), min(signups_per_match, users - 3)):
+                signup_rows.append({'match_id': match_id, 'user_id': user_id,
+                                    'real_name': f'球员{user_id}', 'student_id': f'S{100000 + user_id - 1}'})
+        db.session.execute(db.insert(system.MatchSignup), signup_rows)
+
+        leave_rows = []
+        for i in range(leaves):
+            kind = rng.random()
+            leave_rows.append({
+                'user_id': rng.randint(1, users),
+                'training_id': rng.randint(1, trainings) if kind < 0.7 else None,
+                'match_id': rng.randint(1, matches) if 0.7 <= kind < 0.9 else None,
+                'duration_hours': rng.choice([1.0, 1.5, 2.0, 3.0]),
+                'reason': '课程冲突',
+                'status': rng.choice(['pending', 'approved']),
+                'created_at': start + datetime.timedelta(minutes=i * 17)
+            })
+        db.session.execute(db.insert(system.Leave), leave_rows)
+
+        db.session.execute(db.insert(system.PersonalTraining), [{
+            'user_id': rng.randint(1, users),
+            'item_name': rng.choice(['投篮 200 个', '折返跑', '力量训练', '运球练习']),
+            'photo_url': None,
+            'created_at': start + datetime.timedelta(minutes=i * 13)
+        } for i in range(personal_trainings)])
+
+        db.session.execute(db.insert(system.TeamPhoto), [{
+            'photo_url': f'https://example.invalid/photo{i}.jpg',
+            'description': '训练合影',
+            'uploaded_at': start + datetime.timedelta(hours=i * 7)
+        } for i in range(photos)])
+
+        db.session.execute(db.insert(system.Venue), [{
+            'start_time': start + datetime.timedelta(days=i, hours=1),
+            'end_time': start + datetime.timedelta(days=i, hours=3),
+            'updated_by': 1
+        } for i in range(venues)])
+
+        db.session.commit()
+        return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--db', default='sqlite:////tmp/bench.db')
+    parser.add_argument('--users', type=int, default=2000)
+    parser.add_argument('--leaves', type=int, default=50000)
+    parser.add_argument('--personal-trainings', type=int, default=50000)
+    args = parser.parse_args()
+    system = load_app(args.db)
+    created = seed(system, users=args.users, leaves=args.leaves, personal_trainings=args.personal_trainings)
+    print('seeded' if created else 'database already seeded, skipped')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+"""请假 / 个人训练列表序列化基准: 逐行懒加载的 ORM 写法与单条 JOIN 投影查询对比
+
+    python bench_serialize.py --db sqlite:////tmp/bench.db --rows 50000
+"""
+import json
+import time
+import inspect
+import argparse
+
+from bench_seed import load_app, seed
+
+
+def old_leaves(system):
+    # 改造前的写法: 实例化 ORM 对象, 每行访问 user / match / training 时各触发一次懒加载
+    Leave = system.Leave
+    leaves = Leave.query.order_by(Leave.created_at.desc()).all()
+    return system.jsonify([{
+        'id': l.id,
+        'username': l.user.username,
+        'real_name': l.user.real_name,
+        'duration_hours': float(l.duration_hours),
+        'reason': l.reason,
+        'status': l.status,
+        'type': '比赛' if l.match_id else ('训练' if l.training_id else '通用'),
+        'related_info': (l.match.opponent if l.match_id else (l.training.start_time.strftime('%m-%d') if l.training_id else '-'))
+    } for l in leaves])
+
+
+def old_personal_trainings(system):
+    PersonalTraining = system.PersonalTraining
+    logs = PersonalTraining.query.order_by(PersonalTraining.created_at.desc()).all()
+    return system.jsonify([{
+        'id': l.id,
+        'username': l.user.username,
+        'real_name': l.user.real_name,
+        'item_name': l.item_name,
+        'photo_url': l.photo_url,
+        'timestamp': l.created_at.strftime('%Y-%m-%d %H:%M')
+    } for l in logs])
+
+
+def measure(system, fn, repeat):
+    counter = {'n': 0}
+
+    def count(*args, **kwargs):
+        counter['n'] += 1
+
+    system.db.event.listen(system.db.engine, 'before_cursor_execute', count)
+    best = None
+    try:
+        for _ in range(repeat):
+            # 每轮使用新的会话, 避免身份映射缓存让懒加载看起来变快
+            system.db.session.remove()
+            counter['n'] = 0
+            start = time.perf_counter()
+            resp = fn()
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None or elapsed < best else best
+    finally:
+        system.db.event.remove(system.db.engine, 'before_cursor_execute', count)
+    rows = len(resp.get_json())
+    return {'rows': rows, 'seconds': round(best, 4), 'rows_per_second': int(rows / best), 'queries': counter['n']}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--db', default='sqlite:////tmp/bench.db')
+    parser.add_argument('--rows', type=int, default=50000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    system = load_app(args.db)
+    # 对比整表序列化, 不分页
+    system.app.config['LIST_DEFAULT_LIMIT'] = 0
+    seed(system, leaves=args.rows, personal_trainings=args.rows)
+    captain = system.AuthUser(1, 'captain', '队长', 'S100000')
+    new_leaves = inspect.unwrap(system.get_leaves)
+    new_personal_trainings = inspect.unwrap(system.get_personal_trainings)
+
+    results = {}
+    with system.app.test_request_context('/?variant=original'):
+        results['leaves'] = {
+            'before': measure(system, lambda: old_leaves(system), args.repeat),
+            'after': measure(system, lambda: new_leaves(captain), args.repeat)
+        }
+        results['personal_trainings'] = {
+            'before': measure(system, lambda: old_personal_trainings(system), args.repeat),
+            'after': measure(system, lambda: new_personal_trainings(captain), args.repeat)
+        }
+    for r in results.values():
+        r['speedup'] = round(r['after']['rows_per_second'] / r['before']['rows_per_second'], 2)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+"""上传路径基准: 整块读入 putContent 与分段流式上传的吞吐和峰值内存对比
+
+使用本地 FakeObsClient, 不需要真实 OBS。每种模式在独立子进程中运行, 以便分别统计峰值 RSS。
+
+    python bench_upload.py --size-mb 20 --part-mb 5 --workers 2 --latency 0.05
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import resource
+import tempfile
+import subprocess
+
+
+def run_mode(mode, path, part_size, workers, latency):
+    from fake_obs import FakeObsClient
+    from storage import stream_upload
+
+    client = FakeObsClient(latency=latency)
+    size = os.path.getsize(path)
+    baseline_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    with open(path, 'rb') as f:
+        if mode == 'buffered':
+            client.putContent(bucketName='bench', objectKey='obj', content=f.read())
+        else:
+            stream_upload(client, 'bench', 'obj', f, part_size=part_size, workers=workers)
+    elapsed = time.perf_counter() - start
+    peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return {
+        'mode': mode,
+        'bytes': size,
+        'seconds': round(elapsed, 4),
+        'throughput_mb_s': round(size / 1024 / 1024 / elapsed, 2),
+        'peak_rss_mb': round(peak_kb / 1024, 1),
+        'rss_growth_mb': round((peak_kb - baseline_kb) / 1024, 1)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--size-mb', type=int, default=20)
+    parser.add_argument('--part-mb', type=int, default=5)
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--latency', type=float, default=0.0, help='每次 OBS 调用模拟的往返延迟 (秒)')
+    parser.add_argument('--mode', choices=['buffered', 'streaming'])
+    parser.add_argument('--file')
+    args = parser.parse_args()
+    part_size = args.part_mb * 1024 * 1024
+
+    if args.mode:
+        print(json.dumps(run_mode(args.mode, args.file, part_size, args.workers, args.latency)))
+        return
+
+    with tempfile.NamedTemporaryFile(delete=False) as f:
+        for _ in range(args.size_mb):
+            f.write(os.urandom(1024 * 1024))
+        path = f.name
+    try:
+        results = []
+        for mode in ('buffered', 'streaming'):
+            out = subprocess.check_output([
+                sys.executable, __file__, '--mode', mode, '--file', path,
+                '--part-mb', str(args.part_mb), '--workers', str(args.workers), '--latency', str(args.latency)
+            ], cwd=os.path.dirname(os.path.abspath(__file__)))
+            results.append(json.loads(out))
+        print(json.dumps(results, indent=2))
+    finally:
+        os.remove(path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,223 @@
+import os
+import time
+import random
+import hashlib
+import fcntl
+import tempfile
+import threading
+from collections import OrderedDict
+
+
+class TTLCache:
+    """进程内 TTL + LRU 缓存
+
+    每个 gunicorn worker 各自持有一份, 超过 maxsize 时淘汰最久未使用的条目,
+    超过 ttl 秒的条目视为过期。hits / misses 用于观察省掉了多少次数据库往返。
+    """
+
+    def __init__(self, maxsize=1024, ttl=60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None or item[1] < time.monotonic():
+                if item is not None:
+                    del self._data[key]
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return item[0]
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + self.ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'size': len(self._data),
+                'maxsize': self.maxsize,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses
+            }
+
+
+class FileCache:
+    """跨进程共享的文件缓存, Redis 不可用时的后备
+
+    每个键一个文件 (文件名为键的 sha1), 首行为过期时间戳; 写入先落临时文件再 rename,
+    读者不会看到写了一半的内容。目录默认放在 /dev/shm (内存文件系统), 同机的所有
+    gunicorn worker 共用一份。
+    """
+
+    def __init__(self, path, ttl=300):
+        self.path = path
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(path, exist_ok=True)
+
+    def _file(self, key):
+        return os.path.join(self.path, hashlib.sha1(key.encode()).hexdigest())
+
+    def get(self, key):
+        try:
+            with open(self._file(key), 'rb') as f:
+                expires = float(f.readline())
+                value = f.read() if expires >= time.time() else None
+        except (OSError, ValueError):
+            value = None
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def set(self, key, value):
+        tmp = None
+        try:
+            fd, tmp = tempfile.mkstemp(dir=self.path, prefix='.tmp')
+            with os.fdopen(fd, 'wb') as f:
+                f.write(b'%f\n' % (time.time() + self.ttl))
+                f.write(value)
+            os.replace(tmp, self._file(key))
+        except OSError:
+            if tmp and os.path.exists(tmp):
+                os.remove(tmp)
+        # 键里带有资源版本, 旧版本的条目不会再被读到, 这里顺带清掉过期文件
+        if random.random() < 0.01:
+            self.prune()
+
+    def incr(self, key):
+        """计数 +1 并返回新值, 计数在首次写入 ttl 秒后归零 (固定窗口); 用文件锁保证多进程原子性"""
+        fd = os.open(self._file(key), os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            with os.fdopen(os.dup(fd), 'r+b') as f:
+                try:
+                    expires = float(f.readline())
+                    count = int(f.read() or 0)
+                except ValueError:
+                    expires, count = 0, 0
+                now = time.time()
+                if expires < now:
+                    expires, count = now + self.ttl, 0
+                count += 1
+                f.seek(0)
+                f.truncate()
+                f.write(b'%f\n%d' % (expires, count))
+            return count
+        finally:
+            os.close(fd)
+
+    def delete(self, key):
+        try:
+            os.remove(self._file(key))
+        except OSError:
+            pass
+
+    def prune(self):
+        now = time.time()
+        for name in os.listdir(self.path):
+            path = os.path.join(self.path, name)
+            try:
+                with open(path, 'rb') as f:
+                    expired = float(f.readline() or 0) < now
+                if expired:
+                    os.remove(path)
+            except (OSError, ValueError):
+                continue
+
+    def stats(self):
+        return {'backend': 'file', 'path': self.path, 'ttl': self.ttl,
+                'size': len(os.listdir(self.path)), 'hits': self.hits, 'misses': self.misses}
+
+
+class RedisCache:
+    """基于 Redis 的跨进程 / 跨主机共享缓存, Redis 出错时按未命中处理"""
+
+    def __init__(self, client, ttl=300, prefix='basketball:'):
+        self.client = client
+        self.ttl = ttl
+        self.prefix = prefix
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        try:
+            value = self.client.get(self.prefix + key)
+        except Exception:
+            value = None
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def set(self, key, value):
+        try:
+            self.client.set(self.prefix + key, value, ex=self.ttl)
+        except Exception:
+            pass
+
+    def incr(self, key):
+        """计数 +1 并返回新值, 首次计数时设置 ttl 秒过期 (固定窗口)"""
+        try:
+            count = self.client.incr(self.prefix + key)
+            if count == 1:
+                self.client.expire(self.prefix + key, self.ttl)
+            return count
+        except Exception:
+            return 0
+
+    def delete(self, key):
+        try:
+            self.client.delete(self.prefix + key)
+        except Exception:
+            pass
+
+    def stats(self):
+        try:
+            size = self.client.dbsize()
+        except Exception:
+            size = None
+        return {'backend': 'redis', 'ttl': self.ttl, 'size': size, 'hits': self.hits, 'misses': self.misses}
+
+
+def create_shared_cache(config, ttl, logger=None):
+    """创建跨进程共享缓存: 配置了 REDIS_URL 且可连通时用 Redis, 否则用文件缓存;
+    ttl 为 0 时返回 None (关闭)"""
+    if ttl <= 0:
+        return None
+    url = config.get('REDIS_URL')
+    if url:
+        try:
+            import redis
+            client = redis.Redis.from_url(url, socket_timeout=0.5, socket_connect_timeout=0.5)
+            client.ping()
+            return RedisCache(client, ttl=ttl)
+        except Exception as e:
+            if logger is not None:
+                logger.warning('Redis unavailable (%s), falling back to file cache', e)
+    path = config.get('RESPONSE_CACHE_DIR') or os.path.join(
+        '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir(), 'basketball-cache')
+    return FileCache(path, ttl=ttl)
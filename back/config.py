@@ -15,14 +15,113 @@ class Config:
     DB_NAME = config('DB_NAME', default='drone_db')
 
     # Flask-SQLAlchemy 配置
-    SQLALCHEMY_DATABASE_URI = (
-        f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+    # 设置 DATABASE_URL 时直接使用 (如压测用的本地库), 否则由上面的 DB_* 拼接
+    SQLALCHEMY_DATABASE_URI = config(
+        'DATABASE_URL', default=f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
     )
     SQLALCHEMY_TRACK_MODIFICATIONS = False # 禁用 Flask-SQLAlchemy 事件系统，减少内存消耗
 
+    # 连接池配置 (每个 gunicorn worker 一个池, 总连接数 = workers * (POOL_SIZE + MAX_OVERFLOW))
+    DB_POOL_SIZE = config('DB_POOL_SIZE', default=3, cast=int)
+    DB_MAX_OVERFLOW = config('DB_MAX_OVERFLOW', default=2, cast=int)
+    DB_POOL_TIMEOUT = config('DB_POOL_TIMEOUT', default=10, cast=int) # 等待空闲连接的秒数
+    DB_POOL_RECYCLE = config('DB_POOL_RECYCLE', default=1800, cast=int) # 连接最长存活秒数, 需小于云数据库/防火墙的空闲断开时间
+    DB_POOL_PRE_PING = config('DB_POOL_PRE_PING', default=True, cast=bool) # 取出连接前探活, 避免空闲后的断连错误
+    DB_STATEMENT_TIMEOUT_MS = config('DB_STATEMENT_TIMEOUT_MS', default=15000, cast=int) # 单条 SQL 超时, 0 为不限制
+    # 通过 PgBouncer (transaction 模式) 连接时打开: 不发送启动参数, 不使用服务端预编译语句
+    # 此时 statement_timeout 需在数据库角色上设置 (ALTER ROLE ... SET statement_timeout)
+    DB_PGBOUNCER = config('DB_PGBOUNCER', default=False, cast=bool)
+
+    SQLALCHEMY_ENGINE_OPTIONS = {
+        'pool_size': DB_POOL_SIZE,
+        'max_overflow': DB_MAX_OVERFLOW,
+        'pool_timeout': DB_POOL_TIMEOUT,
+        'pool_recycle': DB_POOL_RECYCLE,
+        'pool_pre_ping': DB_POOL_PRE_PING,
+        'pool_use_lifo': True, # 优先复用最近归还的连接, 多余的空闲连接可被回收
+        'connect_args': (
+            {'prepare_threshold': None} if DB_PGBOUNCER and SQLALCHEMY_DATABASE_URI.startswith('postgresql+psycopg:')
+            # options 是 libpq 的启动参数, SQLite 等其他驱动不认识, 只对 Postgres 连接传
+            else {} if DB_PGBOUNCER or not DB_STATEMENT_TIMEOUT_MS or not SQLALCHEMY_DATABASE_URI.startswith('postgresql')
+            else {'options': f'-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}'}
+        ),
+    }
+
     # JWT 配置
     JWT_SECRET_KEY = config('JWT_SECRET_KEY', default='another_very_secret_jwt_signing_key_for_dev')
-    JWT_ACCESS_TOKEN_EXPIRES = config('JWT_ACCESS_TOKEN_EXPIRES', default=3600, cast=int) # access token 过期时间 (秒), 默认1小时
+    JWT_ACCESS_TOKEN_EXPIRES = config('JWT_ACCESS_TOKEN_EXPIRES', default=900, cast=int) # access token 过期时间 (秒), 默认15分钟
+    JWT_REFRESH_TOKEN_EXPIRES = config('JWT_REFRESH_TOKEN_EXPIRES', default=14 * 24 * 3600, cast=int) # refresh token 过期时间 (秒), 默认14天
+
+    # 列表接口分页配置
+    # 未传 ?limit= 时的每页条数, 更多数据通过 X-Next-Cursor 翻页; 设为 0 表示返回全部
+    LIST_DEFAULT_LIMIT = config('LIST_DEFAULT_LIMIT', default=50, cast=int)
+    LIST_MAX_LIMIT = config('LIST_MAX_LIMIT', default=500, cast=int) # 单页最大条数
+    BULK_MAX_ITEMS = config('BULK_MAX_ITEMS', default=500, cast=int) # 批量写接口单次最多条数
+    PURGE_BATCH_SIZE = config('PURGE_BATCH_SIZE', default=1000, cast=int) # 清理旧赛季数据时每批删除的行数
+
+    # 日程冲突检测: 训练与比赛共用球队日程, 场地预约单独一个日程, 同一日程内的时间段不能重叠。
+    # 单个时间段最长 SCHEDULE_MAX_HOURS 小时 (冲突查询据此限定索引扫描范围), 比赛按 MATCH_DURATION_MINUTES 计时长,
+    # /api/schedule 单次查询的时间窗口最长 SCHEDULE_MAX_WINDOW_DAYS 天
+    SCHEDULE_MAX_HOURS = config('SCHEDULE_MAX_HOURS', default=24, cast=int)
+    MATCH_DURATION_MINUTES = config('MATCH_DURATION_MINUTES', default=120, cast=int)
+    SCHEDULE_MAX_WINDOW_DAYS = config('SCHEDULE_MAX_WINDOW_DAYS', default=92, cast=int)
+
+    # 密码哈希: werkzeug 参数串需写全 (scrypt:N:r:p 或 pbkdf2:sha256:迭代次数), 修改后已有用户在下次登录时自动重新哈希;
+    # 每个 worker 的哈希进程数、同时在途的哈希任务上限 (超出返回 503) 和哈希进程的 nice 值
+    PASSWORD_HASH_METHOD = config('PASSWORD_HASH_METHOD', default='scrypt:32768:8:1')
+    PASSWORD_HASH_WORKERS = config('PASSWORD_HASH_WORKERS', default=1, cast=int)
+    PASSWORD_HASH_QUEUE = config('PASSWORD_HASH_QUEUE', default=4, cast=int)
+    PASSWORD_HASH_NICE = config('PASSWORD_HASH_NICE', default=10, cast=int)
+    # 登录限流: 窗口 (秒) 内同一用户名 / 同一 IP 的最大登录次数, 超出直接返回 429 不做哈希; 窗口为 0 表示关闭
+    LOGIN_THROTTLE_WINDOW = config('LOGIN_THROTTLE_WINDOW', default=60, cast=int)
+    LOGIN_MAX_PER_USERNAME = config('LOGIN_MAX_PER_USERNAME', default=10, cast=int)
+    LOGIN_MAX_PER_IP = config('LOGIN_MAX_PER_IP', default=100, cast=int) # 校园网 NAT 下全队可能共用一个出口 IP
+    # 后端前面的反向代理层数 (docker 部署为 nginx 一层); ProxyFix 按它从 X-Forwarded-For 取客户端 IP, 直连部署设为 0
+    PROXY_FIX_X_FOR = config('PROXY_FIX_X_FOR', default=1, cast=int)
+
+    # 旧版令牌 (不带角色声明) 的用户鉴权信息缓存 (每个 worker 进程一份)
+    AUTH_CACHE_TTL = config('AUTH_CACHE_TTL', default=60, cast=int) # 秒, 也是其他 worker 看到角色变更的最长延迟
+    AUTH_CACHE_SIZE = config('AUTH_CACHE_SIZE', default=1024, cast=int)
+
+    # 读接口的跨 worker 共享响应缓存: 配置 REDIS_URL (如 redis://localhost:6379/0) 时用 Redis,
+    # 否则用 RESPONSE_CACHE_DIR 下的文件缓存 (默认 /dev/shm); TTL 为 0 表示关闭
+    REDIS_URL = config('REDIS_URL', default='')
+    RESPONSE_CACHE_DIR = config('RESPONSE_CACHE_DIR', default='')
+    RESPONSE_CACHE_TTL = config('RESPONSE_CACHE_TTL', default=300, cast=int)
+
+    # 后台任务队列: 每个进程的工作线程数、轮询间隔 (秒)、最大重试次数、退避基数 (秒)
+    # 以及 running 状态任务被视为卡死而重新领取的超时 (秒)
+    JOBS_WORKERS = config('JOBS_WORKERS', default=2, cast=int)
+    JOBS_POLL_INTERVAL = config('JOBS_POLL_INTERVAL', default=1.0, cast=float)
+    JOBS_MAX_ATTEMPTS = config('JOBS_MAX_ATTEMPTS', default=5, cast=int)
+    JOBS_BACKOFF_BASE = config('JOBS_BACKOFF_BASE', default=2, cast=int)
+    JOBS_VISIBILITY_TIMEOUT = config('JOBS_VISIBILITY_TIMEOUT', default=300, cast=int)
+    # 写操作提交后延迟多少秒在后台重算仪表盘统计, 这段时间内的多次写入合并为一次重算
+    DASHBOARD_REFRESH_DELAY = config('DASHBOARD_REFRESH_DELAY', default=1, cast=int)
+
+    # 性能观测: 慢查询阈值 (毫秒), /api/metrics 访问令牌 (为空则不校验),
+    # 以及按请求开启的 cProfile (请求头 X-Profile: 1) 和结果输出目录
+    SLOW_QUERY_MS = config('SLOW_QUERY_MS', default=200, cast=int)
+    METRICS_TOKEN = config('METRICS_TOKEN', default='')
+    PROFILE_ENABLED = config('PROFILE_ENABLED', default=False, cast=bool)
+    PROFILE_DIR = config('PROFILE_DIR', default='/tmp/profiles')
+
+    # 服务模式: 'sync' 为每个 worker 同时处理一个请求; 'gevent' 为协程 worker,
+    # 每个 worker 可同时挂起 GUNICORN_WORKER_CONNECTIONS 个等待 I/O 的请求 (此时应相应调大 DB_POOL_SIZE)
+    SERVER_MODE = config('SERVER_MODE', default='sync')
+    GUNICORN_WORKERS = config('GUNICORN_WORKERS', default=9, cast=int)
+    GUNICORN_WORKER_CONNECTIONS = config('GUNICORN_WORKER_CONNECTIONS', default=200, cast=int)
+
+    # 实时变更推送 (SSE, /api/events): 每个连接一直挂在所在 worker 上, 只在 gevent 模式下默认开启,
+    # 同时在线的连接数上限约为 GUNICORN_WORKERS * GUNICORN_WORKER_CONNECTIONS。
+    # EVENTS_BROKER: 'postgres' 经 LISTEN/NOTIFY 在所有 worker 间分发 (每个 worker 多占一条数据库连接),
+    # 'local' 只投递给本进程的连接 (单 worker 开发), 'auto' 按数据库类型选择;
+    # 经 PgBouncer (transaction 模式) 连接时 LISTEN 不可用, 需用 EVENTS_LISTEN_URL 指定数据库直连地址
+    EVENTS_ENABLED = config('EVENTS_ENABLED', default=SERVER_MODE == 'gevent', cast=bool)
+    EVENTS_BROKER = config('EVENTS_BROKER', default='auto')
+    EVENTS_LISTEN_URL = config('EVENTS_LISTEN_URL', default='')
+    EVENTS_KEEPALIVE = config('EVENTS_KEEPALIVE', default=20, cast=int) # 心跳间隔 (秒), 需小于代理的读超时
+    EVENTS_QUEUE_SIZE = config('EVENTS_QUEUE_SIZE', default=100, cast=int) # 每个连接最多积压的事件数, 超出则通知客户端整体重拉
 
     # Flask 环境配置
     FLASK_ENV = config('FLASK_ENV', default='development')
@@ -33,5 +132,21 @@ class Config:
     OBS_SECRET_KEY = config('OBS_SECRET_KEY', default='')
     # 这里直接填你刚才创建的 Endpoint
     OBS_ENDPOINT = config('OBS_ENDPOINT', default='obs.cn-north-4.myhuaweicloud.com')
+    # Endpoint 所在区域, V4 签名 (直传上传 URL) 需要
+    OBS_REGION = config('OBS_REGION', default='cn-north-4')
     # 这里直接填你刚才创建的桶名
-    OBS_BUCKET_NAME = config('OBS_BUCKET_NAME', default='obs-baskb')
\ No newline at end of file
+    OBS_BUCKET_NAME = config('OBS_BUCKET_NAME', default='obs-baskb')
+
+    # OBS_BACKEND: 'obs' 使用华为云 OBS, 'fake' 使用本地文件替身 (离线开发 / 压测)
+    OBS_BACKEND = config('OBS_BACKEND', default='obs')
+    OBS_FAKE_DIR = config('OBS_FAKE_DIR', default='')
+    OBS_FAKE_LATENCY = config('OBS_FAKE_LATENCY', default=0.0, cast=float) # 本地替身模拟的每次调用往返 (秒)
+    # 分段上传: 每段大小 (OBS 要求除最后一段外不小于 100KB) 和单个请求的并行分段数
+    OBS_PART_SIZE = config('OBS_PART_SIZE', default=5 * 1024 * 1024, cast=int)
+    OBS_UPLOAD_WORKERS = config('OBS_UPLOAD_WORKERS', default=2, cast=int)
+    # 图片变体: 列表接口默认返回的尺寸 (thumb / medium / full / original) 和 WebP 压缩质量
+    LIST_IMAGE_VARIANT = config('LIST_IMAGE_VARIANT', default='thumb')
+    IMAGE_VARIANT_QUALITY = config('IMAGE_VARIANT_QUALITY', default=80, cast=int)
+    # 直传 OBS 的预签名 URL 有效期 (秒) 和单个文件的大小上限 (与 nginx 的 client_max_body_size 20M 一致)
+    OBS_PRESIGN_EXPIRES = config('OBS_PRESIGN_EXPIRES', default=300, cast=int)
+    UPLOAD_MAX_BYTES = config('UPLOAD_MAX_BYTES', default=20 * 1024 * 1024, cast=int)
@@ -0,0 +1,180 @@
+import json
+import time
+import queue
+import select
+import logging
+import threading
+from sqlalchemy import text
+
+# 单条 NOTIFY 的载荷上限是 8000 字节, 超出的事件只推送实体和动作, 由客户端重新拉取
+NOTIFY_PAYLOAD_LIMIT = 7900
+
+
+class Subscription:
+    """一个 SSE 连接的事件队列; 队列满 (客户端太慢) 时丢弃后续事件并标记 overflowed, 由连接通知客户端整体重拉"""
+
+    def __init__(self, user_id, role, size):
+        self.user_id = user_id
+        self.role = role
+        self.overflowed = False
+        self._queue = queue.Queue(size)
+
+    def wants(self, event):
+        # audience 为某个用户 id 的事件 (如请假) 只发给本人和队长 / 教练
+        audience = event.get('audience')
+        return audience is None or audience == self.user_id or self.role in ('captain', 'coach')
+
+    def offer(self, event):
+        try:
+            self._queue.put_nowait(event)
+        except queue.Full:
+            self.overflowed = True
+
+    def get(self, timeout):
+        """取下一条事件, timeout 秒内没有事件返回 None"""
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def drain(self):
+        while True:
+            try:
+                self._queue.get_nowait()
+            except queue.Empty:
+                return
+
+
+class LocalBroker:
+    """进程内的事件分发: 事务提交后直接投递给本进程的订阅者
+
+    只适用于单个 worker (本地开发); 多个 gunicorn worker 时用 PostgresBroker。
+    """
+
+    def __init__(self, queue_size=100):
+        self.queue_size = queue_size
+        self._subscribers = set()
+        self._lock = threading.Lock()
+
+    def subscribe(self, user_id, role):
+        sub = Subscription(user_id, role, self.queue_size)
+        with self._lock:
+            self._subscribers.add(sub)
+        return sub
+
+    def unsubscribe(self, sub):
+        with self._lock:
+            self._subscribers.discard(sub)
+
+    def dispatch(self, event):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for sub in subscribers:
+            if sub.wants(event):
+                sub.offer(event)
+
+    def stage(self, session, events):
+        """事务提交前调用 (仍在事务内)"""
+
+    def committed(self, events):
+        """事务提交后调用"""
+        for event in events:
+            self.dispatch(event)
+
+    def stats(self):
+        with self._lock:
+            return {'backend': 'local', 'subscribers': len(self._subscribers)}
+
+
+class PostgresBroker(LocalBroker):
+    """经 Postgres LISTEN/NOTIFY 在所有 worker / 实例之间分发事件
+
+    写接口在自己的事务里执行 pg_notify, 事务提交时通知才发出, 回滚则一并作废;
+    每个进程在第一个订阅者出现时启动一个监听线程, 用一条独立连接 LISTEN,
+    收到的通知 (包括本进程发出的) 再投递给本进程的订阅者。
+    """
+
+    def __init__(self, connect, channel='basketball_events', queue_size=100, logger=None):
+        super().__init__(queue_size)
+        self.connect = connect
+        self.channel = channel
+        self.logger = logger or logging.getLogger(__name__)
+        self.reconnects = 0
+        self._listener = None
+
+    def subscribe(self, user_id, role):
+        with self._lock:
+            if self._listener is None:
+                self._listener = threading.Thread(target=self._listen, name='events-listener', daemon=True)
+                self._listener.start()
+        return super().subscribe(user_id, role)
+
+    def stage(self, session, events):
+        payloads = []
+        for event in events:
+            payload = json.dumps(event, ensure_ascii=False, default=str)
+            if len(payload.encode()) > NOTIFY_PAYLOAD_LIMIT:
+                payload = json.dumps({'entity': event['entity'], 'action': 'reload', 'data': {},
+                                      'audience': event.get('audience')})
+            payloads.append(payload)
+        session.execute(text('SELECT pg_notify(:channel, p) FROM unnest(CAST(:payloads AS text[])) AS p'),
+                        {'channel': self.channel, 'payloads': payloads})
+
+    def committed(self, events):
+        # 由监听线程收到通知后投递
+        pass
+
+    def _listen(self):
+        while True:
+            conn = None
+            try:
+                conn = self.connect()
+                conn.autocommit = True
+                conn.cursor().execute(f'LISTEN "{self.channel}"')
+                while True:
+                    if select.select([conn], [], [], 60)[0]:
+                        conn.poll()
+                        while conn.notifies:
+                            self.dispatch(json.loads(conn.notifies.pop(0).payload))
+                    else:
+                        # 长时间没有通知时探活, 及时发现被防火墙断开的连接
+                        conn.cursor().execute('SELECT 1')
+            except Exception:
+                self.logger.exception('Event listener connection lost, reconnecting')
+            finally:
+                if conn is not None:
+                    try:
+                        conn.close()
+                    except Exception:
+                        pass
+            # 断线期间的通知已经丢失, 让所有连接上的客户端整体重拉
+            self.reconnects += 1
+            with self._lock:
+                for sub in self._subscribers:
+                    sub.overflowed = True
+            time.sleep(1)
+
+    def stats(self):
+        stats = super().stats()
+        stats.update(backend='postgres', listening=self._listener is not None, reconnects=self.reconnects)
+        return stats
+
+
+def create_broker(config, engine, logger=None):
+    """EVENTS_BROKER 为 auto 时 Postgres 用 LISTEN/NOTIFY, 其他数据库 (SQLite 开发环境) 用进程内分发"""
+    backend = config['EVENTS_BROKER']
+    if backend == 'auto':
+        backend = 'postgres' if engine.dialect.name == 'postgresql' else 'local'
+    if backend != 'postgres':
+        return LocalBroker(config['EVENTS_QUEUE_SIZE'])
+
+    if config['EVENTS_LISTEN_URL']:
+        # 经 PgBouncer (transaction 模式) 连接时 LISTEN 不可用, 监听连接直连数据库
+        import psycopg2
+        url = config['EVENTS_LISTEN_URL']
+        connect = lambda: psycopg2.connect(url)
+    else:
+        # 与连接池使用相同的连接参数, 但不占用池里的连接
+        args, kwargs = engine.dialect.create_connect_args(engine.url)
+        connect = lambda: engine.dialect.connect(*args, **kwargs)
+    return PostgresBroker(connect, queue_size=config['EVENTS_QUEUE_SIZE'], logger=logger)
@@ -0,0 +1,158 @@
+import os
+import time
+import mimetypes
+import uuid
+import shutil
+import hashlib
+import tempfile
+import threading
+
+
+class _Body(dict):
+    """模拟 SDK 返回体: 既可以 body.uploadId 也可以 body['uploadId']"""
+    __getattr__ = dict.get
+
+
+class _Result:
+    def __init__(self, status=200, body=None, errorMessage=None):
+        self.status = status
+        self.body = _Body(body or {})
+        self.errorCode = None if status < 300 else str(status)
+        self.errorMessage = errorMessage
+        self.reason = 'OK' if status < 300 else errorMessage
+
+
+class FakeObsClient:
+    """本地文件系统版的 OBS 客户端替身
+
+    只实现系统用到的接口, 签名与 esdk-obs-python 的 ObsClient 保持一致,
+    用于离线开发、压测和上传吞吐/内存基准。latency 参数用来模拟每次调用的网络往返。
+    """
+
+    CHUNK = 64 * 1024
+
+    def __init__(self, root=None, latency=0.0, **kwargs):
+        self.root = root or tempfile.mkdtemp(prefix='fake_obs_')
+        self.latency = latency
+        self._lock = threading.Lock()
+        os.makedirs(self.root, exist_ok=True)
+
+    def _sleep(self):
+        if self.latency:
+            time.sleep(self.latency)
+
+    def _object_path(self, bucketName, objectKey):
+        return os.path.join(self.root, bucketName, objectKey)
+
+    def _upload_dir(self, uploadId):
+        return os.path.join(self.root, '.uploads', uploadId)
+
+    def _write(self, path, content, size=None):
+        # 流式写入, 可读对象按 CHUNK 读取, 避免整块载入内存
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        md5 = hashlib.md5()
+        with open(path, 'wb') as f:
+            if hasattr(content, 'read'):
+                remaining = size
+                while remaining is None or remaining > 0:
+                    chunk = content.read(self.CHUNK if remaining is None else min(self.CHUNK, remaining))
+                    if not chunk:
+                        break
+                    f.write(chunk)
+                    md5.update(chunk)
+                    if remaining is not None:
+                        remaining -= len(chunk)
+            else:
+                if isinstance(content, str):
+                    content = content.encode()
+                f.write(content or b'')
+                md5.update(content or b'')
+        return md5.hexdigest()
+
+    def putContent(self, bucketName, objectKey, content=None, **kwargs):
+        self._sleep()
+        etag = self._write(self._object_path(bucketName, objectKey), content)
+        return _Result(body={'etag': etag})
+
+    def getObject(self, bucketName, objectKey, downloadPath=None, loadStreamInMemory=False, **kwargs):
+        self._sleep()
+        path = self._object_path(bucketName, objectKey)
+        if not os.path.exists(path):
+            return _Result(404, errorMessage='NoSuchKey')
+        with open(path, 'rb') as f:
+            data = f.read()
+        return _Result(body={'buffer': data, 'size': len(data)})
+
+    def getObjectMetadata(self, bucketName, objectKey, **kwargs):
+        self._sleep()
+        path = self._object_path(bucketName, objectKey)
+        if not os.path.exists(path):
+            return _Result(404, errorMessage='NoSuchKey')
+        return _Result(body={
+            'contentLength': os.path.getsize(path),
+            'contentType': mimetypes.guess_type(objectKey)[0] or 'application/octet-stream'
+        })
+
+    def createSignedUrl(self, method, bucketName=None, objectKey=None, specialParam=None, expires=300,
+                        headers=None, queryParams=None):
+        # 本地替身不校验签名, 返回文件路径形式的 URL, 结构与 SDK 返回值一致
+        url = 'file://%s?Expires=%d' % (self._object_path(bucketName, objectKey), int(time.time()) + expires)
+        return _Body({'signedUrl': url, 'actualSignedRequestHeaders': dict(headers or {})})
+
+    createV4SignedUrl = createSignedUrl
+
+    def deleteObject(self, bucketName, objectKey, **kwargs):
+        self._sleep()
+        path = self._object_path(bucketName, objectKey)
+        if os.path.exists(path):
+            os.remove(path)
+        return _Result(204)
+
+    def initiateMultipartUpload(self, bucketName, objectKey, **kwargs):
+        self._sleep()
+        uploadId = uuid.uuid4().hex
+        os.makedirs(self._upload_dir(uploadId))
+        return _Result(body={'bucketName': bucketName, 'objectKey': objectKey, 'uploadId': uploadId})
+
+    def uploadPart(self, bucketName, objectKey, partNumber, uploadId, object=None, isFile=False,
+                   partSize=None, content=None, **kwargs):
+        self._sleep()
+        if content is None:
+            content = object
+        upload_dir = self._upload_dir(uploadId)
+        if not os.path.isdir(upload_dir):
+            return _Result(404, errorMessage='NoSuchUpload')
+        etag = self._write(os.path.join(upload_dir, '%05d' % int(partNumber)), content, partSize)
+        return _Result(body={'etag': etag})
+
+    def listParts(self, bucketName, objectKey, uploadId, **kwargs):
+        self._sleep()
+        upload_dir = self._upload_dir(uploadId)
+        if not os.path.isdir(upload_dir):
+            return _Result(404, errorMessage='NoSuchUpload')
+        parts = []
+        for name in sorted(os.listdir(upload_dir)):
+            path = os.path.join(upload_dir, name)
+            with open(path, 'rb') as f:
+                etag = hashlib.md5(f.read()).hexdigest()
+            parts.append(_Body({'partNumber': int(name), 'etag': etag, 'size': os.path.getsize(path)}))
+        return _Result(body={'parts': parts})
+
+    def completeMultipartUpload(self, bucketName, objectKey, uploadId, completeMultipartUploadRequest, **kwargs):
+        self._sleep()
+        upload_dir = self._upload_dir(uploadId)
+        if not os.path.isdir(upload_dir):
+            return _Result(404, errorMessage='NoSuchUpload')
+        path = self._object_path(bucketName, objectKey)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as out:
+            for part in sorted(completeMultipartUploadRequest.parts, key=lambda p: p.partNum):
+                with open(os.path.join(upload_dir, '%05d' % part.partNum), 'rb') as f:
+                    shutil.copyfileobj(f, out, self.CHUNK)
+        shutil.rmtree(upload_dir)
+        return _Result(body={'bucketName': bucketName, 'objectKey': objectKey})
+
+    def abortMultipartUpload(self, bucketName, objectKey, uploadId, **kwargs):
+        self._sleep()
+        shutil.rmtree(self._upload_dir(uploadId), ignore_errors=True)
+        return _Result(204)
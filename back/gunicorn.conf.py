@@ -0,0 +1,41 @@
+# gunicorn 配置: docker 中通过 `gunicorn -c gunicorn.conf.py` 加载
+import os
+import sys
+import glob
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from config import Config
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:5000')
+# 公式：(2 x CPU核数) + 1 = (2 x 4) + 1 = 9
+workers = Config.GUNICORN_WORKERS
+
+# SERVER_MODE=gevent 时每个 worker 用协程同时处理多个请求,
+# 等待数据库 / OBS 的请求不再独占进程, 并发上限为 workers * worker_connections
+if Config.SERVER_MODE == 'gevent':
+    worker_class = 'gevent'
+    worker_connections = Config.GUNICORN_WORKER_CONNECTIONS
+else:
+    worker_class = 'sync'
+
+
+def on_starting(server):
+    # Prometheus 多进程模式: 启动时清空上次运行留下的指标文件
+    path = os.environ.get('PROMETHEUS_MULTIPROC_DIR')
+    if path:
+        os.makedirs(path, exist_ok=True)
+        for f in glob.glob(os.path.join(path, '*.db')):
+            os.remove(f)
+
+
+def post_worker_init(worker):
+    if Config.SERVER_MODE == 'gevent':
+        # 让 psycopg2 在等待数据库时让出协程, 而不是阻塞整个 worker
+        from psycogreen.gevent import patch_psycopg
+        patch_psycopg()
+
+
+def child_exit(server, worker):
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,24 @@
+import io
+from PIL import Image, ImageOps
+
+# 变体名称与最长边像素, 按从小到大排列
+VARIANTS = (
+    ('thumb', 200),
+    ('medium', 800),
+    ('full', 1600),
+)
+
+
+def make_variants(data, quality=80):
+    """把原图生成各尺寸的 WebP 变体, 返回 {变体名: 字节}; 不放大小于目标尺寸的图片"""
+    with Image.open(io.BytesIO(data)) as src:
+        img = ImageOps.exif_transpose(src)
+        img = img.convert('RGBA' if img.mode in ('RGBA', 'LA', 'P') else 'RGB')
+        results = {}
+        for name, size in VARIANTS:
+            variant = img.copy()
+            variant.thumbnail((size, size), Image.LANCZOS)
+            buf = io.BytesIO()
+            variant.save(buf, 'WEBP', quality=quality, method=4)
+            results[name] = buf.getvalue()
+        return results
@@ -0,0 +1,194 @@
+import json
+import logging
+import datetime
+import threading
+import traceback
+from collections import deque
+
+
+class LeaseLost(Exception):
+    """任务执行超过 JOBS_VISIBILITY_TIMEOUT 未续期, 已被其他 worker 重新领取"""
+
+
+class JobQueue:
+    """基于数据库 jobs 表的后台任务队列
+
+    请求处理函数用 enqueue() 把任务写进当前事务, 随业务数据一起提交;
+    每个进程内的工作线程轮询 jobs 表领取任务 (Postgres 下用 SKIP LOCKED 避免多 worker 抢同一条),
+    失败按指数退避重试, 超过最大次数后移入死信表。
+    """
+
+    def __init__(self, app, db, job_model, dead_model, logger=None):
+        self.app = app
+        self.db = db
+        self.logger = logger or logging.getLogger(__name__)
+        self.Job = job_model
+        self.DeadJob = dead_model
+        self.handlers = {}
+        self.processed = 0
+        self.failed = 0
+        self.dead = 0
+        self.latencies = deque(maxlen=1000)
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._threads = []
+        self._lock = threading.Lock()
+        # 当前线程正在执行的任务 (id, attempts), 供 heartbeat 续期
+        self._local = threading.local()
+
+    def handler(self, kind):
+        def decorator(f):
+            self.handlers[kind] = f
+            return f
+        return decorator
+
+    def enqueue(self, kind, delay=0, **payload):
+        """在当前会话中加入任务, 需由调用方 commit"""
+        if kind not in self.handlers:
+            raise ValueError(f'Unknown job kind: {kind}')
+        now = datetime.datetime.utcnow()
+        self.db.session.add(self.Job(
+            kind=kind,
+            payload=json.dumps(payload),
+            run_at=now + datetime.timedelta(seconds=delay),
+            created_at=now
+        ))
+        self._wakeup.set()
+
+    def heartbeat(self):
+        """在当前事务中续期正在执行的任务, 需由调用方 commit
+
+        分批处理的长任务每批调用一次, 避免运行超过 JOBS_VISIBILITY_TIMEOUT 后被其他 worker 当作崩溃重新领取;
+        已被重新领取时抛出 LeaseLost, 当前执行随之放弃。不在任务中调用时什么也不做。
+        """
+        current = getattr(self._local, 'job', None)
+        if current is None:
+            return
+        job_id, attempts = current
+        renewed = self.Job.query.filter_by(id=job_id, attempts=attempts, status='running').update(
+            {'started_at': datetime.datetime.utcnow()}, synchronize_session=False)
+        if not renewed:
+            raise LeaseLost(f'Job {job_id} was reclaimed by another worker')
+
+    def start(self, workers=None):
+        with self._lock:
+            if self._threads:
+                return
+            workers = workers if workers is not None else self.app.config['JOBS_WORKERS']
+            for i in range(workers):
+                t = threading.Thread(target=self._run, name=f'job-worker-{i}', daemon=True)
+                t.start()
+                self._threads.append(t)
+
+    def stop(self):
+        self._stopping.set()
+        self._wakeup.set()
+        for t in self._threads:
+            t.join()
+
+    def _run(self):
+        with self.app.app_context():
+            while not self._stopping.is_set():
+                try:
+                    worked = self.run_once()
+                except Exception:
+                    self.db.session.rollback()
+                    self.logger.exception('Job worker error')
+                    worked = False
+                if not worked:
+                    self._wakeup.wait(self.app.config['JOBS_POLL_INTERVAL'])
+                    self._wakeup.clear()
+
+    def _claim(self):
+        Job = self.Job
+        now = datetime.datetime.utcnow()
+        stale = now - datetime.timedelta(seconds=self.app.config['JOBS_VISIBILITY_TIMEOUT'])
+        job = Job.query.filter(self.db.or_(
+            self.db.and_(Job.status == 'queued', Job.run_at <= now),
+            # 执行中的进程崩溃后, 超时的 running 任务重新领取
+            self.db.and_(Job.status == 'running', Job.started_at < stale)
+        )).order_by(Job.run_at).with_for_update(skip_locked=True).first()
+        if job is None:
+            self.db.session.rollback()
+            return None
+        # 以 attempts 作为乐观锁再确认一次, 不支持 SKIP LOCKED 的数据库 (如 SQLite) 上也不会重复领取
+        attempts = job.attempts + 1
+        claimed = Job.query.filter_by(id=job.id, attempts=job.attempts).update(
+            {'status': 'running', 'started_at': now, 'attempts': attempts}, synchronize_session=False)
+        self.db.session.commit()
+        if not claimed:
+            return None
+        self._local.job = (job.id, attempts)
+        return job
+
+    def run_once(self):
+        """领取并执行一个任务, 没有可执行任务时返回 False"""
+        job = self._claim()
+        if job is None:
+            return False
+        try:
+            self.handlers[job.kind](**json.loads(job.payload))
+        except LeaseLost as e:
+            # 任务已归新的 worker 执行, 不再改动这一行
+            self.db.session.rollback()
+            self.logger.warning('Job %s (%s) abandoned: %s', job.id, job.kind, e)
+            return True
+        except Exception as e:
+            self.db.session.rollback()
+            self.logger.exception('Job %s (%s) failed', job.id, job.kind)
+            self._fail(job, f'{e}\n{traceback.format_exc(limit=5)}')
+            return True
+        finally:
+            self._local.job = None
+        created_at = job.created_at
+        self.db.session.delete(job)
+        self.db.session.commit()
+        with self._lock:
+            self.processed += 1
+            self.latencies.append((datetime.datetime.utcnow() - created_at).total_seconds())
+        return True
+
+    def _fail(self, job, error):
+        with self._lock:
+            self.failed += 1
+        if job.attempts >= self.app.config['JOBS_MAX_ATTEMPTS']:
+            self.db.session.add(self.DeadJob(
+                kind=job.kind,
+                payload=job.payload,
+                attempts=job.attempts,
+                last_error=error,
+                created_at=job.created_at,
+                failed_at=datetime.datetime.utcnow()
+            ))
+            self.db.session.delete(job)
+            with self._lock:
+                self.dead += 1
+        else:
+            backoff = self.app.config['JOBS_BACKOFF_BASE'] * (2 ** (job.attempts - 1))
+            job.status = 'queued'
+            job.run_at = datetime.datetime.utcnow() + datetime.timedelta(seconds=backoff)
+            job.last_error = error
+        self.db.session.commit()
+
+    def stats(self):
+        Job = self.Job
+        depth = dict(self.db.session.query(Job.status, self.db.func.count(Job.id)).group_by(Job.status).all())
+        with self._lock:
+            latencies = sorted(self.latencies)
+            local = {
+                'processed': self.processed,
+                'failed': self.failed,
+                'dead': self.dead,
+                'workers': len(self._threads)
+            }
+
+        def pct(p):
+            return round(latencies[min(len(latencies) - 1, int(len(latencies) * p))], 3) if latencies else None
+
+        return {
+            'queued': depth.get('queued', 0),
+            'running': depth.get('running', 0),
+            'dead_letters': self.DeadJob.query.count(),
+            'this_process': local,
+            'latency_seconds': {'p50': pct(0.5), 'p95': pct(0.95), 'max': round(latencies[-1], 3) if latencies else None}
+        }
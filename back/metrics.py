@@ -0,0 +1,94 @@
+import os
+import time
+import cProfile
+import datetime
+from flask import g, request, has_request_context
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from prometheus_client import (
+    Counter, Histogram, CollectorRegistry, REGISTRY, CONTENT_TYPE_LATEST, generate_latest, multiprocess
+)
+
+# 设置了 PROMETHEUS_MULTIPROC_DIR 时, 各 gunicorn worker 把指标写到该目录, /api/metrics 汇总所有 worker
+REQUEST_LATENCY = Histogram(
+    'http_request_duration_seconds', '请求处理耗时', ['endpoint', 'method', 'status'],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+)
+REQUEST_QUERIES = Histogram(
+    'http_request_db_queries', '单个请求执行的 SQL 条数', ['endpoint'],
+    buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100, 500)
+)
+REQUEST_DB_TIME = Histogram(
+    'http_request_db_seconds', '单个请求的 SQL 总耗时', ['endpoint'],
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 5)
+)
+SLOW_QUERIES = Counter('db_slow_queries_total', '超过阈值的慢查询次数', ['endpoint'])
+
+
+def _endpoint():
+    return request.endpoint or 'unmatched'
+
+
+def init_app(app):
+    """注册请求钩子和 SQLAlchemy 事件, 记录每个接口的耗时、SQL 条数与 SQL 耗时"""
+    slow_ms = app.config['SLOW_QUERY_MS']
+
+    @app.before_request
+    def _start_timer():
+        g.metrics_start = time.perf_counter()
+        g.metrics_queries = 0
+        g.metrics_db_time = 0.0
+        if app.config['PROFILE_ENABLED'] and request.headers.get('X-Profile') == '1':
+            g.profiler = cProfile.Profile()
+            g.profiler.enable()
+
+    @app.after_request
+    def _record(response):
+        start = g.pop('metrics_start', None)
+        if start is None:
+            return response
+        elapsed = time.perf_counter() - start
+        endpoint = _endpoint()
+        REQUEST_LATENCY.labels(endpoint, request.method, response.status_code).observe(elapsed)
+        REQUEST_QUERIES.labels(endpoint).observe(g.metrics_queries)
+        REQUEST_DB_TIME.labels(endpoint).observe(g.metrics_db_time)
+        response.headers['Server-Timing'] = (
+            f'db;dur={g.metrics_db_time * 1000:.1f};desc="{g.metrics_queries} queries", '
+            f'app;dur={elapsed * 1000:.1f}'
+        )
+
+        profiler = g.pop('profiler', None)
+        if profiler is not None:
+            profiler.disable()
+            os.makedirs(app.config['PROFILE_DIR'], exist_ok=True)
+            path = os.path.join(app.config['PROFILE_DIR'], '%s-%s-%d.prof' % (
+                endpoint, datetime.datetime.now().strftime('%Y%m%d%H%M%S'), os.getpid()))
+            profiler.dump_stats(path)
+            response.headers['X-Profile-Dump'] = os.path.basename(path)
+        return response
+
+    @event.listens_for(Engine, 'before_cursor_execute')
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+    @event.listens_for(Engine, 'after_cursor_execute')
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info['query_start'].pop()
+        # 后台任务线程没有请求上下文, 不计入接口统计
+        if not has_request_context() or 'metrics_queries' not in g:
+            return
+        g.metrics_queries += 1
+        g.metrics_db_time += elapsed
+        if elapsed * 1000 >= slow_ms:
+            SLOW_QUERIES.labels(_endpoint()).inc()
+            app.logger.warning('Slow query (%.1f ms) in %s: %s', elapsed * 1000, _endpoint(), statement)
+
+
+def render():
+    """生成 Prometheus 文本格式的指标, 多进程模式下汇总所有 worker"""
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
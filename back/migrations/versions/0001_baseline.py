@@ -0,0 +1,114 @@
+"""baseline: 引入迁移之前线上已有的表结构
+
+已有数据库不要执行本脚本, 先标记为已在此版本再升级:
+    flask db stamp 0001 && flask db upgrade
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-17 06:30:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0001'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'users',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('username', sa.String(length=50), nullable=False),
+        sa.Column('password_hash', sa.String(length=255), nullable=False),
+        sa.Column('role', sa.String(length=20), nullable=False),
+        sa.Column('real_name', sa.String(length=50)),
+        sa.Column('student_id', sa.String(length=20)),
+        sa.Column('avatar_url', sa.Text()),
+        sa.Column('bio', sa.Text()),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('username')
+    )
+    op.create_table(
+        'trainings',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('start_time', sa.DateTime(), nullable=False),
+        sa.Column('end_time', sa.DateTime(), nullable=False),
+        sa.Column('plan_content', sa.Text()),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table(
+        'matches',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('match_time', sa.DateTime(), nullable=False),
+        sa.Column('opponent', sa.String(length=100)),
+        sa.Column('location', sa.String(length=100)),
+        sa.Column('our_score', sa.Integer()),
+        sa.Column('opponent_score', sa.Integer()),
+        sa.Column('is_finished', sa.Boolean()),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table(
+        'leaves',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer()),
+        sa.Column('training_id', sa.Integer()),
+        sa.Column('match_id', sa.Integer()),
+        sa.Column('duration_hours', sa.Float()),
+        sa.Column('reason', sa.Text()),
+        sa.Column('status', sa.String(length=20)),
+        sa.Column('created_at', sa.DateTime()),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id']),
+        sa.ForeignKeyConstraint(['training_id'], ['trainings.id']),
+        sa.ForeignKeyConstraint(['match_id'], ['matches.id']),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table(
+        'match_signups',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('match_id', sa.Integer()),
+        sa.Column('user_id', sa.Integer()),
+        sa.Column('real_name', sa.String(length=50)),
+        sa.Column('student_id', sa.String(length=20)),
+        sa.ForeignKeyConstraint(['match_id'], ['matches.id']),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id']),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table(
+        'venues',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('start_time', sa.DateTime(), nullable=False),
+        sa.Column('end_time', sa.DateTime(), nullable=False),
+        sa.Column('proof_photo_url', sa.Text()),
+        sa.Column('updated_by', sa.Integer()),
+        sa.ForeignKeyConstraint(['updated_by'], ['users.id']),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table(
+        'team_photos',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('photo_url', sa.Text(), nullable=False),
+        sa.Column('description', sa.Text()),
+        sa.Column('uploaded_at', sa.DateTime()),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table(
+        'personal_trainings',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer()),
+        sa.Column('item_name', sa.String(length=100), nullable=False),
+        sa.Column('photo_url', sa.Text()),
+        sa.Column('created_at', sa.DateTime()),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id']),
+        sa.PrimaryKeyConstraint('id')
+    )
+
+
+def downgrade():
+    for table in ('personal_trainings', 'team_photos', 'venues', 'match_signups', 'leaves',
+                  'matches', 'trainings', 'users'):
+        op.drop_table(table)
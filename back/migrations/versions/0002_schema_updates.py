@@ -0,0 +1,131 @@
+"""schema updates: 图片变体、令牌版本、后台任务等新表, 报名唯一约束与外键级联删除
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-17 06:31:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0002'
+down_revision = '0001'
+branch_labels = None
+depends_on = None
+
+# (表, 列, 引用表, ON DELETE): 删除父表行时由数据库处理子表
+FK_CHANGES = [
+    ('leaves', 'user_id', 'users', 'CASCADE'),
+    ('leaves', 'training_id', 'trainings', 'CASCADE'),
+    ('leaves', 'match_id', 'matches', 'CASCADE'),
+    ('match_signups', 'match_id', 'matches', 'CASCADE'),
+    ('match_signups', 'user_id', 'users', 'CASCADE'),
+    ('personal_trainings', 'user_id', 'users', 'CASCADE'),
+    ('venues', 'updated_by', 'users', 'SET NULL'),
+]
+# 与 Postgres 默认的外键命名一致, SQLite 的批量模式按此给未命名的外键起名
+NAMING = {'fk': '%(table_name)s_%(column_0_name)s_fkey'}
+
+
+def _alter_foreign_keys(changes):
+    if op.get_bind().dialect.name == 'postgresql':
+        # NOT VALID 只需短暂加锁, 提交后再 VALIDATE, 校验期间不阻塞读写
+        for table, column, ref, action in changes:
+            name = f'{table}_{column}_fkey'
+            on_delete = f' ON DELETE {action}' if action else ''
+            op.execute(f'ALTER TABLE {table} DROP CONSTRAINT IF EXISTS {name}, '
+                       f'ADD CONSTRAINT {name} FOREIGN KEY ({column}) REFERENCES {ref} (id){on_delete} NOT VALID')
+        with op.get_context().autocommit_block():
+            for table, column, ref, action in changes:
+                op.execute(f'ALTER TABLE {table} VALIDATE CONSTRAINT {table}_{column}_fkey')
+    else:
+        for table, column, ref, action in changes:
+            name = f'{table}_{column}_fkey'
+            with op.batch_alter_table(table, naming_convention=NAMING) as batch:
+                batch.drop_constraint(name, type_='foreignkey')
+                batch.create_foreign_key(name, ref, [column], ['id'], ondelete=action)
+
+
+def upgrade():
+    op.add_column('users', sa.Column('avatar_variants', sa.Text()))
+    op.add_column('users', sa.Column('token_version', sa.Integer(), nullable=False, server_default='0'))
+    op.add_column('team_photos', sa.Column('photo_variants', sa.Text()))
+    op.add_column('personal_trainings', sa.Column('photo_variants', sa.Text()))
+
+    op.create_table(
+        'uploaded_objects',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('object_key', sa.String(length=255), nullable=False),
+        sa.Column('user_id', sa.Integer()),
+        sa.Column('content_type', sa.String(length=100)),
+        sa.Column('size', sa.BigInteger()),
+        sa.Column('status', sa.String(length=20)),
+        sa.Column('created_at', sa.DateTime()),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='SET NULL'),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('object_key')
+    )
+    op.create_index('ix_uploaded_objects_user_id', 'uploaded_objects', ['user_id'])
+    op.create_table(
+        'jobs',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('kind', sa.String(length=50), nullable=False),
+        sa.Column('payload', sa.Text(), nullable=False),
+        sa.Column('status', sa.String(length=20), nullable=False),
+        sa.Column('attempts', sa.Integer(), nullable=False),
+        sa.Column('last_error', sa.Text()),
+        sa.Column('run_at', sa.DateTime(), nullable=False),
+        sa.Column('started_at', sa.DateTime()),
+        sa.Column('created_at', sa.DateTime()),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_jobs_status_run_at', 'jobs', ['status', 'run_at'])
+    op.create_table(
+        'dead_jobs',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('kind', sa.String(length=50), nullable=False),
+        sa.Column('payload', sa.Text(), nullable=False),
+        sa.Column('attempts', sa.Integer()),
+        sa.Column('last_error', sa.Text()),
+        sa.Column('created_at', sa.DateTime()),
+        sa.Column('failed_at', sa.DateTime()),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table(
+        'dashboard_summary',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('payload', sa.Text(), nullable=False),
+        sa.Column('updated_at', sa.DateTime()),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table(
+        'resource_versions',
+        sa.Column('name', sa.String(length=50), nullable=False),
+        sa.Column('version', sa.Integer(), nullable=False),
+        sa.Column('updated_at', sa.DateTime()),
+        sa.PrimaryKeyConstraint('name')
+    )
+
+    # 同一场比赛每人只保留最早的一条报名, 再加唯一约束
+    op.execute('DELETE FROM match_signups WHERE id NOT IN '
+               '(SELECT MIN(id) FROM match_signups GROUP BY match_id, user_id)')
+    op.execute('DROP INDEX IF EXISTS ix_match_signups_match_user')
+    with op.batch_alter_table('match_signups') as batch:
+        batch.create_unique_constraint('uq_match_signups_match_user', ['match_id', 'user_id'])
+
+    _alter_foreign_keys(FK_CHANGES)
+
+
+def downgrade():
+    _alter_foreign_keys([(table, column, ref, None) for table, column, ref, action in FK_CHANGES])
+    with op.batch_alter_table('match_signups') as batch:
+        batch.drop_constraint('uq_match_signups_match_user', type_='unique')
+    for table in ('resource_versions', 'dashboard_summary', 'dead_jobs', 'jobs', 'uploaded_objects'):
+        op.drop_table(table)
+    op.drop_column('personal_trainings', 'photo_variants')
+    op.drop_column('team_photos', 'photo_variants')
+    with op.batch_alter_table('users') as batch:
+        batch.drop_column('token_version')
+        batch.drop_column('avatar_variants')
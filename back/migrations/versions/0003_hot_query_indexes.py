@@ -0,0 +1,51 @@
+"""hot query indexes: 列表分页、按用户筛选、仪表盘统计与级联删除用到的索引
+
+过滤与排序同时出现的查询用复合索引 (过滤列在前, 排序列在后, 末尾带 id 供游标分页)。
+Postgres 上用 CREATE INDEX CONCURRENTLY, 建索引期间不阻塞写入。
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-17 06:32:00
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '0003'
+down_revision = '0002'
+branch_labels = None
+depends_on = None
+
+# (索引名, 表, 列, 对应的查询)
+INDEXES = [
+    ('ix_users_role', 'users', ['role'], '仪表盘按角色统计人数'),
+    ('ix_trainings_start_time_id', 'trainings', ['start_time', 'id'], 'GET /api/trainings 按开始时间分页'),
+    ('ix_matches_match_time_id', 'matches', ['match_time', 'id'], 'GET /api/matches 按比赛时间排序'),
+    ('ix_matches_is_finished_match_time', 'matches', ['is_finished', 'match_time'], '仪表盘最近已完赛比赛'),
+    ('ix_leaves_created_at_id', 'leaves', ['created_at', 'id'], 'GET /api/leaves (队长 / 教练) 分页'),
+    ('ix_leaves_user_created_at_id', 'leaves', ['user_id', 'created_at', 'id'], 'GET /api/leaves (本人) 分页'),
+    ('ix_leaves_training_id', 'leaves', ['training_id'], '训练请假统计与级联删除'),
+    ('ix_leaves_match_id', 'leaves', ['match_id'], '删除比赛时级联删除'),
+    ('ix_match_signups_match_id', 'match_signups', ['match_id'], '比赛列表批量取报名'),
+    ('ix_match_signups_user_id', 'match_signups', ['user_id'], '删除用户时级联删除'),
+    ('ix_venues_start_time_id', 'venues', ['start_time', 'id'], 'GET /api/venues 分页'),
+    ('ix_team_photos_uploaded_at_id', 'team_photos', ['uploaded_at', 'id'], 'GET /api/photos 分页'),
+    ('ix_personal_trainings_created_at_id', 'personal_trainings', ['created_at', 'id'],
+     'GET /api/personal_trainings (队长 / 教练) 分页'),
+    ('ix_personal_trainings_user_created_at_id', 'personal_trainings', ['user_id', 'created_at', 'id'],
+     'GET /api/personal_trainings (本人) 分页与排行榜'),
+]
+
+
+def upgrade():
+    # 之前按提交说明手工建过的索引会被跳过 (IF NOT EXISTS)
+    with op.get_context().autocommit_block():
+        for name, table, columns, _ in INDEXES:
+            op.create_index(name, table, columns, if_not_exists=True, postgresql_concurrently=True)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        for name, table, columns, _ in reversed(INDEXES):
+            op.drop_index(name, table_name=table, if_exists=True, postgresql_concurrently=True)
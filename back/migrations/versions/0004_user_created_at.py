@@ -0,0 +1,27 @@
+"""user created_at: 记录球员加入时间, 出勤分析据此只统计加入之后的训练与比赛
+
+已有用户的 created_at 为空, 视为从最早的训练起就在队中。
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-17 07:05:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0004'
+down_revision = '0003'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # 可空且无默认值, Postgres 上只改表定义, 不重写已有行
+    op.add_column('users', sa.Column('created_at', sa.DateTime(), nullable=True))
+
+
+def downgrade():
+    op.drop_column('users', 'created_at')
@@ -0,0 +1,25 @@
+"""uploaded_objects.upload_id: 分段上传在初始化时登记发起人, 分段 / 合并 / 放弃都只允许本人操作
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-17 09:45:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0006'
+down_revision = '0005'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # 可空且无默认值, 只改表定义; 升级前发起的分段上传没有登记, 需要重新发起
+    op.add_column('uploaded_objects', sa.Column('upload_id', sa.String(length=255), nullable=True))
+
+
+def downgrade():
+    op.drop_column('uploaded_objects', 'upload_id')
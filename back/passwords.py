@@ -0,0 +1,82 @@
+import os
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from werkzeug.security import generate_password_hash, check_password_hash
+
+
+class HasherBusy(Exception):
+    """排队中的哈希任务已达上限, 调用方应返回 503 让客户端稍后重试"""
+
+
+def _lower_priority(nice):
+    # 哈希进程降低调度优先级, CPU 紧张时让位于处理普通请求的 worker
+    if nice:
+        os.nice(nice)
+
+
+def _hash(password, method):
+    return generate_password_hash(password, method=method)
+
+
+def _verify(pwhash, password):
+    return check_password_hash(pwhash, password)
+
+
+class PasswordHasher:
+    """在独立的进程池中计算密码哈希, 不占用处理请求的线程 / 协程
+
+    每个 gunicorn worker 第一次用到时才创建自己的进程池 (spawn 方式, 不继承 worker 状态),
+    同时在途的任务超过 queue_limit 时直接抛出 HasherBusy 而不是继续排队。
+    workers 为 0 时在当前线程内计算 (命令行、压测造数)。
+    method 为 werkzeug 的完整参数串 (如 scrypt:32768:8:1), 已有哈希的参数与之不同时
+    needs_rehash 返回 True, 由登录接口在验证成功后重新计算。
+    """
+
+    def __init__(self, method, workers=1, queue_limit=8, nice=10):
+        self.method = method
+        self.workers = workers
+        self.queue_limit = queue_limit
+        self.nice = nice
+        self.pending = 0
+        self.rejected = 0
+        self._pool = None
+        self._lock = threading.Lock()
+
+    def _get_pool(self):
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_lower_priority, initargs=(self.nice,)
+            )
+        return self._pool
+
+    def _run(self, fn, *args):
+        if self.workers <= 0:
+            return fn(*args)
+        with self._lock:
+            if self.pending >= self.queue_limit:
+                self.rejected += 1
+                raise HasherBusy()
+            self.pending += 1
+            pool = self._get_pool()
+        try:
+            return pool.submit(fn, *args).result()
+        finally:
+            with self._lock:
+                self.pending -= 1
+
+    def hash(self, password):
+        return self._run(_hash, password, self.method)
+
+    def verify(self, pwhash, password):
+        return self._run(_verify, pwhash, password)
+
+    def needs_rehash(self, pwhash):
+        return pwhash.split('$', 1)[0] != self.method
+
+    def stats(self):
+        with self._lock:
+            return {'method': self.method.split(':', 1)[0], 'workers': self.workers,
+                    'queue_limit': self.queue_limit, 'pending': self.pending, 'rejected': self.rejected}
@@ -0,0 +1,28 @@
+import bisect
+
+
+class IntervalIndex:
+    """按开始时间排序的 [start, end) 区间表, 用于日程冲突检测
+
+    所有区间长度都不超过 max_span, 因此与 [start, end) 重叠的区间开始时间一定落在
+    (start - max_span, end) 内: 二分定位这一段后只需检查其中的少量区间, 查询为 O(log n + k)。
+    add 逐条插入, 批量写入时已接受的条目立即参与后续条目的检测。
+    """
+
+    def __init__(self, max_span):
+        self.max_span = max_span
+        self._starts = []
+        self._entries = []
+
+    def __len__(self):
+        return len(self._entries)
+
+    def add(self, start, end, item):
+        i = bisect.bisect_right(self._starts, start)
+        self._starts.insert(i, start)
+        self._entries.insert(i, (start, end, item))
+
+    def overlapping(self, start, end):
+        lo = bisect.bisect_right(self._starts, start - self.max_span)
+        hi = bisect.bisect_left(self._starts, end)
+        return [item for s, e, item in self._entries[lo:hi] if e > start]
@@ -0,0 +1,111 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from obs import ObsClient, CompleteMultipartUploadRequest, CompletePart
+
+
+class UploadError(Exception):
+    pass
+
+
+class OffloadedObsClient:
+    """gevent 模式下把 OBS 客户端的调用放到 gevent 原生线程池执行
+
+    SDK 内部的签名计算、文件读写和 SSL 处理不会阻塞协程事件循环, 其他请求可以继续被调度。
+    """
+
+    def __init__(self, client):
+        self._client = client
+
+    def __getattr__(self, name):
+        attr = getattr(self._client, name)
+        if not callable(attr):
+            return attr
+
+        def call(*args, **kwargs):
+            from gevent import get_hub
+            return get_hub().threadpool.apply(attr, args, kwargs)
+        return call
+
+
+def create_obs_client(config):
+    """根据 OBS_BACKEND 创建客户端: 'obs' 为华为云 OBS, 'fake' 为本地文件替身"""
+    if config.get('OBS_BACKEND') == 'fake':
+        from fake_obs import FakeObsClient
+        client = FakeObsClient(root=config.get('OBS_FAKE_DIR') or None, latency=config.get('OBS_FAKE_LATENCY', 0.0))
+    else:
+        client = ObsClient(
+            access_key_id=config.get('OBS_ACCESS_KEY'),
+            secret_access_key=config.get('OBS_SECRET_KEY'),
+            server=config.get('OBS_ENDPOINT'),
+            region=config.get('OBS_REGION')
+        )
+    if config.get('SERVER_MODE') == 'gevent':
+        client = OffloadedObsClient(client)
+    return client
+
+
+def _check(resp, action):
+    if resp.status >= 300:
+        raise UploadError(f"{action} failed: {resp.errorMessage}")
+    return resp
+
+
+def _iter_chunks(stream, part_size):
+    while True:
+        chunk = stream.read(part_size)
+        if not chunk:
+            return
+        yield chunk
+
+
+def stream_upload(client, bucket, key, stream, part_size, workers=1):
+    """把可读流按固定大小分段上传到 OBS
+
+    不超过一个分段的小文件直接 putContent; 更大的文件走分段上传,
+    同时在内存中的分段最多 workers + 2 个, 与文件大小无关。失败时中止分段上传并抛出 UploadError。
+    """
+    chunks = _iter_chunks(stream, part_size)
+    first = next(chunks, b'')
+    second = next(chunks, None) if len(first) == part_size else None
+    if second is None:
+        _check(client.putContent(bucketName=bucket, objectKey=key, content=first), 'putContent')
+        return
+
+    upload_id = _check(client.initiateMultipartUpload(bucket, key), 'initiateMultipartUpload').body.uploadId
+
+    def upload_part(part_number, data):
+        resp = _check(client.uploadPart(bucket, key, part_number, upload_id, content=data, partSize=len(data)),
+                      f'uploadPart {part_number}')
+        return CompletePart(partNum=part_number, etag=resp.body.etag)
+
+    pending = [first, second]
+    del first, second
+
+    def all_chunks():
+        while pending:
+            yield pending.pop(0)
+        yield from chunks
+
+    parts = []
+    try:
+        if workers > 1:
+            # 信号量限制在途分段数, 读取速度快于上传时阻塞读取, 保证内存有界
+            slots = threading.BoundedSemaphore(workers)
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                futures = []
+                for part_number, data in enumerate(all_chunks(), start=1):
+                    slots.acquire()
+                    future = pool.submit(upload_part, part_number, data)
+                    future.add_done_callback(lambda _: slots.release())
+                    futures.append(future)
+                    del data
+                parts = [f.result() for f in futures]
+        else:
+            for part_number, data in enumerate(all_chunks(), start=1):
+                parts.append(upload_part(part_number, data))
+
+        _check(client.completeMultipartUpload(bucket, key, upload_id, CompleteMultipartUploadRequest(parts=parts)),
+               'completeMultipartUpload')
+    except Exception:
+        client.abortMultipartUpload(bucket, key, upload_id)
+        raise
@@ -1,27 +1,58 @@
 import os
+import re
+import time
+import base64
 import datetime
 import json
+import zlib
+import hashlib
+import uuid
+import sqlite3
+import io
+import csv
 import jwt
 from functools import wraps
-from flask import Flask, jsonify, request
+from flask import Flask, jsonify, request, make_response, g
 from flask_sqlalchemy import SQLAlchemy
-from werkzeug.security import generate_password_hash, check_password_hash
+from flask_migrate import Migrate
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.dialects import postgresql, sqlite
 from werkzeug.utils import secure_filename
+from werkzeug.middleware.proxy_fix import ProxyFix
 from flask_cors import CORS
 from config import Config
-from obs import ObsClient
+from cache import TTLCache, create_shared_cache
+from jobs import JobQueue
+from images import make_variants
+from passwords import PasswordHasher, HasherBusy
+from events import create_broker
+from schedule import IntervalIndex
+import numpy as np
+from analytics import PLAYER_FIELDS, attendance_report, report_rows, roster_counts, positions
+import metrics
+from storage import create_obs_client, stream_upload
+from obs import CompleteMultipartUploadRequest, CompletePart, PutObjectHeader
 
 app = Flask(__name__)
 app.config.from_object(Config)
-CORS(app)
+# 经 nginx 转发时 remote_addr 恒为代理地址, 按配置的代理层数从 X-Forwarded-For 还原客户端 IP (登录限流按 IP 计数)
+if app.config['PROXY_FIX_X_FOR']:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=app.config['PROXY_FIX_X_FOR'])
+CORS(app, expose_headers=['X-Next-Cursor', 'ETag'])
 db = SQLAlchemy(app)
+# 表结构变更通过 migrations/ 下的 Alembic 脚本管理: flask db upgrade
+migrate = Migrate(app, db)
+metrics.init_app(app)
 
-# 初始化 OBS 客户端
-obs_client = ObsClient(
-    access_key_id=app.config.get('OBS_ACCESS_KEY'),
-    secret_access_key=app.config.get('OBS_SECRET_KEY'),
-    server=app.config.get('OBS_ENDPOINT')
-)
+@db.event.listens_for(Engine, 'connect')
+def _sqlite_foreign_keys(dbapi_connection, connection_record):
+    # SQLite (本地开发 / 压测) 默认不检查外键, 打开后 ON DELETE CASCADE 才会生效
+    if isinstance(dbapi_connection, sqlite3.Connection):
+        dbapi_connection.execute('PRAGMA foreign_keys=ON')
+
+# 初始化 OBS 客户端 (OBS_BACKEND=fake 时使用本地替身)
+obs_client = create_obs_client(app.config)
 
 # --- Models ---
 
@@ -30,15 +61,31 @@ class User(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(50), unique=True, nullable=False)
     password_hash = db.Column(db.String(255), nullable=False)
-    role = db.Column(db.String(20), nullable=False)
+    role = db.Column(db.String(20), nullable=False, index=True)
     real_name = db.Column(db.String(50))
     student_id = db.Column(db.String(20))
     # [新增] 头像 URL 和 个人简介
     avatar_url = db.Column(db.Text)
     bio = db.Column(db.Text)
+    # 头像缩略图等变体 URL, JSON: {"thumb": ..., "medium": ..., "full": ...}
+    avatar_variants = db.Column(db.Text)
+    # 令牌版本: 角色或密码变更时 +1, 此前签发的令牌全部作废
+    token_version = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    # 加入球队的时间, 出勤分析只统计此后的训练 / 比赛; 升级前注册的用户为空, 视为一直在队中
+    created_at = db.Column(db.DateTime, default=datetime.datetime.utcnow)
+
+class RefreshToken(db.Model):
+    # 尚未使用的 refresh token (按 jti 登记): 换新令牌时删除本行, 同一个 refresh token 不能用第二次
+    __tablename__ = 'refresh_tokens'
+    jti = db.Column(db.String(32), primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False, index=True)
+    expires_at = db.Column(db.DateTime, nullable=False)
 
 class Training(db.Model):
     __tablename__ = 'trainings'
+    __table_args__ = (
+        db.Index('ix_trainings_start_time_id', 'start_time', 'id'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     start_time = db.Column(db.DateTime, nullable=False)
     end_time = db.Column(db.DateTime, nullable=False)
@@ -46,6 +93,11 @@ class Training(db.Model):
 
 class Match(db.Model):
     __tablename__ = 'matches'
+    __table_args__ = (
+        db.Index('ix_matches_match_time_id', 'match_time', 'id'),
+        # 仪表盘: 已完赛比赛按时间取最近几场
+        db.Index('ix_matches_is_finished_match_time', 'is_finished', 'match_time'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     match_time = db.Column(db.DateTime, nullable=False)
     opponent = db.Column(db.String(100))
@@ -56,65 +108,375 @@ class Match(db.Model):
 
 class Leave(db.Model):
     __tablename__ = 'leaves'
+    __table_args__ = (
+        db.Index('ix_leaves_created_at_id', 'created_at', 'id'),
+        db.Index('ix_leaves_user_created_at_id', 'user_id', 'created_at', 'id'),
+    )
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('users.id'))
-    training_id = db.Column(db.Integer, db.ForeignKey('trainings.id'))
-    match_id = db.Column(db.Integer, db.ForeignKey('matches.id'))
+    # 删除用户 / 训练 / 比赛时由数据库级联删除相关请假, 不再由接口逐表删除
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'))
+    training_id = db.Column(db.Integer, db.ForeignKey('trainings.id', ondelete='CASCADE'), index=True)
+    match_id = db.Column(db.Integer, db.ForeignKey('matches.id', ondelete='CASCADE'), index=True)
     duration_hours = db.Column(db.Float)
     reason = db.Column(db.Text)
     status = db.Column(db.String(20), default='pending')
     created_at = db.Column(db.DateTime, default=datetime.datetime.utcnow)
-    user = db.relationship('User', backref='leaves')
+    # 批量加载关联对象, 遍历多条请假记录时不会逐行触发查询
+    user = db.relationship('User', backref=db.backref('leaves', passive_deletes=True))
     training = db.relationship('Training')
     match = db.relationship('Match')
 
 class MatchSignup(db.Model):
     __tablename__ = 'match_signups'
+    __table_args__ = (
+        # 同一场比赛每人只能报名一次, 报名接口用 ON CONFLICT 代替先查后插
+        db.UniqueConstraint('match_id', 'user_id', name='uq_match_signups_match_user'),
+    )
     id = db.Column(db.Integer, primary_key=True)
-    match_id = db.Column(db.Integer, db.ForeignKey('matches.id'))
-    user_id = db.Column(db.Integer, db.ForeignKey('users.id'))
+    match_id = db.Column(db.Integer, db.ForeignKey('matches.id', ondelete='CASCADE'), index=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), index=True)
     real_name = db.Column(db.String(50))
     student_id = db.Column(db.String(20))
 
 class Venue(db.Model):
     __tablename__ = 'venues'
+    __table_args__ = (
+        db.Index('ix_venues_start_time_id', 'start_time', 'id'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     start_time = db.Column(db.DateTime, nullable=False)
     end_time = db.Column(db.DateTime, nullable=False)
     proof_photo_url = db.Column(db.Text)
-    updated_by = db.Column(db.Integer, db.ForeignKey('users.id'))
+    updated_by = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='SET NULL'))
 
 class TeamPhoto(db.Model):
     __tablename__ = 'team_photos'
+    __table_args__ = (
+        db.Index('ix_team_photos_uploaded_at_id', 'uploaded_at', 'id'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     photo_url = db.Column(db.Text, nullable=False)
+    photo_variants = db.Column(db.Text)
     description = db.Column(db.Text)
     uploaded_at = db.Column(db.DateTime, default=datetime.datetime.utcnow)
 
 class PersonalTraining(db.Model):
     __tablename__ = 'personal_trainings'
+    __table_args__ = (
+        db.Index('ix_personal_trainings_created_at_id', 'created_at', 'id'),
+        db.Index('ix_personal_trainings_user_created_at_id', 'user_id', 'created_at', 'id'),
+    )
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('users.id'))
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'))
     item_name = db.Column(db.String(100), nullable=False)
     photo_url = db.Column(db.Text)
+    photo_variants = db.Column(db.Text)
     created_at = db.Column(db.DateTime, default=datetime.datetime.utcnow)
     user = db.relationship('User')
 
+class UploadedObject(db.Model):
+    # 直传 OBS 的对象登记: 签发上传 URL 时为 pending, 客户端上传后回调确认为 confirmed
+    # 分段上传在初始化时登记 (带 upload_id), 合并成功后为 confirmed
+    __tablename__ = 'uploaded_objects'
+    id = db.Column(db.Integer, primary_key=True)
+    object_key = db.Column(db.String(255), unique=True, nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='SET NULL'), index=True)
+    upload_id = db.Column(db.String(255))
+    content_type = db.Column(db.String(100))
+    size = db.Column(db.BigInteger)
+    status = db.Column(db.String(20), default='pending')
+    created_at = db.Column(db.DateTime, default=datetime.datetime.utcnow)
+
+class Job(db.Model):
+    # 后台任务队列, 见 jobs.JobQueue
+    __tablename__ = 'jobs'
+    __table_args__ = (
+        db.Index('ix_jobs_status_run_at', 'status', 'run_at'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(50), nullable=False)
+    payload = db.Column(db.Text, nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='queued')
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    last_error = db.Column(db.Text)
+    run_at = db.Column(db.DateTime, nullable=False, default=datetime.datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    created_at = db.Column(db.DateTime, default=datetime.datetime.utcnow)
+
+class DeadJob(db.Model):
+    # 超过最大重试次数的任务 (死信), 保留现场供人工处理
+    __tablename__ = 'dead_jobs'
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(50), nullable=False)
+    payload = db.Column(db.Text, nullable=False)
+    attempts = db.Column(db.Integer)
+    last_error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime)
+    failed_at = db.Column(db.DateTime, default=datetime.datetime.utcnow)
+
+class DashboardSummary(db.Model):
+    # 仪表盘统计的物化结果, 只有 id=1 一行, 由写接口刷新
+    __tablename__ = 'dashboard_summary'
+    id = db.Column(db.Integer, primary_key=True)
+    payload = db.Column(db.Text, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.datetime.utcnow)
+
+class ResourceVersion(db.Model):
+    # 每张业务表一个变更计数器, 写接口在同一事务里递增, 读接口据此生成 ETag
+    __tablename__ = 'resource_versions'
+    name = db.Column(db.String(50), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.datetime.utcnow)
+
+# --- Background Jobs ---
+
+job_queue = JobQueue(app, db, Job, DeadJob, app.logger)
+
+@job_queue.handler('obs_delete')
+def obs_delete_job(key):
+    resp = obs_client.deleteObject(bucketName=app.config['OBS_BUCKET_NAME'], objectKey=key)
+    if resp.status >= 300 and resp.status != 404:
+        raise RuntimeError(f"OBS delete failed: {resp.errorMessage}")
+
+# 需要生成缩略图的记录: 目标名 -> (模型, 原图字段, 变体字段, 资源版本名)
+IMAGE_TARGETS = {
+    'team_photo': (TeamPhoto, 'photo_url', 'photo_variants', 'photos'),
+    'user': (User, 'avatar_url', 'avatar_variants', 'users'),
+    'personal_training': (PersonalTraining, 'photo_url', 'photo_variants', 'personal_trainings'),
+}
+
+def variant_keys(key):
+    stem = os.path.splitext(key)[0]
+    return {name: f"variants/{stem}_{name}.webp" for name in ('thumb', 'medium', 'full')}
+
+@job_queue.handler('thumbnail')
+def thumbnail_job(target, record_id, key):
+    model, url_field, variants_field, resource = IMAGE_TARGETS[target]
+    resp = obs_client.getObject(app.config['OBS_BUCKET_NAME'], key, loadStreamInMemory=True)
+    if resp.status >= 300:
+        raise RuntimeError(f"OBS get failed: {resp.errorMessage}")
+    keys = variant_keys(key)
+    variants = {}
+    for name, data in make_variants(resp.body.buffer, quality=app.config['IMAGE_VARIANT_QUALITY']).items():
+        put = obs_client.putContent(bucketName=app.config['OBS_BUCKET_NAME'], objectKey=keys[name], content=data,
+                                    headers=PutObjectHeader(contentType='image/webp'))
+        if put.status >= 300:
+            raise RuntimeError(f"OBS upload failed: {put.errorMessage}")
+        variants[name] = object_url(keys[name])
+
+    record = model.query.get(record_id)
+    # 记录已删除或图片已被替换时, 本次生成的变体作废
+    if record is None or getattr(record, url_field) != object_url(key):
+        for vkey in keys.values():
+            enqueue_obs_delete(vkey)
+    else:
+        setattr(record, variants_field, json.dumps(variants))
+        bump_version(resource)
+        if target == 'team_photo':
+            publish_change('photo', 'updated', **photo_item(record, app.config['LIST_IMAGE_VARIANT']))
+    db.session.commit()
+
+# 按赛季清理旧数据: (资源版本名, 模型, 日期列); 子表在前, 删除父表时级联的行已所剩无几
+PURGE_TARGETS = [
+    ('leaves', Leave, Leave.created_at),
+    ('personal_trainings', PersonalTraining, PersonalTraining.created_at),
+    ('trainings', Training, Training.start_time),
+    ('matches', Match, Match.match_time),
+    ('venues', Venue, Venue.start_time),
+]
+
+def purge_counts(before):
+    return {name: db.session.query(db.func.count(model.id)).filter(col < before).scalar()
+            for name, model, col in PURGE_TARGETS}
+
+def purge_batches(name, model, col, before, batch_size, archive):
+    """按主键分批删除 col < before 的行, 每批单独提交, 锁只持有一批的时间
+
+    archive 为 True 时先把这一批行写成 JSON Lines 存到 OBS 的 archive/ 下再删除。
+    每批随删除一起续期任务租约, 整个清理跑得比 JOBS_VISIBILITY_TIMEOUT 久也不会被其他 worker 重复领取。
+    """
+    deleted, batch = 0, 0
+    while True:
+        rows = model.query.filter(col < before).order_by(model.id).limit(batch_size).all()
+        if not rows:
+            return deleted
+        if archive:
+            lines = [json.dumps({c.name: getattr(r, c.key) for c in model.__table__.columns}, default=str, ensure_ascii=False)
+                     for r in rows]
+            key = f"archive/{before:%Y%m%d}/{name}/{batch:05d}-{rows[0].id}.jsonl"
+            resp = obs_client.putContent(bucketName=app.config['OBS_BUCKET_NAME'], objectKey=key,
+                                         content='\n'.join(lines).encode())
+            if resp.status >= 300:
+                raise RuntimeError(f"OBS archive upload failed: {resp.errorMessage}")
+        ids = [r.id for r in rows]
+        db.session.execute(db.delete(model).where(model.id.in_(ids)), execution_options={'synchronize_session': False})
+        bump_version(name, *(['leaves'] if name in ('trainings', 'matches') else []))
+        job_queue.heartbeat()
+        db.session.commit()
+        deleted += len(ids)
+        batch += 1
+
+@job_queue.handler('purge')
+def purge_job(before, batch_size, archive):
+    before = datetime.datetime.fromisoformat(before)
+    for name, model, col in PURGE_TARGETS:
+        count = purge_batches(name, model, col, before, batch_size, archive)
+        app.logger.info('Purged %d %s before %s', count, name, before.date())
+    enqueue_stats_refresh()
+    db.session.commit()
+
+@app.before_request
+def _start_job_workers():
+    # 只在真正处理请求的进程里启动工作线程 (flask 命令行不启动)
+    job_queue.start()
+
+@app.cli.command('run-jobs')
+def run_jobs_command():
+    """以独立进程运行后台任务: flask run-jobs"""
+    job_queue.start()
+    try:
+        while True:
+            time.sleep(60)
+    except KeyboardInterrupt:
+        job_queue.stop()
+
 # --- Helper Functions ---
 
+class AuthUser:
+    """token_required 注入的轻量用户对象, 只带鉴权相关字段, 不绑定任何数据库会话"""
+    __slots__ = ('id', 'role', 'real_name', 'student_id')
+
+    def __init__(self, id, role, real_name, student_id):
+        self.id = id
+        self.role = role
+        self.real_name = real_name
+        self.student_id = student_id
+
+# 按 user_id 缓存鉴权字段, 省掉每个请求一次 User 查询
+auth_user_cache = TTLCache(maxsize=app.config['AUTH_CACHE_SIZE'], ttl=app.config['AUTH_CACHE_TTL'])
+
+def load_auth_user(user_id):
+    auth_user = auth_user_cache.get(user_id)
+    if auth_user is None:
+        row = db.session.query(User.id, User.role, User.real_name, User.student_id).filter_by(id=user_id).first()
+        if row is None:
+            return None
+        auth_user = AuthUser(*row)
+        auth_user_cache.set(user_id, auth_user)
+    return auth_user
+
+def invalidate_auth_user(user_id):
+    auth_user_cache.delete(user_id)
+
+# 各用户当前的令牌版本, 供所有 worker 在不查库的情况下拒绝已作废的 access token;
+# 条目只需保留一个 access token 有效期
+token_versions = create_shared_cache(app.config, app.config['JWT_ACCESS_TOKEN_EXPIRES'], app.logger)
+
+@db.event.listens_for(User, 'before_update')
+def _user_role_changed(mapper, connection, target):
+    # 角色在任何地方被修改都作废旧令牌 (令牌里带着角色声明)
+    if db.inspect(target).attrs.role.history.has_changes():
+        target.token_version = (target.token_version or 0) + 1
+
+@db.event.listens_for(User, 'after_update')
+def _user_updated(mapper, connection, target):
+    # flush 时只登记, 提交后才让缓存失效并发布新的令牌版本: 事务回滚时不会作废仍然有效的令牌,
+    # 提交前其他请求也不会把旧数据重新读进缓存
+    changed = db.inspect(target).attrs.token_version.history.has_changes()
+    updates = db.session.info.setdefault('user_updates', {})
+    updates[target.id] = target.token_version if changed else updates.get(target.id)
+
+@db.event.listens_for(db.session, 'after_commit')
+def _publish_user_updates(session):
+    for user_id, version in session.info.pop('user_updates', {}).items():
+        # 角色等字段在任何地方被修改时都让本进程的缓存失效, 其他 worker 由 TTL 兜底
+        invalidate_auth_user(user_id)
+        if token_versions is not None and version is not None:
+            token_versions.set(f"tv:{user_id}", str(version).encode())
+
+@db.event.listens_for(db.session, 'after_rollback')
+def _discard_user_updates(session):
+    session.info.pop('user_updates', None)
+
+def issue_tokens(user):
+    """签发 access token (带角色与资料声明, 有效期短) 和 refresh token (只用于换取新令牌)"""
+    now = datetime.datetime.utcnow()
+    access = jwt.encode({
+        'type': 'access',
+        'user_id': user.id,
+        'role': user.role,
+        'real_name': user.real_name,
+        'student_id': user.student_id,
+        'ver': user.token_version or 0,
+        'exp': now + datetime.timedelta(seconds=app.config['JWT_ACCESS_TOKEN_EXPIRES'])
+    }, app.config['JWT_SECRET_KEY'], algorithm="HS256")
+    refresh_exp = now + datetime.timedelta(seconds=app.config['JWT_REFRESH_TOKEN_EXPIRES'])
+    jti = uuid.uuid4().hex
+    refresh = jwt.encode({
+        'type': 'refresh',
+        'user_id': user.id,
+        'ver': user.token_version or 0,
+        'jti': jti,
+        'exp': refresh_exp
+    }, app.config['JWT_SECRET_KEY'], algorithm="HS256")
+    # 登记新的 refresh token, 顺带清掉该用户已过期的登记; 由调用方提交
+    db.session.execute(db.delete(RefreshToken).where(RefreshToken.user_id == user.id, RefreshToken.expires_at < now))
+    db.session.add(RefreshToken(jti=jti, user_id=user.id, expires_at=refresh_exp))
+    return {'token': access, 'refresh_token': refresh, 'expires_in': app.config['JWT_ACCESS_TOKEN_EXPIRES']}
+
+def token_revoked(user_id, version):
+    if token_versions is None:
+        return False
+    current = token_versions.get(f"tv:{user_id}")
+    return current is not None and int(current) > version
+
+class TokenInvalid(Exception):
+    """令牌缺失、过期、被作废或无效, 由错误处理器转成 401"""
+
+    def __init__(self, message, error=None, code=None):
+        super().__init__(message)
+        self.body = {'message': message}
+        if error:
+            self.body['error'] = error
+        if code:
+            self.body['code'] = code
+
+@app.errorhandler(TokenInvalid)
+def _token_invalid(e):
+    return jsonify(e.body), 401
+
+def authenticate(token):
+    """校验令牌, 返回 (AuthUser, 令牌声明), 失败时抛出 TokenInvalid"""
+    if not token:
+        raise TokenInvalid('Token missing')
+    try:
+        data = jwt.decode(token, app.config['JWT_SECRET_KEY'], algorithms=["HS256"])
+    except jwt.ExpiredSignatureError:
+        # 前端据此用 refresh token 换新令牌
+        raise TokenInvalid('Token expired', code='token_expired')
+    except Exception as e:
+        raise TokenInvalid('Token invalid', error=str(e))
+    if data.get('type') == 'access':
+        # 鉴权信息直接取自令牌声明, 不查数据库
+        if token_revoked(data['user_id'], data['ver']):
+            raise TokenInvalid('Token revoked', code='token_expired')
+        current_user = AuthUser(data['user_id'], data['role'], data['real_name'], data['student_id'])
+    elif 'type' not in data:
+        # 升级前签发的旧令牌不带声明, 到期前仍按用户 id 查询
+        current_user = load_auth_user(data['user_id'])
+    else:
+        raise TokenInvalid('Token invalid', error='Wrong token type')
+    if current_user is None:
+        raise TokenInvalid('Token invalid', error='User not found')
+    return current_user, data
+
 def token_required(f):
     @wraps(f)
     def decorated(*args, **kwargs):
         token = None
         if 'Authorization' in request.headers:
             token = request.headers['Authorization'].split(" ")[1]
-        if not token: 
-            return jsonify({'message': 'Token missing'}), 401
-        try:
-            data = jwt.decode(token, app.config['JWT_SECRET_KEY'], algorithms=["HS256"])
-            current_user = User.query.get(data['user_id'])
-        except Exception as e:
-            return jsonify({'message': 'Token invalid', 'error': str(e)}), 401
+        current_user, _ = authenticate(token)
         return f(current_user, *args, **kwargs)
     return decorated
 
@@ -128,6 +490,691 @@ def role_required(roles):
         return wrapped
     return decorator
 
+def new_object_key(filename):
+    # 时间戳加随机后缀, 同一秒内上传同名文件也不会互相覆盖
+    return secure_filename(f"{int(datetime.datetime.now().timestamp())}_{uuid.uuid4().hex[:8]}_{filename}")
+
+def object_url(key):
+    return f"https://{app.config['OBS_BUCKET_NAME']}.{app.config['OBS_ENDPOINT']}/{key}"
+
+def object_key(url):
+    """本桶对象的 URL 转回 key, 不是本桶的 URL 返回 None"""
+    prefix = object_url('')
+    return url[len(prefix):] if url and url.startswith(prefix) else None
+
+def enqueue_obs_delete(key):
+    job_queue.enqueue('obs_delete', key=key)
+
+def enqueue_thumbnails(target, record):
+    """为刚写入的图片记录安排后台生成缩略图, 需在 commit 之前调用"""
+    model, url_field, variants_field, resource = IMAGE_TARGETS[target]
+    key = object_key(getattr(record, url_field))
+    setattr(record, variants_field, None)
+    if key:
+        db.session.flush()
+        job_queue.enqueue('thumbnail', target=target, record_id=record.id, key=key)
+
+def readable_object(user, key):
+    """user 能否取得 key 的下载 URL: 本人直传的对象, 或被 user 在列表接口里能看到的记录引用的图片 (含其缩略图变体)"""
+    # archive/ 下是清理旧赛季时导出的整表数据 (含全队的请假原因), 不对任何用户签发
+    if not key or key.startswith('archive/'):
+        return False
+    if db.session.query(UploadedObject.id).filter_by(object_key=key, user_id=user.id).first():
+        return True
+    variant = re.fullmatch(r'variants/(.+)_(?:thumb|medium|full)\.webp', key)
+    if variant:
+        # 变体 key 由原图 key 去掉扩展名生成, 按前缀找回原图
+        original = object_url(variant.group(1))
+        refers = lambda col: db.or_(col == original, col.startswith(original + '.', autoescape=True))
+    else:
+        refers = lambda col: col == object_url(key)
+    own_only = user.role not in ['captain', 'coach']
+    candidates = [
+        db.session.query(TeamPhoto.id).filter(refers(TeamPhoto.photo_url)),
+        db.session.query(User.id).filter(refers(User.avatar_url)),
+        db.session.query(Venue.id).filter(refers(Venue.proof_photo_url)),
+        db.session.query(PersonalTraining.id).filter(
+            refers(PersonalTraining.photo_url), *([PersonalTraining.user_id == user.id] if own_only else [])),
+    ]
+    return any(query.first() is not None for query in candidates)
+
+def image_url(url, variants, variant=None):
+    """列表接口默认返回小尺寸变体, ?variant=original|thumb|medium|full 可指定"""
+    variant = variant or request.args.get('variant', app.config['LIST_IMAGE_VARIANT'])
+    if variant == 'original' or not variants:
+        return url
+    return json.loads(variants).get(variant, url)
+
+def bump_version(*names):
+    """在当前事务中递增资源版本号, 需在 db.session.commit() 之前调用"""
+    now = datetime.datetime.utcnow()
+    for name in names:
+        values = {'version': ResourceVersion.version + 1, 'updated_at': now}
+        updated = ResourceVersion.query.filter_by(name=name).update(values, synchronize_session=False)
+        if not updated:
+            try:
+                # 首次写入该资源时插入计数行, 与其他 worker 并发插入冲突则退回 UPDATE
+                with db.session.begin_nested():
+                    db.session.add(ResourceVersion(name=name, version=1, updated_at=now))
+            except IntegrityError:
+                ResourceVersion.query.filter_by(name=name).update(values, synchronize_session=False)
+
+def insert_ignore(model, *conflict_columns):
+    """INSERT ... ON CONFLICT (conflict_columns) DO NOTHING, 冲突的行被跳过而不是报错"""
+    dialect = postgresql if db.engine.dialect.name == 'postgresql' else sqlite
+    return dialect.insert(model).on_conflict_do_nothing(index_elements=list(conflict_columns))
+
+def parse_time(value):
+    # 前端 datetime-local 输入带 'T', 与手填的 '2024-01-01 18:00' 统一
+    return datetime.datetime.strptime(value.replace('T', ' '), '%Y-%m-%d %H:%M')
+
+def parse_day_or_time(value):
+    """查询参数里的时间范围边界: 'YYYY-MM-DD' (当天 0 点) 或 'YYYY-MM-DD HH:MM'"""
+    return datetime.datetime.strptime(value, '%Y-%m-%d') if len(value) == 10 else parse_time(value)
+
+def parse_score(value):
+    """比分: 非负整数, 前端输入框提交的数字字符串也接受; bool 不算整数"""
+    if isinstance(value, str) and value.strip().isdigit():
+        value = int(value)
+    if isinstance(value, bool) or not isinstance(value, int) or value < 0:
+        raise ValueError(f"score must be a non-negative integer, got {value!r}")
+    return value
+
+def match_result_fields(data):
+    """从请求中取出比分与完赛状态并校验类型, 不合法时抛出 ValueError"""
+    fields = {}
+    for field in ('our_score', 'opponent_score'):
+        if field in data:
+            fields[field] = parse_score(data[field])
+    if 'is_finished' in data:
+        if not isinstance(data['is_finished'], bool):
+            raise ValueError(f"is_finished must be a boolean, got {data['is_finished']!r}")
+        fields['is_finished'] = data['is_finished']
+    return fields
+
+def bulk_items():
+    """取出批量接口的请求数组 (body 为数组或 {"items": [...]}), 格式不对时返回 None"""
+    data = request.get_json(silent=True)
+    items = data.get('items') if isinstance(data, dict) else data
+    if not isinstance(items, list) or not 0 < len(items) <= app.config['BULK_MAX_ITEMS']:
+        return None
+    return items
+
+def bulk_insert(model, items, build):
+    """逐条校验后用一条 executemany INSERT 写入, 返回每条的结果
+
+    build(item) 返回一行的列值, 抛出 KeyError / ValueError / TypeError 时该条记为 error,
+    其余行仍在同一事务里写入, 写入后 rows 中每行带上新 id; 调用方负责 bump_version 与 commit。
+    """
+    results, rows = [], []
+    for i, item in enumerate(items):
+        try:
+            rows.append(build(item))
+            results.append({'index': i, 'status': 'created'})
+        except (KeyError, ValueError, TypeError, AttributeError) as e:
+            results.append({'index': i, 'status': 'error', 'message': f"Invalid item: {e}"})
+    if rows:
+        ids = db.session.scalars(db.insert(model).returning(model.id, sort_by_parameter_order=True), rows).all()
+        for row, result, new_id in zip(rows, (r for r in results if r['status'] == 'created'), ids):
+            row['id'] = result['id'] = new_id
+    return rows, results
+
+# --- 日程 ---
+# 训练与比赛占用球队日程 ('team'), 场地预约占用场地日程 ('court'), 同一日程内的时间段不能重叠
+SCHEDULE_RESOURCES = {'training': 'team', 'match': 'team', 'venue': 'court'}
+
+class ScheduleConflict(ValueError):
+    """时间段与已有日程重叠; 是 ValueError 的子类, 批量接口把它记为该条的错误"""
+
+    def __init__(self, conflicts):
+        self.conflicts = conflicts
+        super().__init__('Schedule conflict with ' + ', '.join(
+            f"{c['kind']} {c['id']}" if c.get('id') else f"another {c['kind']} in this request" for c in conflicts))
+
+def schedule_spans():
+    """(普通时间段的最长时长, 比赛时长)"""
+    return (datetime.timedelta(hours=app.config['SCHEDULE_MAX_HOURS']),
+            datetime.timedelta(minutes=app.config['MATCH_DURATION_MINUTES']))
+
+def match_end(match_time):
+    return match_time + schedule_spans()[1]
+
+def load_schedule(start, end, resource=None):
+    """一条 UNION ALL 查询取出与 [start, end) 重叠的训练 / 比赛 / 场地预约, 按开始时间排序
+
+    时间段长度有上限, 开始时间早于 start - 上限的行不可能重叠, 所以每个分支都是
+    开始时间索引上的一段有界范围扫描, 与表的总行数无关。resource 为 'team' / 'court' 时只查对应日程。
+    """
+    max_span, match_span = schedule_spans()
+
+    def branch(kind, model, start_col, end_col, title, location, *where):
+        return db.select(db.literal(kind, db.String).label('kind'), model.id.label('id'),
+                         start_col.label('start_time'), end_col.label('end_time'),
+                         title.label('title'), location.label('location')).where(*where)
+
+    no_location = db.cast(db.null(), db.String)
+    branches = []
+    if resource in (None, 'team'):
+        branches.append(branch('training', Training, Training.start_time, Training.end_time,
+                               db.literal('训练', db.String), no_location,
+                               Training.start_time > start - max_span, Training.start_time < end, Training.end_time > start))
+        # 比赛只有开始时间, 结束时间按固定时长在下面补上
+        branches.append(branch('match', Match, Match.match_time, Match.match_time, Match.opponent, Match.location,
+                               Match.match_time > start - match_span, Match.match_time < end))
+    if resource in (None, 'court'):
+        branches.append(branch('venue', Venue, Venue.start_time, Venue.end_time,
+                               db.literal('场地预约', db.String), no_location,
+                               Venue.start_time > start - max_span, Venue.start_time < end, Venue.end_time > start))
+    query = db.union_all(*branches) if len(branches) > 1 else branches[0]
+    rows = db.session.execute(query.order_by(db.text('start_time'), db.text('id'))).all()
+    return [{
+        'kind': r.kind,
+        'id': r.id,
+        'resource': SCHEDULE_RESOURCES[r.kind],
+        'start_time': r.start_time,
+        'end_time': r.end_time + match_span if r.kind == 'match' else r.end_time,
+        'title': r.title,
+        'location': r.location
+    } for r in rows]
+
+def schedule_item(entry):
+    return dict(entry, start_time=entry['start_time'].strftime('%Y-%m-%d %H:%M'),
+                end_time=entry['end_time'].strftime('%Y-%m-%d %H:%M'))
+
+def schedule_index(resource, start, end):
+    """对 resource 日程加锁, 并把 [start, end) 附近的已有条目 (一条查询) 载入 IntervalIndex 供逐条检测
+
+    Postgres 下用事务级 advisory lock 让同一日程的"检测 + 写入"串行执行, 并发请求不会同时通过检测,
+    锁随事务提交或回滚释放。冲突跨训练、比赛两张表, 单表的排他约束 (EXCLUDE) 表达不了, 所以由这里统一检测。
+    """
+    if db.engine.dialect.name == 'postgresql':
+        db.session.execute(db.text('SELECT pg_advisory_xact_lock(hashtext(:key))'), {'key': f"schedule:{resource}"})
+    index = IntervalIndex(max(schedule_spans()))
+    for entry in load_schedule(start, end, resource):
+        index.add(entry['start_time'], entry['end_time'], entry)
+    return index
+
+def bulk_schedule_index(resource, items, span):
+    """按批量请求里所有可解析条目覆盖的时间范围, 一次载入日程索引; span(item) 返回 (start, end)"""
+    spans = []
+    for item in items:
+        try:
+            spans.append(span(item))
+        except (KeyError, ValueError, TypeError, AttributeError):
+            pass
+    if not spans:
+        return IntervalIndex(max(schedule_spans()))
+    return schedule_index(resource, min(s for s, _ in spans), max(e for _, e in spans))
+
+def check_schedule(index, kind, start, end):
+    """校验时间段并检测与 index 中条目的冲突, 通过后加入 index (同一批里后面的条目据此检测)
+
+    时间段不合法时抛出 ValueError, 有冲突时抛出 ScheduleConflict。
+    """
+    if end <= start:
+        raise ValueError('end_time must be after start_time')
+    if end - start > index.max_span:
+        raise ValueError(f"Time range longer than {app.config['SCHEDULE_MAX_HOURS']} hours")
+    conflicts = index.overlapping(start, end)
+    if conflicts:
+        raise ScheduleConflict(conflicts)
+    index.add(start, end, {'kind': kind, 'id': None, 'resource': SCHEDULE_RESOURCES[kind],
+                           'start_time': start, 'end_time': end, 'title': None, 'location': None})
+
+def schedule_conflict_response(e):
+    db.session.rollback()
+    return jsonify({'message': str(e), 'conflicts': [schedule_item(c) for c in e.conflicts if c.get('id')]}), 409
+
+def resource_versions(resources):
+    """查询资源版本号, 同一请求内只查一次 (conditional 与 cached 共用)"""
+    key = tuple(resources)
+    memo = g.setdefault('resource_versions', {})
+    if key not in memo:
+        memo[key] = dict((r.name, r) for r in ResourceVersion.query.filter(ResourceVersion.name.in_(resources)))
+    return memo[key]
+
+def conditional(resources, per_user=False, vary=None):
+    """读接口的条件响应: 资源版本未变时直接返回 304, 不执行后续查询
+
+    resources 为响应所依赖的全部表; per_user 表示响应内容随当前用户不同 (如报名状态);
+    vary() 返回查询参数之外影响响应的值 (如按当天日期取的默认时间窗口), 一并计入 ETag。
+    需放在 token_required 之后。
+    """
+    if isinstance(resources, str):
+        resources = (resources,)
+
+    def decorator(f):
+        @wraps(f)
+        def wrapped(current_user, *args, **kwargs):
+            rows = resource_versions(resources)
+            parts = [f"{name}.{rows[name].version if name in rows else 0}" for name in resources]
+            if per_user:
+                parts.append(f"u{current_user.id}")
+            parts.append('%08x' % zlib.crc32(request.query_string))
+            if vary:
+                parts.append(vary())
+            etag = '-'.join(parts)
+            stamps = [r.updated_at for r in rows.values() if r.updated_at]
+            last_modified = max(stamps) if stamps else None
+
+            if request.if_none_match:
+                not_modified = request.if_none_match.contains(etag)
+            else:
+                not_modified = (last_modified is not None and request.if_modified_since is not None
+                                and last_modified.replace(microsecond=0) <= request.if_modified_since.replace(tzinfo=None))
+            if not_modified:
+                resp = app.response_class(status=304)
+            else:
+                resp = make_response(f(current_user, *args, **kwargs))
+                if resp.status_code != 200:
+                    return resp
+            resp.set_etag(etag)
+            if last_modified is not None:
+                resp.last_modified = last_modified
+            resp.headers['Cache-Control'] = 'private, no-cache'
+            return resp
+        return wrapped
+    return decorator
+
+password_hasher = PasswordHasher(
+    app.config['PASSWORD_HASH_METHOD'],
+    workers=app.config['PASSWORD_HASH_WORKERS'],
+    queue_limit=app.config['PASSWORD_HASH_QUEUE'],
+    nice=app.config['PASSWORD_HASH_NICE']
+)
+# 登录限流计数器, 与响应缓存共用存储 (Redis 或 /dev/shm), 所有 worker 共享
+login_throttle = create_shared_cache(app.config, app.config['LOGIN_THROTTLE_WINDOW'], app.logger)
+
+@app.errorhandler(HasherBusy)
+def _hasher_busy(e):
+    return jsonify({'message': 'Server busy, please retry'}), 503, {'Retry-After': '1'}
+
+def login_throttled(username):
+    """计数本次登录尝试, 用户名或 IP 在当前窗口内超出上限时返回 True"""
+    if login_throttle is None:
+        return False
+    per_user = login_throttle.incr(f"login:u:{(username or '').lower()}")
+    per_ip = login_throttle.incr(f"login:ip:{request.remote_addr}")
+    return per_user > app.config['LOGIN_MAX_PER_USERNAME'] or per_ip > app.config['LOGIN_MAX_PER_IP']
+
+# 跨 worker 共享的读接口响应缓存 (Redis 或 /dev/shm 文件), 为 None 表示关闭
+response_cache = create_shared_cache(app.config, app.config['RESPONSE_CACHE_TTL'], app.logger)
+
+def user_scope(user):
+    return f"u{user.id}"
+
+def role_scope(user):
+    """队长 / 教练看到全队数据, 共用一份缓存; 其他人只看到自己的"""
+    return 'all' if user.role in ['captain', 'coach'] else f"u{user.id}"
+
+def cached(resources, scope=None, vary=None):
+    """把读接口的 200 响应存入共享缓存, 所有 worker 共用
+
+    缓存键由接口名、scope(current_user) 的结果、查询参数、vary() 的结果 (同 conditional) 和各资源的版本号组成。
+    写接口通过 bump_version 使版本号 +1, 旧条目随即失效 (不再被读到, 到期后清理)。
+    需放在 conditional 之后, 这样 304 时不会读缓存。
+    """
+    if isinstance(resources, str):
+        resources = (resources,)
+
+    def decorator(f):
+        @wraps(f)
+        def wrapped(current_user, *args, **kwargs):
+            if response_cache is None:
+                return f(current_user, *args, **kwargs)
+            rows = resource_versions(resources)
+            key = ':'.join([
+                'resp', request.endpoint,
+                scope(current_user) if scope else 'all',
+                # 带上更新时间, 数据库重建后版本号从头计数也不会撞上旧条目
+                '-'.join(f"{rows[name].version}@{rows[name].updated_at.timestamp():.0f}" if name in rows else '0'
+                         for name in resources),
+                hashlib.sha1(request.query_string).hexdigest()
+            ] + ([vary()] if vary else []))
+            value = response_cache.get(key)
+            if value is not None:
+                headers, body = value.split(b'\n', 1)
+                headers = json.loads(headers)
+                headers.setdefault('Content-Type', 'application/json')
+                return app.response_class(body, headers=headers)
+
+            resp = make_response(f(current_user, *args, **kwargs))
+            if resp.status_code == 200:
+                headers = {name: resp.headers[name] for name in ('Content-Type', 'Content-Disposition', 'X-Next-Cursor')
+                           if name in resp.headers}
+                response_cache.set(key, json.dumps(headers).encode() + b'\n' + resp.get_data())
+            return resp
+        return wrapped
+    return decorator
+
+# 实时变更推送: 写接口用 publish_change 登记事件, 随事务提交经 broker 发给 /api/events 的连接; 为 None 表示关闭
+with app.app_context():
+    change_feed = create_broker(app.config, db.engine, app.logger) if app.config['EVENTS_ENABLED'] else None
+
+def publish_change(entity, action, audience=None, **data):
+    """登记一条变更事件, 当前事务提交后推送, 回滚则丢弃
+
+    audience 为用户 id 时只推送给该用户和队长 / 教练 (与列表接口的可见范围一致)。
+    """
+    if change_feed is not None:
+        db.session.info.setdefault('change_events', []).append(
+            {'entity': entity, 'action': action, 'data': data, 'audience': audience})
+
+@db.event.listens_for(db.session, 'before_commit')
+def _stage_changes(session):
+    events = session.info.get('change_events')
+    if events:
+        change_feed.stage(session, events)
+
+@db.event.listens_for(db.session, 'after_commit')
+def _publish_changes(session):
+    events = session.info.pop('change_events', None)
+    if events:
+        change_feed.committed(events)
+
+@db.event.listens_for(db.session, 'after_rollback')
+def _discard_changes(session):
+    session.info.pop('change_events', None)
+
+@db.event.listens_for(Leave, 'after_update')
+def _leave_status_changed(mapper, connection, target):
+    # 请假状态 (审批) 无论在哪里被修改都推送给申请人
+    if db.inspect(target).attrs.status.history.has_changes():
+        publish_change('leave', 'updated', audience=target.user_id, id=target.id, status=target.status)
+
+def _encode_cursor(value, row_id):
+    payload = json.dumps([value.isoformat() if value is not None else None, row_id])
+    return base64.urlsafe_b64encode(payload.encode()).decode()
+
+def _decode_cursor(cursor, with_value):
+    """解出 (value, id); 格式或类型不对时抛出 ValueError
+
+    with_value 表示列表按时间列排序: value 为 ISO 时间或 null (该行时间列为空), 否则只能是 null。
+    """
+    payload = json.loads(base64.urlsafe_b64decode(cursor.encode()).decode())
+    if not isinstance(payload, list) or len(payload) != 2:
+        raise ValueError('cursor must be [value, id]')
+    value, row_id = payload
+    if isinstance(row_id, bool) or not isinstance(row_id, int):
+        raise ValueError('cursor id must be an integer')
+    if value is not None:
+        if not with_value or not isinstance(value, str):
+            raise ValueError('cursor value must be a timestamp')
+        value = datetime.datetime.fromisoformat(value)
+    return value, row_id
+
+def _after_cursor(order_col, model, cursor, descending):
+    """(order_col, id) 在游标之后的条件; 空值按最大值排序 (与 PostgreSQL 索引的默认顺序一致)"""
+    value, row_id = cursor
+    id_after = model.id < row_id if descending else model.id > row_id
+    if value is None:
+        # 游标停在空值段: 降序时空值段在最前, 之后是全部非空行; 升序时空值段在最后
+        tail = db.and_(order_col.is_(None), id_after)
+        return db.or_(tail, order_col.isnot(None)) if descending else tail
+    after = order_col < value if descending else order_col > value
+    cond = db.or_(after, db.and_(order_col == value, id_after))
+    return cond if descending else db.or_(cond, order_col.is_(None))
+
+def list_response(query, model, fields, order_col=None, descending=True, sources=None):
+    """列表接口通用出口: 游标分页 (?limit=&after=) + 字段裁剪 (?fields=)
+
+    按 (order_col, id) 排序做 keyset 分页, 下一页游标放在 X-Next-Cursor 响应头里, 响应体仍然是数组;
+    未传 limit 时每页 LIST_DEFAULT_LIMIT 条。fields 为 输出字段 -> 取值函数, 带 ?fields= 时只 SELECT
+    所选字段读取的列: sources 给出派生字段依赖的列, 缺省为模型上的同名列。
+    """
+    if 'limit' in request.args:
+        # 客户端给出的 limit 必须是正整数, 不能借 0 / 负数绕过 LIST_MAX_LIMIT 取整表
+        limit = request.args.get('limit', type=int)
+        if limit is None or limit <= 0:
+            return jsonify({'message': f"limit must be an integer between 1 and {app.config['LIST_MAX_LIMIT']}"}), 400
+        limit = min(limit, app.config['LIST_MAX_LIMIT'])
+    else:
+        limit = app.config['LIST_DEFAULT_LIMIT'] or None
+    try:
+        after = request.args.get('after')
+        cursor = _decode_cursor(after, order_col is not None) if after else None
+    except (ValueError, TypeError):
+        return jsonify({'message': 'Invalid cursor'}), 400
+
+    wanted = request.args.get('fields')
+    if wanted:
+        sources = sources or {}
+        fields = {name: fields[name] for name in (w.strip() for w in wanted.split(',')) if name in fields}
+        columns = [model.id] + ([order_col] if order_col is not None else [])
+        for name in fields:
+            columns.extend(sources[name] if name in sources else (getattr(model, name),))
+        query = query.with_entities(*{col.key: col for col in columns}.values())
+
+    if order_col is not None:
+        if cursor:
+            query = query.filter(_after_cursor(order_col, model, cursor, descending))
+        order = [order_col.desc().nulls_first(), model.id.desc()] if descending else [order_col.nulls_last(), model.id]
+    else:
+        if cursor:
+            query = query.filter(model.id < cursor[1] if descending else model.id > cursor[1])
+        order = [model.id.desc() if descending else model.id]
+    query = query.order_by(*order)
+
+    rows = query.limit(limit + 1).all() if limit else query.all()
+    next_cursor = None
+    if limit and len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = _encode_cursor(getattr(last, order_col.key) if order_col is not None else None, last.id)
+
+    resp = jsonify([row_item(fields, r) for r in rows])
+    if next_cursor:
+        resp.headers['X-Next-Cursor'] = next_cursor
+    return resp
+
+def row_item(fields, row):
+    return {name: get(row) for name, get in fields.items()}
+
+# 列表接口与变更推送共用的单条记录格式: 输出字段 -> 取值函数
+TRAINING_FIELDS = {
+    'id': lambda t: t.id,
+    'start_time': lambda t: t.start_time.strftime('%Y-%m-%d %H:%M'),
+    'end_time': lambda t: t.end_time.strftime('%Y-%m-%d %H:%M'),
+    'plan_content': lambda t: t.plan_content,
+}
+
+VENUE_FIELDS = {
+    'id': lambda v: v.id,
+    'start_time': lambda v: v.start_time.strftime('%Y-%m-%d %H:%M'),
+    'end_time': lambda v: v.end_time.strftime('%Y-%m-%d %H:%M'),
+    'proof_photo_url': lambda v: v.proof_photo_url,
+}
+
+PHOTO_FIELDS = {
+    'id': lambda p: p.id,
+    'url': lambda p: image_url(p.photo_url, p.photo_variants),
+    'original_url': lambda p: p.photo_url,
+    'description': lambda p: p.description,
+}
+PHOTO_SOURCES = {'url': (TeamPhoto.photo_url, TeamPhoto.photo_variants), 'original_url': (TeamPhoto.photo_url,)}
+
+def training_item(t):
+    return row_item(TRAINING_FIELDS, t)
+
+def match_item(m):
+    # 不含报名信息, get_matches 另行补上 participants / is_signed_up
+    return {
+        'id': m.id,
+        'match_time': m.match_time.strftime('%Y-%m-%d %H:%M'),
+        'opponent': m.opponent,
+        'location': m.location,
+        'our_score': m.our_score,
+        'opponent_score': m.opponent_score,
+        'is_finished': m.is_finished
+    }
+
+def venue_item(v):
+    return row_item(VENUE_FIELDS, v)
+
+def photo_item(p, variant=None):
+    # 后台任务里没有请求上下文, 由调用方指定变体
+    item = {name: get(p) for name, get in PHOTO_FIELDS.items() if name != 'url'}
+    item['url'] = image_url(p.photo_url, p.photo_variants, variant)
+    return item
+
+def load_attendance(start=None, end=None):
+    """按列读出 [start, end) 内出勤分析所需的数据, 返回 (球员列表, attendance_report 的参数)
+
+    每张表一条只取 id / 时间 / 时长列的索引查询, 经 Core 连接执行 (跳过 ORM 结果处理), 结果直接转成 NumPy 数组。
+    请假只扫一遍 (不在 SQL 里去重或分组, 50k 行时 DISTINCT 与三路 UNION 占了大半耗时), 在 NumPy 里拆出
+    覆盖的 (球员, 训练 / 比赛) 对 (attendance_report 里按矩阵置位, 重复的对自然只计一次), 时长按球员求和,
+    每条请假只计一次 (同时关联训练和比赛的按训练时间归入范围, 都未关联的按提交时间); 被驳回的请假不计。
+    """
+    def within(col):
+        return [cond for cond in (col >= start if start else None, col < end if end else None) if cond is not None]
+
+    def columns(rows, *dtypes):
+        cols = list(zip(*rows)) or [()] * len(dtypes)
+        return [np.array(col, dtype=dtype) for col, dtype in zip(cols, dtypes)]
+
+    def numeric_columns(query, *dtypes):
+        # 只含数值列的大结果集直接从 DBAPI 游标取元组, 省掉逐行构造 Row (5 万行约 100 ms),
+        # 再整体转成结构化数组按列取出, 不在 Python 里逐列转置
+        result = conn.execute(query)
+        try:
+            rows = result.cursor.fetchall()
+        finally:
+            result.close()
+        table = np.array(rows, dtype=[(f'c{i}', dtype) for i, dtype in enumerate(dtypes)])
+        return [table[name] for name in table.dtype.names]
+
+    conn = db.session.connection()
+    players = conn.execute(db.select(User.id, User.username, User.real_name, User.created_at)
+                           .where(User.role.in_(['player', 'captain'])).order_by(User.id)).all()
+    trainings = conn.execute(db.select(Training.id, Training.start_time)
+                             .where(*within(Training.start_time)).order_by(Training.start_time)).all()
+    matches = conn.execute(db.select(Match.id, Match.match_time)
+                           .where(*within(Match.match_time)).order_by(Match.match_time)).all()
+    signup_users, signup_matches = numeric_columns(
+        db.select(MatchSignup.user_id, MatchSignup.match_id)
+          .join(Match, MatchSignup.match_id == Match.id).where(*within(Match.match_time)), np.int64, np.int64)
+    # 未关联训练 / 比赛的 id 取 0 (不与任何 id 重合); 有时间范围时先在 SQL 里筛掉三种归属都不在范围内的请假
+    leave_query = db.select(Leave.user_id, db.func.coalesce(Leave.training_id, 0), db.func.coalesce(Leave.match_id, 0),
+                            db.func.coalesce(Leave.duration_hours, 0)) \
+        .where(db.or_(Leave.status.is_(None), Leave.status != 'rejected'))
+    if start or end:
+        # 三路各走时间索引, 取并集后按主键回表
+        leave_query = leave_query.where(Leave.id.in_(db.union(
+            db.select(Leave.id).join(Training, Leave.training_id == Training.id).where(*within(Training.start_time)),
+            db.select(Leave.id).join(Match, Leave.match_id == Match.id).where(*within(Match.match_time)),
+            db.select(Leave.id).where(Leave.training_id.is_(None), Leave.match_id.is_(None), *within(Leave.created_at))
+        )))
+    leave_users, leave_trainings, leave_matches, leave_hours = numeric_columns(
+        leave_query, np.int64, np.int64, np.int64, np.float64)
+
+    # 加入时间按天比较: 当天加入的球员从当天的训练起计入应到
+    joined = np.array([(r.created_at or datetime.datetime.min).date() for r in players], dtype='datetime64[D]')
+    player_ids, = columns(players, np.int64)
+    training_ids, training_times = columns(trainings, np.int64, 'datetime64[s]')
+    match_ids, match_times = columns(matches, np.int64, 'datetime64[s]')
+    # training_ids / match_ids 即范围内的训练 / 比赛; 时长按互斥的三种归属判断是否在范围内
+    in_training = positions(training_ids, leave_trainings) >= 0
+    in_match = positions(match_ids, leave_matches) >= 0
+    counted = np.where(leave_trainings > 0, in_training, np.where(leave_matches > 0, in_match, True))
+    hour_users, user_rows = np.unique(leave_users[counted], return_inverse=True)
+    hour_totals = np.bincount(user_rows, weights=leave_hours[counted], minlength=len(hour_users))
+    return [(r.id, r.username, r.real_name) for r in players], dict(
+        player_ids=player_ids, joined=joined,
+        training_ids=training_ids, training_times=training_times,
+        match_ids=match_ids, match_times=match_times,
+        training_leave_users=leave_users[in_training], training_leave_ids=leave_trainings[in_training],
+        match_leave_users=leave_users[in_match], match_leave_ids=leave_matches[in_match],
+        hour_users=hour_users, hour_totals=hour_totals,
+        signup_users=signup_users, signup_matches=signup_matches
+    )
+
+def compute_dashboard_stats():
+    leaderboard_query = db.session.query(
+        User.real_name, 
+        db.func.count(PersonalTraining.id).label('count')
+    ).join(PersonalTraining).group_by(User.id).order_by(db.desc('count')).limit(5).all()
+    
+    leaderboard = [{'name': name, 'count': count} for name, count in leaderboard_query]
+
+    total_trainings = Training.query.count()
+
+    # 应到次数按每名球员入队之后的训练计, 缺勤按 (球员, 训练) 去重且不计被驳回的请假,
+    # 与 /api/analytics/attendance 的全队出勤率口径一致; 这里只需汇总, 不必读出整张请假表。
+    # 展示的请假数也是这些缺勤对的个数, 与出勤率同一口径
+    joined = np.array([(created_at or datetime.datetime.min).date() for created_at in db.session.scalars(
+        db.select(User.created_at).where(User.role.in_(['player', 'captain'])))], dtype='datetime64[D]')
+    training_times = np.array(db.session.scalars(db.select(Training.start_time).order_by(Training.start_time)).all(),
+                              dtype='datetime64[s]')
+    total_possible = int(roster_counts(joined, training_times).sum())
+    absent_pairs = db.select(Leave.user_id, Leave.training_id).distinct() \
+        .join(User, Leave.user_id == User.id).join(Training, Leave.training_id == Training.id) \
+        .where(User.role.in_(['player', 'captain']), db.or_(Leave.status.is_(None), Leave.status != 'rejected'),
+               db.or_(User.created_at.is_(None), Training.start_time >= db.func.date(User.created_at)))
+    total_absent = db.session.scalar(db.select(db.func.count()).select_from(absent_pairs.subquery()))
+    attendance_rate = 0
+    if total_possible > 0:
+        attendance_rate = round(((total_possible - total_absent) / total_possible) * 100, 1)
+
+    matches = Match.query.filter_by(is_finished=True).order_by(Match.match_time).limit(10).all()
+    match_trend = [{
+        'date': m.match_time.strftime('%m-%d'),
+        'opponent': m.opponent,
+        'our_score': m.our_score,
+        'opponent_score': m.opponent_score,
+        'result': 'Win' if m.our_score > m.opponent_score else ('Loss' if m.our_score < m.opponent_score else 'Draw')
+    } for m in matches]
+
+    return {
+        'leaderboard': leaderboard,
+        'attendance': {
+            'rate': attendance_rate,
+            'leaves': total_absent,
+            'total_trainings': total_trainings
+        },
+        'match_trend': match_trend
+    }
+
+def store_dashboard_stats():
+    """在当前事务中重算仪表盘统计并写入 dashboard_summary, 由调用方 commit"""
+    stats = compute_dashboard_stats()
+    db.session.merge(DashboardSummary(id=1, payload=json.dumps(stats), updated_at=datetime.datetime.utcnow()))
+    bump_version('dashboard')
+    # 统计结果很小, 直接推送给仪表盘, 不必再请求 /api/dashboard/stats
+    publish_change('dashboard', 'updated', stats=stats)
+    return stats
+
+def refresh_dashboard_stats():
+    """立即重算并提交仪表盘统计, 失败时回滚并返回 None"""
+    try:
+        stats = store_dashboard_stats()
+        db.session.commit()
+        return stats
+    except Exception:
+        # 并发刷新时可能撞主键
+        db.session.rollback()
+        app.logger.exception('Dashboard stats refresh failed')
+        return None
+
+def enqueue_stats_refresh():
+    """安排后台重算仪表盘统计, 需在写操作 commit 之前调用 (任务随写操作一起提交, 回滚则一并作废)"""
+    job_queue.enqueue('refresh_stats', delay=app.config['DASHBOARD_REFRESH_DELAY'])
+
+@job_queue.handler('refresh_stats')
+def refresh_stats_job():
+    # 同一时间只有一个刷新在计算: 后写入的结果一定是后开始计算的, 不会被较早的结果覆盖
+    if db.engine.dialect.name == 'postgresql':
+        db.session.execute(db.text('SELECT pg_advisory_xact_lock(hashtext(:key))'), {'key': 'dashboard_stats'})
+    # 合并: 其他排队中的刷新任务已经提交, 对应的写操作也已提交, 下面的重算能看到, 一并完成;
+    # 此后提交的写操作各自带着新的任务, 不会漏算
+    Job.query.filter(Job.kind == 'refresh_stats', Job.status == 'queued').delete(synchronize_session=False)
+    store_dashboard_stats()
+    db.session.commit()
+
+@app.cli.command('recompute-stats')
+def recompute_stats_command():
+    """全量重算仪表盘统计 (可由 cron 定时执行做对账): flask recompute-stats"""
+    print('Dashboard stats recomputed' if refresh_dashboard_stats() is not None else 'Dashboard stats refresh failed')
+
 # --- Routes ---
 
 # 0. 文件上传服务 (OBS 适配版)
@@ -142,58 +1189,234 @@ def upload_file(current_user):
     
     if file:
         try:
-            filename = secure_filename(f"{int(datetime.datetime.now().timestamp())}_{file.filename}")
-            resp = obs_client.putContent(
-                bucketName=app.config['OBS_BUCKET_NAME'],
-                objectKey=filename,
-                content=file.read()
+            filename = new_object_key(file.filename)
+            # 按分段流式上传, 单个请求占用的内存与文件大小无关
+            stream_upload(
+                obs_client,
+                app.config['OBS_BUCKET_NAME'],
+                filename,
+                file.stream,
+                part_size=app.config['OBS_PART_SIZE'],
+                workers=app.config['OBS_UPLOAD_WORKERS']
             )
-            
-            if resp.status < 300:
-                file_url = f"https://{app.config['OBS_BUCKET_NAME']}.{app.config['OBS_ENDPOINT']}/{filename}"
-                return jsonify({'url': file_url})
-            else:
-                return jsonify({'message': 'OBS upload failed', 'error': resp.errorMessage}), 500
-                
+            return jsonify({'url': object_url(filename)})
         except Exception as e:
             return jsonify({'message': 'Upload error', 'error': str(e)}), 500
 
+# [新增] 断点续传: 大文件由客户端分段上传, 中断后可查询已传分段继续
+@app.route('/api/uploads', methods=['POST'])
+@token_required
+def init_resumable_upload(current_user):
+    data = request.get_json() or {}
+    if not data.get('filename'):
+        return jsonify({'message': 'Filename missing'}), 400
+    filename = new_object_key(data['filename'])
+    resp = obs_client.initiateMultipartUpload(app.config['OBS_BUCKET_NAME'], filename)
+    if resp.status >= 300:
+        return jsonify({'message': 'OBS upload failed', 'error': resp.errorMessage}), 500
+    db.session.add(UploadedObject(object_key=filename, user_id=current_user.id, upload_id=resp.body.uploadId))
+    db.session.commit()
+    return jsonify({'upload_id': resp.body.uploadId, 'key': filename, 'part_size': app.config['OBS_PART_SIZE'],
+                    'max_bytes': app.config['UPLOAD_MAX_BYTES']}), 201
+
+def pending_upload(user, upload_id, key):
+    """user 自己发起、尚未合并的分段上传登记; 不存在或不属于 user 时返回 None"""
+    if not key:
+        return None
+    return UploadedObject.query.filter_by(object_key=key, upload_id=upload_id, user_id=user.id,
+                                          status='pending').first()
+
+@app.route('/api/uploads/<upload_id>/parts/<int:part_number>', methods=['PUT'])
+@token_required
+def upload_resumable_part(current_user, upload_id, part_number):
+    key = request.args.get('key')
+    if not key or not request.content_length:
+        return jsonify({'message': 'Key or body missing'}), 400
+    if not pending_upload(current_user, upload_id, key):
+        return jsonify({'message': 'Upload not found'}), 404
+    # 除最后一段外每段都是 part_size: 单段不得超过 part_size, 该段结束位置不得超过上传上限
+    part_size = app.config['OBS_PART_SIZE']
+    if part_number < 1 or request.content_length > part_size:
+        return jsonify({'message': f'part_number must be >= 1 and parts at most {part_size} bytes'}), 400
+    if (part_number - 1) * part_size + request.content_length > app.config['UPLOAD_MAX_BYTES']:
+        return jsonify({'message': f"Upload exceeds {app.config['UPLOAD_MAX_BYTES']} bytes"}), 413
+    # 请求体直接作为流转发给 OBS, 不在内存中缓冲整个分段
+    resp = obs_client.uploadPart(app.config['OBS_BUCKET_NAME'], key, part_number, upload_id,
+                                 content=request.stream, partSize=request.content_length)
+    if resp.status >= 300:
+        return jsonify({'message': 'OBS upload failed', 'error': resp.errorMessage}), 500
+    return jsonify({'part_number': part_number, 'etag': resp.body.etag})
+
+@app.route('/api/uploads/<upload_id>', methods=['GET'])
+@token_required
+def list_resumable_parts(current_user, upload_id):
+    key = request.args.get('key')
+    if not key:
+        return jsonify({'message': 'Key missing'}), 400
+    if not pending_upload(current_user, upload_id, key):
+        return jsonify({'message': 'Upload not found'}), 404
+    resp = obs_client.listParts(app.config['OBS_BUCKET_NAME'], key, upload_id)
+    if resp.status >= 300:
+        return jsonify({'message': 'Upload not found', 'error': resp.errorMessage}), 404
+    return jsonify([{'part_number': p.partNumber, 'etag': p.etag, 'size': p.size} for p in resp.body.parts])
+
+@app.route('/api/uploads/<upload_id>/complete', methods=['POST'])
+@token_required
+def complete_resumable_upload(current_user, upload_id):
+    key = request.args.get('key')
+    if not key:
+        return jsonify({'message': 'Key missing'}), 400
+    obj = pending_upload(current_user, upload_id, key)
+    if not obj:
+        return jsonify({'message': 'Upload not found'}), 404
+    listed = obs_client.listParts(app.config['OBS_BUCKET_NAME'], key, upload_id)
+    if listed.status >= 300:
+        return jsonify({'message': 'Upload not found', 'error': listed.errorMessage}), 404
+    size = sum(p.size for p in listed.body.parts)
+    if size > app.config['UPLOAD_MAX_BYTES']:
+        # 分段时已按位置核对过, 这里兜底: 超限的上传直接放弃, 不予登记
+        obs_client.abortMultipartUpload(app.config['OBS_BUCKET_NAME'], key, upload_id)
+        obj.status = 'rejected'
+        db.session.commit()
+        return jsonify({'message': f"Upload exceeds {app.config['UPLOAD_MAX_BYTES']} bytes"}), 413
+    parts = [CompletePart(partNum=p.partNumber, etag=p.etag) for p in listed.body.parts]
+    resp = obs_client.completeMultipartUpload(app.config['OBS_BUCKET_NAME'], key, upload_id,
+                                              CompleteMultipartUploadRequest(parts=parts))
+    if resp.status >= 300:
+        return jsonify({'message': 'OBS upload failed', 'error': resp.errorMessage}), 500
+    obj.size = size
+    obj.status = 'confirmed'
+    db.session.commit()
+    return jsonify({'url': object_url(key)})
+
+@app.route('/api/uploads/<upload_id>', methods=['DELETE'])
+@token_required
+def abort_resumable_upload(current_user, upload_id):
+    key = request.args.get('key')
+    if not key:
+        return jsonify({'message': 'Key missing'}), 400
+    obj = pending_upload(current_user, upload_id, key)
+    if not obj:
+        return jsonify({'message': 'Upload not found'}), 404
+    obs_client.abortMultipartUpload(app.config['OBS_BUCKET_NAME'], key, upload_id)
+    db.session.delete(obj)
+    db.session.commit()
+    return jsonify({'message': 'Upload aborted'})
+
+# [新增] 直传 OBS: 签发短期有效的上传 URL, 文件不再经过后端
+@app.route('/api/uploads/presign', methods=['POST'])
+@token_required
+def presign_upload(current_user):
+    data = request.get_json() or {}
+    if not data.get('filename'):
+        return jsonify({'message': 'Filename missing'}), 400
+    size = data.get('size')
+    if isinstance(size, bool) or not isinstance(size, int) or not 0 < size <= app.config['UPLOAD_MAX_BYTES']:
+        return jsonify({'message': f"size must be 1-{app.config['UPLOAD_MAX_BYTES']} bytes"}), 400
+    content_type = data.get('content_type') or 'application/octet-stream'
+    filename = new_object_key(data['filename'])
+    # 直传不经过 nginx 的 client_max_body_size: 用 V4 签名把 Content-Length 纳入签名头,
+    # 上传的字节数与申请时声明的不一致 OBS 即拒绝; confirm 时再按声明的大小核对一次
+    signed = obs_client.createV4SignedUrl(
+        'PUT', app.config['OBS_BUCKET_NAME'], filename,
+        expires=app.config['OBS_PRESIGN_EXPIRES'],
+        headers={'Content-Type': content_type, 'Content-Length': str(size)}
+    )
+    db.session.add(UploadedObject(object_key=filename, user_id=current_user.id, content_type=content_type, size=size))
+    db.session.commit()
+    return jsonify({
+        'key': filename,
+        'upload_url': signed.signedUrl,
+        'headers': {k: v for k, v in signed.actualSignedRequestHeaders.items() if k.lower() != 'host'},
+        'expires_in': app.config['OBS_PRESIGN_EXPIRES']
+    }), 201
+
+# 客户端直传完成后回调, 确认对象已存在并登记
+@app.route('/api/uploads/confirm', methods=['POST'])
+@token_required
+def confirm_upload(current_user):
+    data = request.get_json() or {}
+    obj = UploadedObject.query.filter_by(object_key=data.get('key'), user_id=current_user.id).first()
+    if not obj:
+        return jsonify({'message': 'Not found'}), 404
+    if obj.status != 'confirmed':
+        resp = obs_client.getObjectMetadata(app.config['OBS_BUCKET_NAME'], obj.object_key)
+        if resp.status >= 300:
+            return jsonify({'message': 'Object not uploaded', 'error': resp.errorMessage}), 400
+        size = resp.body.contentLength
+        if obj.status == 'rejected' or size > app.config['UPLOAD_MAX_BYTES'] or (obj.size is not None and size != obj.size):
+            # 超出上限或与申请时声明的大小不符, 删除对象, 不予登记
+            if obj.status != 'rejected':
+                obj.status = 'rejected'
+                enqueue_obs_delete(obj.object_key)
+                db.session.commit()
+            return jsonify({'message': 'Uploaded object exceeds the declared size'}), 413
+        obj.size = size
+        obj.status = 'confirmed'
+        db.session.commit()
+    return jsonify({'key': obj.object_key, 'url': object_url(obj.object_key)})
+
+# 私有桶时换取短期有效的下载 URL
+@app.route('/api/uploads/signed_url', methods=['GET'])
+@token_required
+def signed_download_url(current_user):
+    key = request.args.get('key')
+    if not key:
+        return jsonify({'message': 'Key missing'}), 400
+    if not readable_object(current_user, key):
+        return jsonify({'message': 'Permission denied'}), 403
+    signed = obs_client.createSignedUrl('GET', app.config['OBS_BUCKET_NAME'], key,
+                                        expires=app.config['OBS_PRESIGN_EXPIRES'])
+    return jsonify({'url': signed.signedUrl, 'expires_in': app.config['OBS_PRESIGN_EXPIRES']})
+
 # [新增] 获取所有人员列表 (供人员信息栏使用)
 @app.route('/api/users', methods=['GET'])
 @token_required
+@conditional('users')
+@cached('users')
 def get_all_users(current_user):
-    users = User.query.all()
-    return jsonify([{
-        'id': u.id,
-        'username': u.username,
-        'real_name': u.real_name,
-        'role': u.role,
-        'student_id': u.student_id,
-        'avatar_url': u.avatar_url,
-        'bio': u.bio
-    } for u in users])
+    return list_response(User.query, User, {
+        'id': lambda u: u.id,
+        'username': lambda u: u.username,
+        'real_name': lambda u: u.real_name,
+        'role': lambda u: u.role,
+        'student_id': lambda u: u.student_id,
+        'avatar_url': lambda u: image_url(u.avatar_url, u.avatar_variants),
+        'bio': lambda u: u.bio
+    }, descending=False, sources={'avatar_url': (User.avatar_url, User.avatar_variants)})
 
 # [新增] 更新个人资料 (改头像、密码、信息)
 @app.route('/api/users/profile', methods=['PUT'])
 @token_required
 def update_profile(current_user):
     data = request.get_json()
+    user = User.query.get(current_user.id)
     
     # 修改基本信息
-    if 'real_name' in data: current_user.real_name = data['real_name']
-    if 'student_id' in data: current_user.student_id = data['student_id']
-    if 'avatar_url' in data: current_user.avatar_url = data['avatar_url']
-    if 'bio' in data: current_user.bio = data['bio']
+    if 'real_name' in data: user.real_name = data['real_name']
+    if 'student_id' in data: user.student_id = data['student_id']
+    if 'avatar_url' in data and data['avatar_url'] != user.avatar_url:
+        user.avatar_url = data['avatar_url']
+        enqueue_thumbnails('user', user)
+    if 'bio' in data: user.bio = data['bio']
     
     # 修改密码 (如果有值)
     if 'password' in data and data['password']:
         if len(data['password']) < 6:
             return jsonify({'message': 'Password too short'}), 400
-        current_user.password_hash = generate_password_hash(data['password'], method='scrypt')
+        user.password_hash = password_hasher.hash(data['password'])
+        # 改密码后其他设备上的令牌全部作废
+        user.token_version = (user.token_version or 0) + 1
+        db.session.execute(db.delete(RefreshToken).where(RefreshToken.user_id == user.id))
         
     try:
+        bump_version('users')
+        enqueue_stats_refresh()
+        # 令牌里带着姓名 / 学号, 资料变更后返回新令牌给当前设备 (新 refresh token 随本次修改一起登记)
+        tokens = issue_tokens(user)
         db.session.commit()
-        return jsonify({'message': 'Profile updated successfully'})
+        invalidate_auth_user(user.id)
+        return jsonify(dict(tokens, message='Profile updated successfully'))
     except Exception as e:
         db.session.rollback()
         return jsonify({'message': 'Update failed', 'error': str(e)}), 500
@@ -201,50 +1424,129 @@ def update_profile(current_user):
 # 1. 仪表盘统计数据
 @app.route('/api/dashboard/stats', methods=['GET'])
 @token_required
+@conditional('dashboard')
+@cached('dashboard')
 def get_dashboard_stats(current_user):
-    leaderboard_query = db.session.query(
-        User.real_name, 
-        db.func.count(PersonalTraining.id).label('count')
-    ).join(PersonalTraining).group_by(User.id).order_by(db.desc('count')).limit(5).all()
-    
-    leaderboard = [{'name': name, 'count': count} for name, count in leaderboard_query]
+    summary = DashboardSummary.query.get(1)
+    if summary is None:
+        stats = refresh_dashboard_stats()
+        if stats is None:
+            return jsonify({'message': 'Stats unavailable, please retry'}), 503
+        return jsonify(stats)
+    return app.response_class(summary.payload, mimetype='application/json')
 
-    total_players = User.query.filter_by(role='player').count() + User.query.filter_by(role='captain').count()
-    total_trainings = Training.query.count()
-    total_leaves = Leave.query.filter(Leave.training_id != None).count()
-    
-    total_possible = total_players * total_trainings if total_players > 0 else 1
-    attendance_rate = 0
-    if total_possible > 0:
-        attendance_rate = round(((total_possible - total_leaves) / total_possible) * 100, 1)
+@app.route('/api/ping', methods=['GET'])
+def ping():
+    return jsonify({'status': 'ok', 'message': 'Basketball System Online'})
 
-    matches = Match.query.filter_by(is_finished=True).order_by(Match.match_time).limit(10).all()
-    match_trend = [{
-        'date': m.match_time.strftime('%m-%d'),
-        'opponent': m.opponent,
-        'our_score': m.our_score,
-        'opponent_score': m.opponent_score,
-        'result': 'Win' if m.our_score > m.opponent_score else ('Loss' if m.our_score < m.opponent_score else 'Draw')
-    } for m in matches]
+# [新增] 实时变更推送 (Server-Sent Events): 比分、报名、请假、照片等变更以单条事件推送, 客户端合并到已有列表
+# 浏览器的 EventSource 不能带请求头, 令牌放在 ?token= 里; 令牌到期或被作废时发送 reauth 并断开, 客户端刷新令牌后重连
+@app.route('/api/events', methods=['GET'])
+def event_stream():
+    if change_feed is None:
+        return jsonify({'message': 'Event stream disabled'}), 503
+    token = request.args.get('token')
+    if not token and 'Authorization' in request.headers:
+        token = request.headers['Authorization'].split(" ")[1]
+    current_user, claims = authenticate(token)
+    sub = change_feed.subscribe(current_user.id, current_user.role)
+    keepalive = app.config['EVENTS_KEEPALIVE']
+
+    def stream():
+        # 不访问数据库: 空闲的连接只占一个协程, 不占连接池
+        try:
+            # hello 之前的变更客户端拿不到, 重连后收到 hello 时应整体重拉一次
+            yield 'retry: 3000\nevent: hello\ndata: {}\n\n'
+            while True:
+                remaining = claims['exp'] - time.time()
+                if remaining <= 0 or ('ver' in claims and token_revoked(current_user.id, claims['ver'])):
+                    yield 'event: reauth\ndata: {}\n\n'
+                    return
+                event = sub.get(min(keepalive, remaining))
+                if sub.overflowed:
+                    sub.drain()
+                    sub.overflowed = False
+                    yield 'event: resync\ndata: {}\n\n'
+                elif event is None:
+                    yield ': keepalive\n\n'
+                else:
+                    data = dict(event['data'], action=event['action'])
+                    yield f"event: {event['entity']}\ndata: {json.dumps(data, ensure_ascii=False, default=str)}\n\n"
+        finally:
+            change_feed.unsubscribe(sub)
+
+    return app.response_class(stream(), mimetype='text/event-stream',
+                              headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
 
+# [新增] Prometheus 指标 (多进程模式下汇总全部 gunicorn worker)
+@app.route('/api/metrics', methods=['GET'])
+def get_metrics():
+    token = app.config['METRICS_TOKEN']
+    if token and request.headers.get('X-Metrics-Token') != token:
+        return jsonify({'message': 'Permission denied'}), 403
+    body, content_type = metrics.render()
+    return app.response_class(body, mimetype=content_type)
+
+# [新增] 本 worker 的数据库连接池状态
+@app.route('/api/admin/db_pool', methods=['GET'])
+@token_required
+@role_required(['captain'])
+def get_db_pool_stats(current_user):
+    pool = db.engine.pool
+    stats = {'pid': os.getpid(), 'status': pool.status()}
+    if hasattr(pool, 'checkedout'):
+        stats.update({
+            'size': pool.size(),
+            'checked_out': pool.checkedout(),
+            'idle': pool.checkedin(),
+            'overflow': pool.overflow()
+        })
+    return jsonify(stats)
+
+# [新增] 后台任务队列深度与延迟
+@app.route('/api/admin/jobs', methods=['GET'])
+@token_required
+@role_required(['captain'])
+def get_job_stats(current_user):
+    return jsonify(job_queue.stats())
+
+# [新增] 查看鉴权缓存 (本 worker)、共享响应缓存的命中情况与密码哈希队列
+@app.route('/api/admin/cache_stats', methods=['GET'])
+@token_required
+@role_required(['captain'])
+def get_cache_stats(current_user):
     return jsonify({
-        'leaderboard': leaderboard,
-        'attendance': {
-            'rate': attendance_rate,
-            'leaves': total_leaves,
-            'total_trainings': total_trainings
-        },
-        'match_trend': match_trend
+        'auth_user': auth_user_cache.stats(),
+        'responses': response_cache.stats() if response_cache is not None else None,
+        'password_hasher': password_hasher.stats(),
+        'events': change_feed.stats() if change_feed is not None else None,
+        'pid': os.getpid()
     })
 
-@app.route('/api/ping', methods=['GET'])
-def ping():
-    return jsonify({'status': 'ok', 'message': 'Basketball System Online'})
+# [新增] 清理旧赛季数据: {"before": "2024-07-01", "archive": true, "dry_run": false}
+# dry_run 时只返回各表将被删除的行数; 否则交给后台任务分批删除, 返回 202
+@app.route('/api/admin/purge', methods=['POST'])
+@token_required
+@role_required(['captain'])
+def purge_old_seasons(current_user):
+    data = request.get_json() or {}
+    try:
+        before = datetime.datetime.strptime(data['before'], '%Y-%m-%d')
+    except (KeyError, TypeError, ValueError):
+        return jsonify({'message': 'before must be a date like 2024-07-01'}), 400
+    counts = purge_counts(before)
+    if data.get('dry_run'):
+        return jsonify({'before': before.strftime('%Y-%m-%d'), 'counts': counts})
+    job_queue.enqueue('purge', before=before.isoformat(),
+                      batch_size=max(1, min(int(data.get('batch_size') or app.config['PURGE_BATCH_SIZE']), 10000)),
+                      archive=bool(data.get('archive', True)))
+    db.session.commit()
+    return jsonify({'message': 'Purge scheduled', 'before': before.strftime('%Y-%m-%d'), 'counts': counts}), 202
 
 @app.route('/api/register', methods=['POST'])
 def register():
     data = request.get_json()
-    hashed = generate_password_hash(data['password'], method='scrypt')
+    hashed = password_hasher.hash(data['password'])
     new_user = User(
         username=data['username'], 
         password_hash=hashed,
@@ -254,6 +1556,8 @@ def register():
     )
     db.session.add(new_user)
     try:
+        bump_version('users')
+        enqueue_stats_refresh()
         db.session.commit()
         return jsonify({'message': 'Registered successfully'}), 201
     except Exception as e:
@@ -263,38 +1567,123 @@ def register():
 @app.route('/api/login', methods=['POST'])
 def login():
     data = request.get_json()
+    if login_throttled(data.get('username')):
+        return jsonify({'message': 'Too many login attempts'}), 429, {'Retry-After': str(app.config['LOGIN_THROTTLE_WINDOW'])}
     user = User.query.filter_by(username=data.get('username')).first()
-    if not user or not check_password_hash(user.password_hash, data.get('password')):
+    if not user or not password_hasher.verify(user.password_hash, data.get('password')):
         return jsonify({'message': 'Invalid credentials'}), 401
-    
-    token = jwt.encode({
-        'user_id': user.id, 
-        'exp': datetime.datetime.utcnow() + datetime.timedelta(hours=24)
-    }, app.config['JWT_SECRET_KEY'], algorithm="HS256")
+    # 哈希参数调整过: 借用户提交的明文按新参数重新计算
+    if password_hasher.needs_rehash(user.password_hash):
+        user.password_hash = password_hasher.hash(data.get('password'))
+    tokens = issue_tokens(user)
+    db.session.commit()
     
     # 登录时返回头像信息
+    return jsonify(dict(tokens, user={
+        'username': user.username, 
+        'role': user.role,
+        'real_name': user.real_name,
+        'student_id': user.student_id,
+        'avatar_url': user.avatar_url,
+        'bio': user.bio
+    }))
+
+# [新增] 用 refresh token 换取新的令牌对 (同时轮换 refresh token, 旧的随即作废)
+@app.route('/api/token/refresh', methods=['POST'])
+def refresh_token():
+    data = request.get_json() or {}
+    try:
+        claims = jwt.decode(data.get('refresh_token', ''), app.config['JWT_SECRET_KEY'], algorithms=["HS256"])
+    except Exception as e:
+        return jsonify({'message': 'Token invalid', 'error': str(e)}), 401
+    if claims.get('type') != 'refresh':
+        return jsonify({'message': 'Token invalid', 'error': 'Wrong token type'}), 401
+    user = db.session.query(User.id, User.role, User.real_name, User.student_id, User.token_version) \
+        .filter_by(id=claims['user_id']).first()
+    # 角色或密码变更后 token_version 已递增, 旧的 refresh token 不能再用
+    if user is None or (user.token_version or 0) != claims['ver']:
+        return jsonify({'message': 'Token revoked'}), 401
+    # 删掉登记即消费: 并发重放时只有一个请求删到这一行, 已用过 / 未登记的 refresh token 一律拒绝
+    used = db.session.execute(db.delete(RefreshToken).where(
+        RefreshToken.jti == claims.get('jti', ''), RefreshToken.user_id == user.id)).rowcount
+    if not used:
+        db.session.rollback()
+        return jsonify({'message': 'Token revoked', 'error': 'Refresh token already used'}), 401
+    tokens = issue_tokens(user)
+    db.session.commit()
+    return jsonify(tokens)
+
+def schedule_window():
+    """?from=&to= 解析出的 [start, end), 默认从今天起 7 天; 格式不对时抛出 ValueError"""
+    today = datetime.datetime.combine(datetime.date.today(), datetime.time())
+    start = parse_day_or_time(request.args['from']) if 'from' in request.args else today
+    end = parse_day_or_time(request.args['to']) if 'to' in request.args else start + datetime.timedelta(days=7)
+    return start, end
+
+def schedule_window_key():
+    # 默认窗口随日期变化, 只看查询参数的 ETag / 缓存键会在跨天后仍返回前一天的窗口
+    try:
+        start, end = schedule_window()
+    except ValueError:
+        return 'invalid'
+    return f"{start:%Y%m%d%H%M}_{end:%Y%m%d%H%M}"
+
+# [新增] 合并日程: 时间窗口内的训练、比赛和场地预约按开始时间排在一起
+# ?from=2024-09-01&to=2024-09-08 (也接受 'YYYY-MM-DD HH:MM'), 默认从今天起 7 天
+@app.route('/api/schedule', methods=['GET'])
+@token_required
+@conditional(('trainings', 'matches', 'venues'), vary=schedule_window_key)
+@cached(('trainings', 'matches', 'venues'), vary=schedule_window_key)
+def get_schedule(current_user):
+    try:
+        start, end = schedule_window()
+    except ValueError:
+        return jsonify({'message': 'Invalid from / to, expected YYYY-MM-DD or YYYY-MM-DD HH:MM'}), 400
+    if not start < end <= start + datetime.timedelta(days=app.config['SCHEDULE_MAX_WINDOW_DAYS']):
+        return jsonify({'message': f"to must be after from, at most {app.config['SCHEDULE_MAX_WINDOW_DAYS']} days"}), 400
+    return jsonify([schedule_item(entry) for entry in load_schedule(start, end)])
+
+# [新增] 球员出勤分析: 每名球员的应到 / 实到训练、出勤率、请假次数与时长、比赛报名率和连续出勤
+# ?from=&to= 为时间范围 (格式同 /api/schedule, 默认不限), ?format=csv 导出 CSV; 队长 / 教练以外只返回本人一行
+@app.route('/api/analytics/attendance', methods=['GET'])
+@token_required
+@conditional(('users', 'trainings', 'matches', 'leaves'), per_user=True)
+@cached(('users', 'trainings', 'matches', 'leaves'), scope=role_scope)
+def get_attendance_analytics(current_user):
+    try:
+        start = parse_day_or_time(request.args['from']) if request.args.get('from') else None
+        end = parse_day_or_time(request.args['to']) if request.args.get('to') else None
+    except ValueError:
+        return jsonify({'message': 'Invalid from / to, expected YYYY-MM-DD or YYYY-MM-DD HH:MM'}), 400
+    players, arrays = load_attendance(start, end)
+    columns, team = attendance_report(**arrays)
+    rows = report_rows(columns, players)
+    if current_user.role not in ['captain', 'coach']:
+        rows = [r for r in rows if r['user_id'] == current_user.id]
+
+    if request.args.get('format') == 'csv':
+        out = io.StringIO()
+        # 带 BOM, Excel 打开时按 UTF-8 识别中文姓名
+        out.write('\ufeff')
+        writer = csv.DictWriter(out, fieldnames=PLAYER_FIELDS)
+        writer.writeheader()
+        writer.writerows(rows)
+        name = f"attendance_{request.args.get('from') or 'all'}_{request.args.get('to') or 'now'}.csv".replace(' ', '_')
+        return app.response_class(out.getvalue(), mimetype='text/csv',
+                                  headers={'Content-Disposition': f'attachment; filename="{secure_filename(name)}"'})
     return jsonify({
-        'token': token, 
-        'user': {
-            'username': user.username, 
-            'role': user.role,
-            'real_name': user.real_name,
-            'student_id': user.student_id,
-            'avatar_url': user.avatar_url,
-            'bio': user.bio
-        }
+        'from': start.strftime('%Y-%m-%d %H:%M') if start else None,
+        'to': end.strftime('%Y-%m-%d %H:%M') if end else None,
+        'team': team,
+        'players': rows
     })
 
 @app.route('/api/trainings', methods=['GET'])
 @token_required
+@conditional('trainings')
+@cached('trainings')
 def get_trainings(current_user):
-    trainings = Training.query.order_by(Training.start_time.desc()).all()
-    return jsonify([{
-        'id': t.id,
-        'start_time': t.start_time.strftime('%Y-%m-%d %H:%M'),
-        'end_time': t.end_time.strftime('%Y-%m-%d %H:%M'),
-        'plan_content': t.plan_content
-    } for t in trainings])
+    return list_response(Training.query, Training, TRAINING_FIELDS, order_col=Training.start_time)
 
 @app.route('/api/trainings', methods=['POST'])
 @token_required
@@ -309,21 +1698,59 @@ def create_training(current_user):
             end_time=datetime.datetime.strptime(end_str, '%Y-%m-%d %H:%M'),
             plan_content=data['plan_content']
         )
+        index = schedule_index('team', new_t.start_time, new_t.end_time)
+        check_schedule(index, 'training', new_t.start_time, new_t.end_time)
         db.session.add(new_t)
+        db.session.flush()
+        bump_version('trainings')
+        publish_change('training', 'created', **training_item(new_t))
+        enqueue_stats_refresh()
         db.session.commit()
         return jsonify({'message': 'Training created'})
+    except ScheduleConflict as e:
+        return schedule_conflict_response(e)
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({'message': f'Invalid date format or time range: {e}'}), 400
     except Exception as e:
         db.session.rollback()
         return jsonify({'message': str(e)}), 500
 
+# [新增] 批量创建训练 (如整学期的训练安排), 一个事务写入, 返回每条的结果
+@app.route('/api/trainings/bulk', methods=['POST'])
+@token_required
+@role_required(['captain'])
+def bulk_create_trainings(current_user):
+    items = bulk_items()
+    if items is None:
+        return jsonify({'message': f"Expected a list of 1-{app.config['BULK_MAX_ITEMS']} items"}), 400
+    span = lambda item: (parse_time(item['start_time']), parse_time(item['end_time']))
+    index = bulk_schedule_index('team', items, span)
+
+    def build(item):
+        start, end = span(item)
+        check_schedule(index, 'training', start, end)
+        return {'start_time': start, 'end_time': end, 'plan_content': item['plan_content']}
+
+    rows, results = bulk_insert(Training, items, build)
+    if rows:
+        bump_version('trainings')
+        for row in rows:
+            publish_change('training', 'created', **training_item(Training(**row)))
+        enqueue_stats_refresh()
+    db.session.commit()
+    return jsonify({'created': len(rows), 'results': results})
+
 @app.route('/api/trainings/<int:training_id>', methods=['DELETE'])
 @token_required
 @role_required(['captain'])
 def delete_training(current_user, training_id):
-    t = Training.query.get(training_id)
-    if not t: return jsonify({'message': 'Not found'}), 404
-    Leave.query.filter_by(training_id=training_id).delete()
-    db.session.delete(t)
+    # 相关请假由外键 ON DELETE CASCADE 在同一条语句里删除
+    deleted = db.session.execute(db.delete(Training).where(Training.id == training_id)).rowcount
+    if not deleted: return jsonify({'message': 'Not found'}), 404
+    bump_version('trainings', 'leaves')
+    publish_change('training', 'deleted', id=training_id)
+    enqueue_stats_refresh()
     db.session.commit()
     return jsonify({'message': 'Deleted successfully'})
 
@@ -340,49 +1767,68 @@ def request_leave(current_user):
         reason=data['reason']
     )
     db.session.add(new_leave)
+    db.session.flush()
+    bump_version('leaves')
+    publish_change('leave', 'created', audience=current_user.id, id=new_leave.id, user_id=current_user.id,
+                   real_name=current_user.real_name, training_id=new_leave.training_id,
+                   match_id=new_leave.match_id, status=new_leave.status)
+    enqueue_stats_refresh()
     db.session.commit()
     return jsonify({'message': 'Leave requested'})
 
 @app.route('/api/leaves', methods=['GET'])
 @token_required
+@conditional(('leaves', 'users', 'trainings', 'matches'), per_user=True)
+@cached(('leaves', 'users', 'trainings', 'matches'), scope=role_scope)
 def get_leaves(current_user):
-    if current_user.role in ['captain', 'coach']:
-        leaves = Leave.query.order_by(Leave.created_at.desc()).all()
-    else:
-        leaves = Leave.query.filter_by(user_id=current_user.id).order_by(Leave.created_at.desc()).all()
-    return jsonify([{
-        'id': l.id,
-        'username': l.user.username,
-        'real_name': l.user.real_name,
-        'duration_hours': float(l.duration_hours),
-        'reason': l.reason,
-        'status': l.status,
-        'type': '比赛' if l.match_id else ('训练' if l.training_id else '通用'),
-        'related_info': (l.match.opponent if l.match_id else (l.training.start_time.strftime('%m-%d') if l.training_id else '-'))
-    } for l in leaves])
+    # 一条 JOIN 查询直接取出需要的列, 不实例化 ORM 对象, 也没有逐行的懒加载
+    training_start = Training.start_time.label('training_start')
+    query = db.session.query(
+        Leave.id, Leave.created_at, Leave.duration_hours, Leave.reason, Leave.status,
+        Leave.match_id, Leave.training_id,
+        User.username, User.real_name,
+        Match.opponent, training_start
+    ).outerjoin(User, Leave.user_id == User.id) \
+     .outerjoin(Match, Leave.match_id == Match.id) \
+     .outerjoin(Training, Leave.training_id == Training.id)
+    if current_user.role not in ['captain', 'coach']:
+        query = query.filter(Leave.user_id == current_user.id)
+    return list_response(query, Leave, {
+        'id': lambda l: l.id,
+        'username': lambda l: l.username,
+        'real_name': lambda l: l.real_name,
+        'duration_hours': lambda l: float(l.duration_hours),
+        'reason': lambda l: l.reason,
+        'status': lambda l: l.status,
+        'type': lambda l: '比赛' if l.match_id else ('训练' if l.training_id else '通用'),
+        'related_info': lambda l: (l.opponent if l.match_id else (l.training_start.strftime('%m-%d') if l.training_id else '-'))
+    }, order_col=Leave.created_at, sources={
+        'username': (User.username,), 'real_name': (User.real_name,),
+        'type': (Leave.match_id, Leave.training_id),
+        'related_info': (Leave.match_id, Leave.training_id, Match.opponent, training_start)
+    })
 
 @app.route('/api/matches', methods=['GET'])
 @token_required
+@conditional('matches', per_user=True)
+@cached('matches', scope=user_scope)
 def get_matches(current_user):
     matches = Match.query.order_by(Match.match_time).all()
-    results = []
-    for m in matches:
-        signup = MatchSignup.query.filter_by(match_id=m.id, user_id=current_user.id).first()
-        signups = MatchSignup.query.filter_by(match_id=m.id).all()
-        signup_names = [s.real_name for s in signups]
-        
-        results.append({
-            'id': m.id,
-            'match_time': m.match_time.strftime('%Y-%m-%d %H:%M'),
-            'opponent': m.opponent,
-            'location': m.location,
-            'is_signed_up': bool(signup),
-            'participants': signup_names,
-            'our_score': m.our_score,
-            'opponent_score': m.opponent_score,
-            'is_finished': m.is_finished
-        })
-    return jsonify(results)
+
+    # 一次性取出全部报名记录，在内存中按 match_id 分组，避免每场比赛两次额外查询 (N+1)
+    participants = {}
+    signed_up = set()
+    if matches:
+        signup_rows = db.session.query(
+            MatchSignup.match_id, MatchSignup.user_id, MatchSignup.real_name
+        ).filter(MatchSignup.match_id.in_([m.id for m in matches])).order_by(MatchSignup.id).all()
+        for match_id, user_id, real_name in signup_rows:
+            participants.setdefault(match_id, []).append(real_name)
+            if user_id == current_user.id:
+                signed_up.add(match_id)
+
+    return jsonify([dict(match_item(m), is_signed_up=m.id in signed_up, participants=participants.get(m.id, []))
+                    for m in matches])
 
 @app.route('/api/matches', methods=['POST'])
 @token_required
@@ -396,12 +1842,81 @@ def create_match(current_user):
             opponent=data['opponent'],
             location=data['location']
         )
+        index = schedule_index('team', new_m.match_time, match_end(new_m.match_time))
+        check_schedule(index, 'match', new_m.match_time, match_end(new_m.match_time))
         db.session.add(new_m)
+        db.session.flush()
+        bump_version('matches')
+        publish_change('match', 'created', **match_item(new_m))
         db.session.commit()
         return jsonify({'message': 'Match created'})
+    except ScheduleConflict as e:
+        return schedule_conflict_response(e)
     except ValueError:
         return jsonify({'message': 'Invalid date format'}), 400
 
+# [新增] 批量创建比赛
+@app.route('/api/matches/bulk', methods=['POST'])
+@token_required
+@role_required(['captain'])
+def bulk_create_matches(current_user):
+    items = bulk_items()
+    if items is None:
+        return jsonify({'message': f"Expected a list of 1-{app.config['BULK_MAX_ITEMS']} items"}), 400
+    def span(item):
+        match_time = parse_time(item['match_time'])
+        return match_time, match_end(match_time)
+    index = bulk_schedule_index('team', items, span)
+
+    def build(item):
+        start, end = span(item)
+        check_schedule(index, 'match', start, end)
+        return {'match_time': start, 'opponent': item['opponent'], 'location': item['location']}
+
+    rows, results = bulk_insert(Match, items, build)
+    if rows:
+        bump_version('matches')
+        for row in rows:
+            publish_change('match', 'created', **match_item(Match(our_score=0, opponent_score=0, is_finished=False, **row)))
+    db.session.commit()
+    return jsonify({'created': len(rows), 'results': results})
+
+# [新增] 批量更新比分 / 完赛状态: [{"id": 1, "our_score": 80, "opponent_score": 70, "is_finished": true}, ...]
+@app.route('/api/matches/bulk', methods=['PUT'])
+@token_required
+@role_required(['captain'])
+def bulk_update_matches(current_user):
+    items = bulk_items()
+    if items is None:
+        return jsonify({'message': f"Expected a list of 1-{app.config['BULK_MAX_ITEMS']} items"}), 400
+    ids = [item['id'] for item in items if isinstance(item, dict) and isinstance(item.get('id'), int)]
+    existing = set(mid for (mid,) in db.session.query(Match.id).filter(Match.id.in_(ids)))
+    results, rows = [], []
+    for i, item in enumerate(items):
+        if not isinstance(item, dict) or item.get('id') not in ids or item['id'] not in existing:
+            results.append({'index': i, 'status': 'error', 'message': 'Not found'})
+            continue
+        try:
+            fields = match_result_fields(item)
+            if not fields:
+                # 只给了 id 的条目什么也不会改, 不能报告为 updated
+                raise ValueError('no fields to update')
+            row = {'id': item['id'], **fields}
+        except ValueError as e:
+            results.append({'index': i, 'id': item['id'], 'status': 'error', 'message': f"Invalid item: {e}"})
+            continue
+        rows.append(row)
+        results.append({'index': i, 'id': item['id'], 'status': 'updated'})
+    if rows:
+        # 按主键的批量 UPDATE (executemany), 只更新各行给出的字段
+        db.session.execute(db.update(Match), rows)
+        bump_version('matches')
+        for row in rows:
+            publish_change('match', 'updated', **row)
+        enqueue_stats_refresh()
+    db.session.commit()
+    return jsonify({'updated': len(rows), 'results': results})
+
 @app.route('/api/matches/<int:match_id>', methods=['PUT'])
 @token_required
 @role_required(['captain'])
@@ -409,11 +1924,20 @@ def update_match(current_user, match_id):
     m = Match.query.get(match_id)
     if not m: return jsonify({'message': 'Not found'}), 404
     
-    data = request.get_json()
-    if 'our_score' in data: m.our_score = data['our_score']
-    if 'opponent_score' in data: m.opponent_score = data['opponent_score']
-    if 'is_finished' in data: m.is_finished = data['is_finished']
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict): return jsonify({'message': 'Invalid request body'}), 400
+    try:
+        fields = match_result_fields(data)
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
+    for field, value in fields.items():
+        setattr(m, field, value)
     
+    bump_version('matches')
+    # 只推送比分和完赛状态, 客户端合并到已有的比赛卡片上
+    publish_change('match', 'updated', id=m.id, our_score=m.our_score, opponent_score=m.opponent_score,
+                   is_finished=m.is_finished)
+    enqueue_stats_refresh()
     db.session.commit()
     return jsonify({'message': 'Match updated'})
 
@@ -421,13 +1945,13 @@ def update_match(current_user, match_id):
 @token_required
 @role_required(['captain'])
 def delete_match(current_user, match_id):
-    m = Match.query.get(match_id)
-    if not m: return jsonify({'message': 'Not found'}), 404
     try:
-        MatchSignup.query.filter_by(match_id=match_id).delete(synchronize_session=False)
-        Leave.query.filter_by(match_id=match_id).delete(synchronize_session=False)
-        db.session.commit()
-        db.session.delete(m)
+        # 报名与请假由外键 ON DELETE CASCADE 级联删除, 一条语句、一次提交
+        deleted = db.session.execute(db.delete(Match).where(Match.id == match_id)).rowcount
+        if not deleted: return jsonify({'message': 'Not found'}), 404
+        bump_version('matches', 'leaves')
+        publish_change('match', 'deleted', id=match_id)
+        enqueue_stats_refresh()
         db.session.commit()
         return jsonify({'message': 'Deleted successfully'})
     except Exception as e:
@@ -441,29 +1965,67 @@ def signup_match(current_user, match_id):
         return jsonify({'message': 'Role not allowed to play'}), 403
     if not current_user.real_name or not current_user.student_id:
         return jsonify({'message': 'Please complete profile first'}), 400 
-    existing = MatchSignup.query.filter_by(match_id=match_id, user_id=current_user.id).first()
-    if existing:
-        return jsonify({'message': 'Already signed up'}), 400 
-    signup = MatchSignup(
+    if db.session.get(Match, match_id) is None:
+        return jsonify({'message': 'Match not found'}), 404
+    # 一条 INSERT ... ON CONFLICT DO NOTHING, 并发重复点击也只会插入一行
+    inserted = db.session.execute(insert_ignore(MatchSignup, 'match_id', 'user_id').values(
         match_id=match_id,
         user_id=current_user.id,
         real_name=current_user.real_name,
         student_id=current_user.student_id
-    )
-    db.session.add(signup)
+    ).returning(MatchSignup.id)).first()
+    if inserted is None:
+        db.session.rollback()
+        return jsonify({'message': 'Already signed up'}), 400 
+    bump_version('matches')
+    publish_change('match_signup', 'created', match_id=match_id, user_id=current_user.id,
+                   real_name=current_user.real_name)
     db.session.commit()
     return jsonify({'message': 'Signed up successfully'})
 
+# [新增] 一次报名多场比赛: {"match_ids": [1, 2, 3]}
+@app.route('/api/matches/signups/bulk', methods=['POST'])
+@token_required
+def bulk_signup_matches(current_user):
+    if current_user.role not in ['player', 'captain']:
+        return jsonify({'message': 'Role not allowed to play'}), 403
+    if not current_user.real_name or not current_user.student_id:
+        return jsonify({'message': 'Please complete profile first'}), 400
+    match_ids = (request.get_json() or {}).get('match_ids')
+    if (not isinstance(match_ids, list) or not 0 < len(match_ids) <= app.config['BULK_MAX_ITEMS']
+            or not all(isinstance(mid, int) for mid in match_ids)):
+        return jsonify({'message': f"match_ids must be a list of 1-{app.config['BULK_MAX_ITEMS']} ids"}), 400
+    existing = set(mid for (mid,) in db.session.query(Match.id).filter(Match.id.in_(match_ids)))
+    rows = [{'match_id': mid, 'user_id': current_user.id,
+             'real_name': current_user.real_name, 'student_id': current_user.student_id}
+            for mid in dict.fromkeys(match_ids) if mid in existing]
+    inserted = set()
+    if rows:
+        inserted = set(db.session.scalars(
+            insert_ignore(MatchSignup, 'match_id', 'user_id').returning(MatchSignup.match_id), rows))
+    if inserted:
+        bump_version('matches')
+        for mid in inserted:
+            publish_change('match_signup', 'created', match_id=mid, user_id=current_user.id,
+                           real_name=current_user.real_name)
+    db.session.commit()
+    results = []
+    for i, mid in enumerate(match_ids):
+        if mid not in existing:
+            results.append({'index': i, 'match_id': mid, 'status': 'error', 'message': 'Match not found'})
+        elif mid in inserted:
+            inserted.discard(mid)
+            results.append({'index': i, 'match_id': mid, 'status': 'created'})
+        else:
+            results.append({'index': i, 'match_id': mid, 'status': 'skipped', 'message': 'Already signed up'})
+    return jsonify({'created': sum(r['status'] == 'created' for r in results), 'results': results})
+
 @app.route('/api/venues', methods=['GET'])
 @token_required
+@conditional('venues')
+@cached('venues')
 def get_venues(current_user):
-    venues = Venue.query.order_by(Venue.start_time.desc()).all()
-    return jsonify([{
-        'id': v.id,
-        'start_time': v.start_time.strftime('%Y-%m-%d %H:%M'),
-        'end_time': v.end_time.strftime('%Y-%m-%d %H:%M'),
-        'proof_photo_url': v.proof_photo_url
-    } for v in venues])
+    return list_response(Venue.query, Venue, VENUE_FIELDS, order_col=Venue.start_time)
 
 @app.route('/api/venues', methods=['POST'])
 @token_required
@@ -477,17 +2039,52 @@ def create_venue(current_user):
             proof_photo_url=data.get('proof_photo_url'),
             updated_by=current_user.id
         )
+        index = schedule_index('court', new_v.start_time, new_v.end_time)
+        check_schedule(index, 'venue', new_v.start_time, new_v.end_time)
         db.session.add(new_v)
+        db.session.flush()
+        bump_version('venues')
+        publish_change('venue', 'created', **venue_item(new_v))
         db.session.commit()
         return jsonify({'message': 'Venue reservation updated'})
-    except ValueError:
-        return jsonify({'message': 'Invalid date format'}), 400
+    except ScheduleConflict as e:
+        return schedule_conflict_response(e)
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({'message': f'Invalid date format or time range: {e}'}), 400
+
+# [新增] 批量登记场地预约
+@app.route('/api/venues/bulk', methods=['POST'])
+@token_required
+@role_required(['captain', 'manager'])
+def bulk_create_venues(current_user):
+    items = bulk_items()
+    if items is None:
+        return jsonify({'message': f"Expected a list of 1-{app.config['BULK_MAX_ITEMS']} items"}), 400
+    span = lambda item: (parse_time(item['start_time']), parse_time(item['end_time']))
+    index = bulk_schedule_index('court', items, span)
+
+    def build(item):
+        start, end = span(item)
+        check_schedule(index, 'venue', start, end)
+        return {'start_time': start, 'end_time': end,
+                'proof_photo_url': item.get('proof_photo_url'), 'updated_by': current_user.id}
+
+    rows, results = bulk_insert(Venue, items, build)
+    if rows:
+        bump_version('venues')
+        for row in rows:
+            publish_change('venue', 'created', **venue_item(Venue(**row)))
+    db.session.commit()
+    return jsonify({'created': len(rows), 'results': results})
 
 @app.route('/api/photos', methods=['GET'])
 @token_required
+@conditional('photos')
+@cached('photos')
 def get_photos(current_user):
-    photos = TeamPhoto.query.order_by(TeamPhoto.uploaded_at.desc()).all()
-    return jsonify([{'id': p.id, 'url': p.photo_url, 'description': p.description} for p in photos])
+    return list_response(TeamPhoto.query, TeamPhoto, PHOTO_FIELDS, order_col=TeamPhoto.uploaded_at,
+                         sources=PHOTO_SOURCES)
 
 @app.route('/api/photos', methods=['POST'])
 @token_required
@@ -496,6 +2093,10 @@ def upload_team_photo(current_user):
     data = request.get_json()
     new_p = TeamPhoto(photo_url=data['url'], description=data.get('description'))
     db.session.add(new_p)
+    enqueue_thumbnails('team_photo', new_p)
+    db.session.flush()
+    bump_version('photos')
+    publish_change('photo', 'created', **photo_item(new_p))
     db.session.commit()
     return jsonify({'message': 'Photo uploaded'})
 
@@ -507,16 +2108,14 @@ def delete_team_photo(current_user, photo_id):
     if not photo:
         return jsonify({'message': 'Not found'}), 404
     
-    try:
-        filename = photo.photo_url.split('/')[-1]
-        obs_client.deleteObject(
-            bucketName=app.config['OBS_BUCKET_NAME'],
-            objectKey=filename
-        )
-    except Exception as e:
-        print(f"OBS delete error: {e}")
-
+    # OBS 删除放到后台任务, 与删除记录在同一事务提交
+    enqueue_obs_delete(photo.photo_url.split('/')[-1])
+    if photo.photo_variants:
+        for url in json.loads(photo.photo_variants).values():
+            enqueue_obs_delete(object_key(url))
     db.session.delete(photo)
+    bump_version('photos')
+    publish_change('photo', 'deleted', id=photo_id)
     db.session.commit()
     return jsonify({'message': 'Deleted successfully'})
 
@@ -530,24 +2129,36 @@ def log_personal_training(current_user):
         photo_url=data.get('photo_url')
     )
     db.session.add(log)
+    enqueue_thumbnails('personal_training', log)
+    bump_version('personal_trainings')
+    enqueue_stats_refresh()
     db.session.commit()
     return jsonify({'message': 'Training logged'})
 
 @app.route('/api/personal_trainings', methods=['GET'])
 @token_required
+@conditional(('personal_trainings', 'users'), per_user=True)
+@cached(('personal_trainings', 'users'), scope=role_scope)
 def get_personal_trainings(current_user):
-    if current_user.role in ['captain', 'coach']:
-        logs = PersonalTraining.query.order_by(PersonalTraining.created_at.desc()).all()
-    else:
-        logs = PersonalTraining.query.filter_by(user_id=current_user.id).order_by(PersonalTraining.created_at.desc()).all()
-    return jsonify([{
-        'id': l.id,
-        'username': l.user.username,
-        'real_name': l.user.real_name,
-        'item_name': l.item_name,
-        'photo_url': l.photo_url,
-        'timestamp': l.created_at.strftime('%Y-%m-%d %H:%M')
-    } for l in logs])
+    query = db.session.query(
+        PersonalTraining.id, PersonalTraining.created_at, PersonalTraining.item_name,
+        PersonalTraining.photo_url, PersonalTraining.photo_variants,
+        User.username, User.real_name
+    ).outerjoin(User, PersonalTraining.user_id == User.id)
+    if current_user.role not in ['captain', 'coach']:
+        query = query.filter(PersonalTraining.user_id == current_user.id)
+    return list_response(query, PersonalTraining, {
+        'id': lambda l: l.id,
+        'username': lambda l: l.username,
+        'real_name': lambda l: l.real_name,
+        'item_name': lambda l: l.item_name,
+        'photo_url': lambda l: image_url(l.photo_url, l.photo_variants),
+        'timestamp': lambda l: l.created_at.strftime('%Y-%m-%d %H:%M')
+    }, order_col=PersonalTraining.created_at, sources={
+        'username': (User.username,), 'real_name': (User.real_name,),
+        'photo_url': (PersonalTraining.photo_url, PersonalTraining.photo_variants),
+        'timestamp': (PersonalTraining.created_at,)
+    })
 
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5000)
\ No newline at end of file
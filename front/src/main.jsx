@@ -4,7 +4,7 @@ import axios from 'axios';
 import {
     Users, Calendar, ClipboardList, Camera, Trophy, MapPin,
     LogOut, Plus, CheckCircle, Clock, User, Moon, Sun, Trash2, ChevronDown, ChevronUp,
-    BarChart3, PenTool, Save, Eraser, Undo, RotateCcw, FileText, Settings
+    BarChart3, PenTool, Save, Eraser, Undo, RotateCcw, FileText, Settings, Download
 } from 'lucide-react';
 import {
     LineChart, Line, BarChart, Bar, XAxis, YAxis, CartesianGrid, Tooltip, Legend, ResponsiveContainer, PieChart, Pie, Cell
@@ -37,6 +37,128 @@ api.interceptors.request.use(config => {
     return config;
 });
 
+// access token 过期后用 refresh token 换新令牌并重试一次; 同时失败的多个请求共用一次刷新
+const saveTokens = (data) => {
+    localStorage.setItem('token', data.token);
+    localStorage.setItem('refresh_token', data.refresh_token);
+};
+let refreshing = null;
+const refreshTokens = () => {
+    const sent = localStorage.getItem('refresh_token');
+    // refresh token 只能用一次: 若其他标签页抢先换过 (localStorage 里已是新的), 直接沿用它们拿到的令牌
+    refreshing = refreshing || axios.post('/api/token/refresh', { refresh_token: sent })
+        .then(res => saveTokens(res.data), (err) => {
+            if (localStorage.getItem('refresh_token') === sent) throw err;
+        })
+        .finally(() => { refreshing = null; });
+    return refreshing;
+};
+api.interceptors.response.use(res => res, async (error) => {
+    const original = error.config;
+    const refreshToken = localStorage.getItem('refresh_token');
+    if (error.response?.data?.code !== 'token_expired' || !refreshToken || original._retried) {
+        return Promise.reject(error);
+    }
+    original._retried = true;
+    try {
+        await refreshTokens();
+    } catch {
+        // refresh token 也失效 (过期或已被作废), 回到登录页
+        ['token', 'refresh_token', 'user'].forEach(key => localStorage.removeItem(key));
+        window.location.reload();
+        return Promise.reject(error);
+    }
+    return api(original);
+});
+
+// --- 实时变更推送 (SSE) ---
+// 整个页面共用一条 /api/events 连接, 各模块按实体订阅, 收到单条变更后合并到本地列表, 不再整表重拉;
+// 断线重连后收到 hello, 或服务端提示积压溢出 (resync) 时, 各模块整体重拉一次
+const FEED_ENTITIES = ['match', 'match_signup', 'training', 'leave', 'photo', 'venue', 'dashboard'];
+const feedHandlers = {};
+let feed = null;
+let feedRetry = null;
+let feedDelay = 5000;
+let feedConnected = false;
+
+const emitFeed = (entity, data) => (feedHandlers[entity] || []).forEach(handler => handler(data));
+
+const tokenExpiring = (token) => {
+    try { return JSON.parse(atob(token.split('.')[1].replace(/-/g, '+').replace(/_/g, '/'))).exp * 1000 < Date.now() + 5000; }
+    catch { return true; }
+};
+
+const openFeed = async () => {
+    closeFeed();
+    if (!localStorage.getItem('token')) return;
+    if (tokenExpiring(localStorage.getItem('token'))) {
+        try { await refreshTokens(); } catch { return; }
+    }
+    const source = new EventSource(`/api/events?token=${encodeURIComponent(localStorage.getItem('token'))}`);
+    feed = source;
+    source.addEventListener('hello', () => {
+        if (feedConnected) emitFeed('resync');
+        feedConnected = true;
+        feedDelay = 5000;
+    });
+    source.addEventListener('resync', () => emitFeed('resync'));
+    // 令牌到期或被作废: 刷新后重连
+    source.addEventListener('reauth', () => { source.close(); refreshTokens().then(openFeed, () => { }); });
+    FEED_ENTITIES.forEach(entity => source.addEventListener(entity, e => emitFeed(entity, JSON.parse(e.data))));
+    source.onerror = () => {
+        // 网络中断时 EventSource 自行重连; 被拒绝 (401 / 推送未开启的 503) 时连接关闭, 退避后重试
+        if (source.readyState !== EventSource.CLOSED || feed !== source) return;
+        feedRetry = setTimeout(openFeed, feedDelay);
+        feedDelay = Math.min(feedDelay * 2, 300000);
+    };
+};
+
+const closeFeed = () => {
+    clearTimeout(feedRetry);
+    if (feed) feed.close();
+    feed = null;
+};
+
+const useChangeFeed = (entity, handler) => {
+    useEffect(() => {
+        (feedHandlers[entity] = feedHandlers[entity] || []).push(handler);
+        return () => { feedHandlers[entity] = feedHandlers[entity].filter(h => h !== handler); };
+    }, []);
+};
+
+// 按 id 合并单条变更; 新记录按 key 字段降序插入 (与列表接口的默认排序一致)
+const applyChange = (items, change, key) => {
+    const { action, ...item } = change;
+    if (action === 'deleted') return items.filter(i => i.id !== item.id);
+    if (action === 'updated') return items.map(i => (i.id === item.id ? { ...i, ...item } : i));
+    if (action === 'created' && !items.some(i => i.id === item.id)) {
+        return [...items, item].sort((a, b) => (a[key] < b[key] ? 1 : a[key] > b[key] ? -1 : b.id - a.id));
+    }
+    return items;
+};
+
+// 列表接口按游标分页: 首次取一页, 响应头 X-Next-Cursor 存在时可 "加载更多";
+// 重拉 (刷新 / resync) 回到第一页, 变更推送仍按 id 合并到已加载的列表里
+const PAGE_SIZE = 50;
+const usePagedList = (path) => {
+    const [items, setItems] = useState([]);
+    const [cursor, setCursor] = useState(null);
+    const fetchPage = async (after) => {
+        const res = await api.get(path, { params: after ? { limit: PAGE_SIZE, after } : { limit: PAGE_SIZE } });
+        setItems(prev => (after ? [...prev, ...res.data.filter(i => !prev.some(p => p.id === i.id))] : res.data));
+        setCursor(res.headers['x-next-cursor'] || null);
+    };
+    const reload = () => fetchPage().catch(() => { });
+    const loadMore = () => fetchPage(cursor).catch(() => { });
+    return { items, setItems, reload, loadMore, hasMore: !!cursor };
+};
+
+const LoadMore = ({ list, theme }) => (list.hasMore ? (
+    <div className="text-center mt-4">
+        <button onClick={list.loadMore} className={`${theme.secondaryBtn} px-4 py-2 rounded`}>加载更多</button>
+    </div>
+) : null);
+
 // --- Theme Helper ---
 const useThemeClasses = (isDark) => {
     return {
@@ -58,6 +180,13 @@ const useThemeClasses = (isDark) => {
 
 const formatDateInput = (value) => value.slice(0, 16).replace('T', ' ');
 
+// 创建训练 / 比赛 / 场地预约时间冲突 (409) 时列出冲突的日程
+const scheduleError = (err) => {
+    const conflicts = err.response?.data?.conflicts;
+    if (!conflicts?.length) return '提交失败: ' + (err.response?.data?.message || err.message);
+    return '时间冲突:\n' + conflicts.map(c => `${c.title} ${c.start_time} - ${c.end_time.split(' ')[1]}`).join('\n');
+};
+
 // --- Components ---
 
 const Login = ({ onLogin, isDark, toggleTheme }) => {
@@ -73,7 +202,7 @@ const Login = ({ onLogin, isDark, toggleTheme }) => {
             const endpoint = isRegister ? '/register' : '/login';
             const res = await api.post(endpoint, formData);
             if (!isRegister) {
-                localStorage.setItem('token', res.data.token);
+                saveTokens(res.data);
                 localStorage.setItem('user', JSON.stringify(res.data.user));
                 onLogin(res.data.user);
             } else {
@@ -260,11 +389,10 @@ const TacticalBoard = ({ user, theme, isVisible }) => {
 
 // --- Personnel Module (人员信息墙) ---
 const PersonnelModule = ({ user, theme }) => {
-    const [users, setUsers] = useState([]);
+    const userList = usePagedList('/users');
+    const users = userList.items;
 
-    useEffect(() => {
-        api.get('/users').then(res => setUsers(res.data)).catch(err => console.error(err));
-    }, []);
+    useEffect(() => { userList.reload(); }, []);
 
     const roleColors = {
         captain: 'bg-yellow-500 text-white',
@@ -305,6 +433,7 @@ const PersonnelModule = ({ user, theme }) => {
                     </div>
                 ))}
             </div>
+            <LoadMore list={userList} theme={theme} />
         </div>
     );
 };
@@ -344,7 +473,8 @@ const ProfileSettings = ({ user, theme, onUpdateUser }) => {
     const handleSubmit = async (e) => {
         e.preventDefault();
         try {
-            await api.put('/users/profile', formData);
+            const res = await api.put('/users/profile', formData);
+            saveTokens(res.data);
             alert('资料更新成功！');
             const updatedUser = { ...user, ...formData };
             delete updatedUser.password;
@@ -407,7 +537,6 @@ const ProfileSettings = ({ user, theme, onUpdateUser }) => {
 };
 
 const TrainingModule = ({ user, theme }) => {
-    const [trainings, setTrainings] = useState([]);
     const [showForm, setShowForm] = useState(false);
     const [showLeaveForm, setShowLeaveForm] = useState(false);
     const [leaveData, setLeaveData] = useState({ training_id: '', duration_hours: '', reason: '' });
@@ -416,14 +545,22 @@ const TrainingModule = ({ user, theme }) => {
     const canEdit = user.role === 'captain';
     const canLeave = ['player', 'captain', 'manager'].includes(user.role);
 
-    const fetchData = async () => { try { setTrainings((await api.get('/trainings')).data); } catch (e) { } };
+    const trainingList = usePagedList('/trainings');
+    const trainings = trainingList.items, setTrainings = trainingList.setItems;
+    const fetchData = trainingList.reload;
     useEffect(() => { fetchData(); }, []);
+    useChangeFeed('training', change => setTrainings(items => applyChange(items, change, 'start_time')));
+    useChangeFeed('resync', fetchData);
 
     const handleCreate = async (e) => {
         e.preventDefault();
         const validItems = planItems.filter(item => item.trim() !== '');
         if (validItems.length === 0) return alert('请至少填写一项训练内容');
-        await api.post('/trainings', { ...formData, plan_content: JSON.stringify(validItems) });
+        try {
+            await api.post('/trainings', { ...formData, plan_content: JSON.stringify(validItems) });
+        } catch (err) {
+            return alert(scheduleError(err));
+        }
         setShowForm(false); setPlanItems(['']); setFormData({ start_time: '', end_time: '' }); fetchData();
     };
 
@@ -528,13 +665,68 @@ const TrainingModule = ({ user, theme }) => {
                     </div>
                 ))}
             </div>
+            <LoadMore list={trainingList} theme={theme} />
+        </div>
+    );
+};
+
+// 球员出勤明细: 按时间范围查询, 可导出 CSV (队员只能看到自己一行)
+const AttendanceReport = ({ theme }) => {
+    const [range, setRange] = useState({ from: '', to: '' });
+    const [report, setReport] = useState(null);
+    const query = () => new URLSearchParams(Object.entries(range).filter(([, v]) => v)).toString();
+    const fetchReport = () => api.get(`/analytics/attendance?${query()}`).then(res => setReport(res.data)).catch(() => { });
+    useEffect(() => { fetchReport(); }, [range.from, range.to]);
+    useChangeFeed('resync', fetchReport);
+    const exportCsv = async () => {
+        const res = await api.get(`/analytics/attendance?${query()}&format=csv`, { responseType: 'blob' });
+        const link = document.createElement('a');
+        link.href = URL.createObjectURL(res.data);
+        link.download = /filename="?([^"]+)"?/.exec(res.headers['content-disposition'] || '')?.[1] || 'attendance.csv';
+        link.click();
+        URL.revokeObjectURL(link.href);
+    };
+    const rate = v => (v === null ? '-' : `${v}%`);
+    return (
+        <div className={`${theme.card} p-6 rounded shadow-lg mt-6`}>
+            <div className="flex flex-wrap justify-between items-center gap-2 mb-4">
+                <h3 className="text-xl font-bold">球员出勤明细</h3>
+                <div className="flex gap-2 items-center">
+                    <input type="date" className={`p-2 rounded ${theme.input}`} value={range.from} onChange={e => setRange({ ...range, from: e.target.value })} />
+                    <span className={theme.textMuted}>至</span>
+                    <input type="date" className={`p-2 rounded ${theme.input}`} value={range.to} onChange={e => setRange({ ...range, to: e.target.value })} />
+                    <button onClick={fetchReport} className={`${theme.secondaryBtn} p-2 rounded`} title="刷新"><RotateCcw size={16} /></button>
+                    <button onClick={exportCsv} className={`${theme.primaryBtn} px-4 py-2 rounded flex items-center gap-2`}><Download size={16} /> 导出 CSV</button>
+                </div>
+            </div>
+            {report && <p className={`${theme.textMuted} mb-2`}>全队出勤率 {rate(report.team.attendance_rate)} · 比赛报名率 {rate(report.team.signup_rate)} · 请假 {report.team.leave_hours} 小时</p>}
+            <div className="overflow-x-auto max-h-96">
+                <table className="w-full text-sm text-left">
+                    <thead><tr className={theme.textMuted}><th className="p-2">姓名</th><th className="p-2">出勤</th><th className="p-2">出勤率</th><th className="p-2">请假 (小时)</th><th className="p-2">比赛报名率</th><th className="p-2">当前连续 / 最长连续</th></tr></thead>
+                    <tbody>
+                        {report?.players.map(p => (
+                            <tr key={p.user_id} className="border-t border-gray-500/20">
+                                <td className="p-2">{p.real_name || p.username}</td>
+                                <td className="p-2">{p.trainings_attended} / {p.trainings_expected}</td>
+                                <td className="p-2">{rate(p.attendance_rate)}</td>
+                                <td className="p-2">{p.training_leaves + p.match_leaves} ({p.leave_hours})</td>
+                                <td className="p-2">{rate(p.signup_rate)}</td>
+                                <td className="p-2">{p.current_streak} / {p.longest_streak}</td>
+                            </tr>
+                        ))}
+                    </tbody>
+                </table>
+            </div>
         </div>
     );
 };
 
 const StatsDashboard = ({ theme, isDark }) => {
     const [stats, setStats] = useState(null);
-    useEffect(() => { api.get('/dashboard/stats').then(res => setStats(res.data)).catch(() => { }); }, []);
+    const fetchStats = () => api.get('/dashboard/stats').then(res => setStats(res.data)).catch(() => { });
+    useEffect(() => { fetchStats(); }, []);
+    useChangeFeed('dashboard', change => (change.stats ? setStats(change.stats) : fetchStats()));
+    useChangeFeed('resync', fetchStats);
     if (!stats) return <div className="p-8">加载数据中...</div>;
     const attendanceData = [{ name: '出勤', value: stats.attendance.rate }, { name: '缺勤', value: 100 - stats.attendance.rate }];
     return (
@@ -555,6 +747,7 @@ const StatsDashboard = ({ theme, isDark }) => {
                 <h3 className="text-xl font-bold mb-4">比赛走势</h3>
                 <div className="h-80"><ResponsiveContainer width="100%" height="100%"><LineChart data={stats.match_trend}><CartesianGrid strokeDasharray="3 3" /><XAxis dataKey="date" /><YAxis /><Tooltip /><Legend /><Line type="monotone" dataKey="our_score" stroke="#10b981" strokeWidth={3} /><Line type="monotone" dataKey="opponent_score" stroke="#ef4444" strokeWidth={3} /></LineChart></ResponsiveContainer></div>
             </div>
+            <AttendanceReport theme={theme} />
         </div>
     );
 };
@@ -567,8 +760,24 @@ const MatchModule = ({ user, theme }) => {
 
     const fetchMatches = async () => { try { setMatches((await api.get('/matches')).data); } catch (e) { } };
     useEffect(() => { fetchMatches(); }, []);
+    useChangeFeed('match', ({ action, ...m }) => setMatches(items => {
+        // 比赛列表按时间升序; 新比赛还没有人报名
+        if (action === 'created') {
+            if (items.some(i => i.id === m.id)) return items;
+            return [...items, { ...m, participants: [], is_signed_up: false }].sort((a, b) => (a.match_time < b.match_time ? -1 : a.match_time > b.match_time ? 1 : a.id - b.id));
+        }
+        return applyChange(items, { action, ...m });
+    }));
+    useChangeFeed('match_signup', s => setMatches(items => items.map(m => (m.id !== s.match_id || (s.user_id === user.id && m.is_signed_up) ? m : {
+        ...m, participants: [...m.participants, s.real_name], is_signed_up: m.is_signed_up || s.user_id === user.id
+    }))));
+    useChangeFeed('resync', fetchMatches);
 
-    const handleCreate = async (e) => { e.preventDefault(); await api.post('/matches', formData); setShowForm(false); fetchMatches(); };
+    const handleCreate = async (e) => {
+        e.preventDefault();
+        try { await api.post('/matches', formData); } catch (err) { return alert(scheduleError(err)); }
+        setShowForm(false); fetchMatches();
+    };
     const handleDelete = async (id) => { if (confirm('确定删除?')) { await api.delete(`/matches/${id}`); fetchMatches(); } };
     const handleSignup = async (id) => { try { await api.post(`/matches/${id}/signup`); alert('报名成功'); fetchMatches(); } catch (e) { alert(e.response.data.message); } };
     const handleUpdateScore = async (id, our, opp, finished) => { await api.put(`/matches/${id}`, { our_score: our, opponent_score: opp, is_finished: finished }); fetchMatches(); };
@@ -614,12 +823,15 @@ const MatchModule = ({ user, theme }) => {
 
 // --- Venue Module (OBS Version) ---
 const VenueModule = ({ user, theme }) => {
-    const [venues, setVenues] = useState([]);
+    const venueList = usePagedList('/venues');
+    const venues = venueList.items, setVenues = venueList.setItems;
     const [formData, setFormData] = useState({});
     const [isUploading, setIsUploading] = useState(false);
 
-    const fetchVenues = async () => { try { setVenues((await api.get('/venues')).data); } catch { } };
+    const fetchVenues = venueList.reload;
     useEffect(() => { fetchVenues(); }, []);
+    useChangeFeed('venue', change => setVenues(items => applyChange(items, change, 'start_time')));
+    useChangeFeed('resync', fetchVenues);
 
     const handleFileUpload = async (e) => {
         const file = e.target.files[0];
@@ -641,7 +853,7 @@ const VenueModule = ({ user, theme }) => {
 
     const handleCreate = async (e) => {
         e.preventDefault();
-        await api.post('/venues', formData);
+        try { await api.post('/venues', formData); } catch (err) { return alert(scheduleError(err)); }
         setFormData({});
         fetchVenues();
         alert('预约提交成功');
@@ -671,18 +883,25 @@ const VenueModule = ({ user, theme }) => {
                 {v.proof_photo_url ? <img src={v.proof_photo_url} className="w-24 h-24 object-cover rounded bg-gray-200" /> : <div className="w-24 h-24 bg-gray-200 rounded flex items-center justify-center text-xs">无图</div>}
                 <div><p className="font-bold">{v.start_time}</p><p className={theme.textMuted}>至 {v.end_time.split(' ')[1]}</p></div>
             </div>))}</div>
+            <LoadMore list={venueList} theme={theme} />
         </div>
     );
 };
 
 // --- Photo Module (OBS Version) ---
 const PhotoModule = ({ user, theme }) => {
-    const [photos, setPhotos] = useState([]);
+    const photoList = usePagedList('/photos');
+    const photos = photoList.items, setPhotos = photoList.setItems;
     const [description, setDescription] = useState('');
     const [isUploading, setIsUploading] = useState(false);
 
-    const fetchPhotos = async () => { try { setPhotos((await api.get('/photos')).data); } catch { } };
+    const fetchPhotos = photoList.reload;
     useEffect(() => { fetchPhotos(); }, []);
+    // 照片没有可排序的时间字段, 新照片放在最前
+    useChangeFeed('photo', ({ action, ...p }) => setPhotos(items => (action === 'created'
+        ? (items.some(i => i.id === p.id) ? items : [p, ...items])
+        : applyChange(items, { action, ...p }))));
+    useChangeFeed('resync', fetchPhotos);
 
     const handleUpload = async (e) => {
         e.preventDefault();
@@ -752,17 +971,19 @@ const PhotoModule = ({ user, theme }) => {
                     </div>
                 ))}
             </div>
+            <LoadMore list={photoList} theme={theme} />
         </div>
     );
 };
 
 // --- Personal Module (OBS Version) ---
 const PersonalModule = ({ user, theme }) => {
-    const [logs, setLogs] = useState([]);
+    const logList = usePagedList('/personal_trainings');
+    const logs = logList.items;
     const [formData, setFormData] = useState({ item_name: '', photo_url: '' });
     const [isUploading, setIsUploading] = useState(false);
 
-    const fetchLogs = async () => { try { setLogs((await api.get('/personal_trainings')).data); } catch { } };
+    const fetchLogs = logList.reload;
     useEffect(() => { fetchLogs(); }, []);
 
     const handleFileUpload = async (e) => {
@@ -827,6 +1048,7 @@ const PersonalModule = ({ user, theme }) => {
                             </div>
                         </div>
                     ))}
+                    <LoadMore list={logList} theme={theme} />
                 </div>
             </div>
         </div>
@@ -837,6 +1059,7 @@ const Dashboard = ({ user, onLogout, isDark, toggleTheme }) => {
     const [view, setView] = useState('stats');
     const [currentUser, setCurrentUser] = useState(user);
     const theme = useThemeClasses(isDark);
+    useEffect(() => { openFeed(); return closeFeed; }, []);
 
     const handleUserUpdate = (updatedData) => {
         setCurrentUser(updatedData);
@@ -912,7 +1135,7 @@ const App = () => {
     }, []);
     const toggleTheme = () => { setIsDark(!isDark); localStorage.setItem('theme', !isDark ? 'dark' : 'light'); };
     const handleLogin = (userData) => { setUser(userData); };
-    const handleLogout = () => { localStorage.removeItem('token'); localStorage.removeItem('user'); setUser(null); };
+    const handleLogout = () => { ['token', 'refresh_token', 'user'].forEach(key => localStorage.removeItem(key)); setUser(null); };
 
     return <div className={isDark ? 'dark' : ''}>{!user ? <Login onLogin={handleLogin} isDark={isDark} toggleTheme={toggleTheme} /> : <Dashboard user={user} onLogout={handleLogout} isDark={isDark} toggleTheme={toggleTheme} />}</div>;
 };